@@ -1,17 +1,40 @@
-from agno.agent import Agent
-from agno.models.google import Gemini
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, Union
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 import os
-import json
-import traceback
-from google import genai
+import asyncio
+import logging
+import ijson
+import numpy as np
 
 # Import search functionality
-from search import google_search
+from search import cached_google_search_async, batch_google_search
+from utils.llm_cache import cached_generate, cached_generate_stream
+from utils.gemini_client import get_gemini_client
+from utils.json_utils import dumps as json_dumps
+from utils.semantic_cache import SemanticCache, embed_text
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent section generations, to stay within API rate limits
+MAX_CONCURRENT_SECTIONS = 10
+
+# Most sections generated by one batched LLM call; larger batches risk running past
+# the model's output limit, so they are generated one call per section instead
+MAX_BATCH_SECTIONS = int(os.getenv("MAX_BATCH_SECTIONS", "6"))
+
+# List fields whose items are yielded individually by stream_section_detail
+STREAMED_FIELDS = ("key_points", "subtopics", "advanced_exploration")
+
+# Reuses generated sections for near-duplicate (section title, topic) requests
+_section_cache = SemanticCache(
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "section_cache.npz")
+)
 
 class SectionDetailInput(BaseModel):
     """Input model for detailed knowledge section generation"""
+    model_config = ConfigDict(frozen=True)
+    
     section_title: str
     estimated_time: str
     topic: str = ""
@@ -19,8 +42,11 @@ class SectionDetailInput(BaseModel):
 
 class DetailedSection(BaseModel):
     """Model for the detailed knowledge section"""
-    section_title: str
-    estimated_time: str
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
+    # Not part of the LLM response; filled in from the input after parsing
+    section_title: str = ""
+    estimated_time: str = ""
     key_points: List[str] = Field(default_factory=list)
     subtopics: List[str] = Field(default_factory=list)
     core_concepts: str = ""
@@ -30,173 +56,369 @@ class DetailedSection(BaseModel):
     advanced_exploration: List[str] = Field(default_factory=list)
     relationships: Dict[str, str] = Field(default_factory=dict)
 
-def get_detail_generator_agent() -> Agent:
-    """Initialize a detailed knowledge section generator agent"""
-    return Agent(
-        name="Knowledge Detail Generator",
-        model=Gemini(id="gemini-2.0-flash"),
-        instructions="""You are an expert researcher specializing in creating 
-        detailed, comprehensive knowledge resources. Your task is to expand a 
-        knowledge section into detailed content.
+DETAIL_MODEL = "gemini-2.0-flash"
+
+# Static part of the detail prompt. It carries no per-request values and must stay
+# byte-identical between calls so Gemini can serve it from its prompt cache.
+_STATIC_DETAIL_PREFIX = """
+You are an expert researcher specializing in creating detailed, comprehensive knowledge resources.
+Your task is to expand a knowledge section into detailed content.
+
+**Output Requirements:**
+- Generate 3-5 key points that readers should understand from this section based on the section title and complexity.
+- Create comprehensive detailed content for the knowledge section, with the following parts:
+  - Subtopics: List specific subtopics that should be explored within this section.
+  - Information Sources: Use the search results to curate a list of the top 3-5 sources, ensuring a mix of types (articles, academic papers, videos). Label which are authoritative vs. supplementary.
+  - Practical Applications: Provide 3-5 real-world applications of this knowledge with specific examples.
+  - Verification Methods: Explain how information in this section can be validated or tested.
+  - Advanced Exploration: Suggest deeper or related topics for further exploration.
+- Incorporate any user preferences if provided.
+
+Generate detailed educational content in JSON format with the following structure:
+{
+  "key_points": ["point1", "point2", "point3"],
+  "subtopics": ["subtopic1", "subtopic2", "subtopic3"],
+  "core_concepts": "Brief overview of core concepts (keep minimal as we now have subtopics)",
+  "information_sources": [
+    {"title": "Source title", "url": "url", "description": "Brief description", "type": "authoritative/supplementary"}
+  ],
+  "practical_applications": [
+    {"title": "Application example", "description": "Description of how this knowledge applies to real-world scenarios", "context": "academic/industry/everyday"}
+  ],
+  "verification_methods": "Description of how to validate or test this information",
+  "advanced_exploration": ["topic1", "topic2", "topic3"],
+  "relationships": {
+    "prerequisite": "Knowledge this builds upon",
+    "related": "Connected knowledge areas"
+  }
+}
 
-        When given a section title and estimated time, create comprehensive detailed content that includes:
-        - 3-5 key points the reader should understand about this section
-        - Subtopics that should be explored within this section
-        - Brief overview of core concepts (keep minimal as we now have subtopics)
-        - Information sources (identified through search) with mix of types (articles, academic papers, videos)
-          labeled as authoritative or supplementary
-        - Practical applications of this knowledge with real-world examples
-        - Verification methods explaining how the information can be validated
-        - Advanced exploration areas for deeper understanding
-        - Relationships to other knowledge areas and topics
+Use formatting (bullet points, section headings) to make content digestible.
+Ensure content is appropriately complex for the estimated time frame.
+Make the content educational, accurate, and engaging, focusing on both theoretical understanding and practical applications.
+"""
 
-        Make content educational, accurate, and engaging, focusing on both theoretical understanding 
-        and practical applications. Ensure content is comprehensive but appropriate for the estimated time frame.
+# Per-request part of the detail prompt, sent after the static prefix
+_DETAIL_SUFFIX_TEMPLATE = """
+**Input:**
+- Section title: {section_title}
+- Estimated time to comprehend: {estimated_time}
+- Main topic: {topic}
+- User preferences: {user_preferences}
 
-        Format your response as a structured JSON object with all the above sections.
-        """,
-        show_tool_calls=True,
-        markdown=True,
+{search_results}
+
+Ensure the information sources include these URLs when relevant: {source_links}
+"""
+
+# Replaces the single-section output instructions for batched requests
+_BATCH_INSTRUCTIONS = """
+Generate the detailed content for EACH of the {count} sections below.
+Respond with a JSON array holding one object per section, in the order the sections are given,
+each object following the structure described above.
+"""
+
+# Parses the JSON array returned for a batched request
+_SECTION_LIST_ADAPTER = TypeAdapter(List[DetailedSection])
+
+def _build_detail_suffix(input_data: SectionDetailInput, search_results: str, source_links: List[str]) -> str:
+    """Build the per-request part of the detail prompt, sent after the static prefix"""
+    return _DETAIL_SUFFIX_TEMPLATE.format_map({
+        "section_title": input_data.section_title,
+        "estimated_time": input_data.estimated_time,
+        "topic": input_data.topic,
+        "user_preferences": input_data.user_preferences or "None provided",
+        "search_results": search_results,
+        "source_links": json_dumps(sorted(source_links))
+    })
+
+def _with_input_fields(detailed_section: DetailedSection, input_data: SectionDetailInput) -> DetailedSection:
+    """Copy the section with the title and time taken from the input, since the LLM response omits them"""
+    return detailed_section.model_copy(update={
+        "section_title": input_data.section_title,
+        "estimated_time": input_data.estimated_time
+    })
+
+def _section_search_query(input_data: SectionDetailInput) -> str:
+    """Build the source search query for a section"""
+    search_query = f"{input_data.section_title} research sources"
+    if input_data.topic:
+        search_query += f" {input_data.topic}"
+    return search_query
+
+async def _search_sources(input_data: SectionDetailInput, prefetched_search: Optional[Tuple[str, List[str]]] = None) -> Tuple[str, List[str]]:
+    """
+    Search for context and information sources for a section
+    
+    Args:
+        input_data: The section being generated
+        prefetched_search: Results of a search already run for this section, if any
+        
+    Returns:
+        Tuple[str, List[str]]: The search results block for the prompt and the source links found
+    """
+    search_results = ""
+    source_links = []
+    
+    try:
+        if prefetched_search is not None:
+            search_text, links = prefetched_search
+        else:
+            logger.info("Searching for sources on: %s", input_data.section_title)
+            search_text, links = await cached_google_search_async(_section_search_query(input_data))
+        if search_text:
+            search_results = f"\nSearch Results for Information Sources:\n{search_text}"
+            source_links = links
+            logger.info("Found %d source links", len(links))
+    except Exception as e:
+        logger.warning("Error performing search for sources: %s", e)
+    
+    return search_results, source_links
+
+def _fallback_section(input_data: SectionDetailInput) -> DetailedSection:
+    """Create a minimal fallback section for when generation fails"""
+    return DetailedSection(
+        section_title=input_data.section_title,
+        estimated_time=input_data.estimated_time,
+        key_points=["Understand key concepts", "Apply knowledge", "Develop critical thinking skills"],
+        subtopics=["Introduction", "Primary Concepts", "Practical Applications"],
+        core_concepts="Content generation failed. Please try again.",
+        information_sources=[],
+        practical_applications=[],
+        verification_methods="Standard research validation methods and critical analysis.",
+        advanced_exploration=["Further research in this area"],
+        relationships={"prerequisite": "Foundational knowledge", "related": "Connected topics"}
     )
 
-def generate_section_detail(input_data: SectionDetailInput) -> DetailedSection:
+async def generate_section_detail(input_data: SectionDetailInput, prefetched_search: Optional[Tuple[str, List[str]]] = None,
+                                  prefetched_embedding: Optional[np.ndarray] = None) -> DetailedSection:
     """
     Generate detailed content for a knowledge section
     
     Args:
         input_data: The input data containing section title, estimated time, etc.
+        prefetched_search: (search_text, links) already fetched for this section; skips the search when given
+        prefetched_embedding: Cache key embedding the caller already looked up and missed; skips
+            embedding and the cache lookup when given, and is used to cache the result
         
     Returns:
         DetailedSection: The detailed knowledge section
     """
     try:
-        # Perform an initial search to gather context and sources
-        search_results = ""
-        source_links = []
-        
-        try:
-            print(f"Searching for sources on: {input_data.section_title}")
-            # First search for general content on the topic
-            search_query = f"{input_data.section_title} research sources"
-            if input_data.topic:
-                search_query += f" {input_data.topic}" 
-                
-            search_text, links = google_search(search_query)
-            if search_text:
-                search_results = f"\nSearch Results for Information Sources:\n{search_text}"
-                source_links = links
-                print(f"Found {len(links)} source links")
-        except Exception as e:
-            print(f"Error performing search for sources: {e}")
-        
-        # Use Gemini API to generate the detailed content
-        api_key = os.getenv("GEMINI_API_KEY", "")
-        client = genai.Client(api_key=api_key)
+        client = get_gemini_client()
         
-        # Create a prompt for Gemini
-        detail_prompt = f"""
-        You are an expert researcher specializing in creating detailed, comprehensive knowledge resources.
-        Your task is to expand a knowledge section into detailed content.
-
-        **Input:**
-        - Section title: {input_data.section_title}
-        - Estimated time to comprehend: {input_data.estimated_time}
-        - Main topic: {input_data.topic}
-        - User preferences: {input_data.user_preferences or "None provided"}
+        # Return a cached section if a near-identical one was generated before
+        cache_embedding = prefetched_embedding
+        if cache_embedding is None:
+            try:
+                cache_embedding = await embed_text(client, f"{input_data.section_title}||{input_data.topic}")
+                cached = _section_cache.lookup(cache_embedding)
+                if cached:
+                    logger.info("Semantic cache hit for section: %s", input_data.section_title)
+                    detailed_section = _with_input_fields(DetailedSection.model_validate_json(cached), input_data)
+                    return detailed_section
+            except Exception as e:
+                logger.warning("Error checking semantic cache: %s", e)
         
-        {search_results}
-        
-        **Output Requirements:**
-        - Generate 3-5 key points that readers should understand from this section based on the section title and complexity.
-        - Create comprehensive detailed content for the knowledge section, with the following parts:
-          - Subtopics: List specific subtopics that should be explored within this section.
-          - Information Sources: Use the search results to curate a list of the top 3-5 sources, ensuring a mix of types (articles, academic papers, videos). Label which are authoritative vs. supplementary.
-          - Practical Applications: Provide 3-5 real-world applications of this knowledge with specific examples.
-          - Verification Methods: Explain how information in this section can be validated or tested.
-          - Advanced Exploration: Suggest deeper or related topics for further exploration.
-        - Incorporate any user preferences if provided.
-
-        Generate detailed educational content in JSON format with the following structure:
-        {{
-          "key_points": ["point1", "point2", "point3"],
-          "subtopics": ["subtopic1", "subtopic2", "subtopic3"],
-          "core_concepts": "Brief overview of core concepts (keep minimal as we now have subtopics)",
-          "information_sources": [
-            {{"title": "Source title", "url": "url", "description": "Brief description", "type": "authoritative/supplementary"}}
-          ],
-          "practical_applications": [
-            {{"title": "Application example", "description": "Description of how this knowledge applies to real-world scenarios", "context": "academic/industry/everyday"}}
-          ],
-          "verification_methods": "Description of how to validate or test this information",
-          "advanced_exploration": ["topic1", "topic2", "topic3"],
-          "relationships": {{
-            "prerequisite": "Knowledge this builds upon",
-            "related": "Connected knowledge areas"
-          }}
-        }}
-        
-        Ensure the information sources include these URLs when relevant: {json.dumps(source_links)}
-        Use formatting (bullet points, section headings) to make content digestible.
-        Ensure content is appropriately complex for the estimated time frame.
-        Make the content educational, accurate, and engaging, focusing on both theoretical understanding and practical applications.
-        """
+        # Perform an initial search to gather context and sources
+        search_results, source_links = await _search_sources(input_data, prefetched_search)
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=detail_prompt,
-            config={
+        response_text = await cached_generate(
+            client,
+            DETAIL_MODEL,
+            _build_detail_suffix(input_data, search_results, source_links),
+            {
                 'response_mime_type': 'application/json'
-            }
+            },
+            static_prefix=_STATIC_DETAIL_PREFIX
         )
         
-        # Process the response
-        response_text = response.text
-        
-        # Clean up the response if needed
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        # Parse JSON
-        detail_data = json.loads(response_text.strip())
+        # Strip any markdown fence and validate the JSON straight into the model
+        response_text = response_text.removeprefix("```json").removesuffix("```")
+        detailed_section = _with_input_fields(DetailedSection.model_validate_json(response_text), input_data)
         
-        # Create the detailed section
-        detailed_section = DetailedSection(
-            section_title=input_data.section_title,
-            estimated_time=input_data.estimated_time,
-            key_points=detail_data.get("key_points", []),
-            subtopics=detail_data.get("subtopics", []),
-            core_concepts=detail_data.get("core_concepts", ""),
-            information_sources=detail_data.get("information_sources", []),
-            practical_applications=detail_data.get("practical_applications", []),
-            verification_methods=detail_data.get("verification_methods", ""),
-            advanced_exploration=detail_data.get("advanced_exploration", []),
-            relationships=detail_data.get("relationships", {})
-        )
+        if cache_embedding is not None:
+            _section_cache.add(cache_embedding, detailed_section.model_dump_json())
         
         # Print confirmation of generated content
-        print(f"Successfully generated detailed content for section: {input_data.section_title}")
-        print(f"Contains {len(detailed_section.key_points)} key points and {len(detailed_section.subtopics)} subtopics")
+        logger.info("Successfully generated detailed content for section: %s", input_data.section_title)
+        logger.info("Contains %d key points and %d subtopics", len(detailed_section.key_points), len(detailed_section.subtopics))
         
         return detailed_section
     
     except Exception as e:
-        print(f"Error generating section detail: {e}\n{traceback.format_exc()}")
+        logger.exception("Error generating section detail: %s", e)
         
-        # Create a minimal fallback response
-        return DetailedSection(
-            section_title=input_data.section_title,
-            estimated_time=input_data.estimated_time,
-            key_points=["Understand key concepts", "Apply knowledge", "Develop critical thinking skills"],
-            subtopics=["Introduction", "Primary Concepts", "Practical Applications"],
-            core_concepts="Content generation failed. Please try again.",
-            information_sources=[],
-            practical_applications=[],
-            verification_methods="Standard research validation methods and critical analysis.",
-            advanced_exploration=["Further research in this area"],
-            relationships={"prerequisite": "Foundational knowledge", "related": "Connected topics"}
-        )
+        return _fallback_section(input_data)
+
+async def stream_section_detail(input_data: SectionDetailInput) -> AsyncIterator[Union[Tuple[str, str], DetailedSection]]:
+    """
+    Generate detailed content for a knowledge section, streaming list items as the model writes them
+    
+    Items of the key_points, subtopics and advanced_exploration lists are yielded as
+    (field, item) tuples as soon as each one is complete. The final DetailedSection
+    is always yielded last.
+    
+    Args:
+        input_data: The input data containing section title, estimated time, etc.
+        
+    Yields:
+        Union[Tuple[str, str], DetailedSection]: Completed list items, then the full section
+    """
+    try:
+        client = get_gemini_client()
+        search_results, source_links = await _search_sources(input_data)
+        
+        # Feed chunks into an incremental JSON parser and yield array items as they close;
+        # a cached response arrives as a single chunk
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events)
+        chunks = []
+        async for text in cached_generate_stream(
+            client,
+            DETAIL_MODEL,
+            _build_detail_suffix(input_data, search_results, source_links),
+            {'response_mime_type': 'application/json'},
+            static_prefix=_STATIC_DETAIL_PREFIX
+        ):
+            chunks.append(text)
+            if parser is None:
+                continue
+            try:
+                parser.send(text.encode())
+            except ijson.JSONError:
+                # Not plain JSON (e.g. fenced); the full text is still parsed below
+                parser = None
+                continue
+            for prefix, event, value in events:
+                field = prefix.removesuffix(".item")
+                if field in STREAMED_FIELDS and prefix.endswith(".item") and event == "string":
+                    yield field, value
+            del events[:]
+        
+        response_text = "".join(chunks)
+        response_text = response_text.removeprefix("```json").removesuffix("```")
+        detailed_section = _with_input_fields(DetailedSection.model_validate_json(response_text), input_data)
+        yield detailed_section
+    
+    except Exception as e:
+        logger.exception("Error streaming section detail: %s", e)
+        yield _fallback_section(input_data)
+
+async def generate_all_sections(inputs: List[SectionDetailInput], embeddings: Optional[List[Optional[np.ndarray]]] = None) -> List[DetailedSection]:
+    """
+    Generate detailed content for several knowledge sections concurrently
+    
+    Args:
+        inputs: The input data for each section to generate
+        embeddings: Cache key embeddings already looked up for the inputs, None where
+            there is none; each section is embedded and looked up itself when omitted
+        
+    Returns:
+        List[DetailedSection]: The detailed sections, in the same order as the inputs
+    """
+    # Fetch sources for every section in one concurrent burst up front
+    searches = await batch_google_search([_section_search_query(input_data) for input_data in inputs])
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SECTIONS)
+    
+    async def generate_bounded(input_data: SectionDetailInput, search: Tuple[str, List[str]], embedding: Optional[np.ndarray]) -> DetailedSection:
+        async with semaphore:
+            return await generate_section_detail(input_data, prefetched_search=search, prefetched_embedding=embedding)
+    
+    return await asyncio.gather(*[
+        generate_bounded(input_data, search, embedding)
+        for input_data, search, embedding in zip(inputs, searches, embeddings or [None] * len(inputs))
+    ])
+
+async def _generate_batch(client, inputs: List[SectionDetailInput]) -> List[DetailedSection]:
+    """
+    Make the single LLM call behind generate_sections_batch
+    
+    Raises:
+        ValueError: If the response doesn't hold exactly one section per input
+    """
+    searches = await batch_google_search([_section_search_query(input_data) for input_data in inputs])
+    section_prompts = []
+    for position, (input_data, search) in enumerate(zip(inputs, searches), 1):
+        search_results, source_links = await _search_sources(input_data, search)
+        section_prompts.append(f"### Section {position}\n{_build_detail_suffix(input_data, search_results, source_links)}")
+    
+    response_text = await cached_generate(
+        client,
+        DETAIL_MODEL,
+        _BATCH_INSTRUCTIONS.format(count=len(inputs)) + "\n".join(section_prompts),
+        {
+            'response_mime_type': 'application/json'
+        },
+        static_prefix=_STATIC_DETAIL_PREFIX
+    )
+    
+    response_text = response_text.removeprefix("```json").removesuffix("```")
+    generated = _SECTION_LIST_ADAPTER.validate_json(response_text)
+    if len(generated) != len(inputs):
+        raise ValueError(f"Expected {len(inputs)} sections, got {len(generated)}")
+    return [_with_input_fields(detailed_section, input_data) for detailed_section, input_data in zip(generated, inputs)]
+
+async def generate_sections_batch(inputs: List[SectionDetailInput]) -> List[DetailedSection]:
+    """
+    Generate detailed content for several knowledge sections with a single LLM call
+    
+    The static prompt prefix and the round-trip are paid once for the whole batch.
+    Sections found in the semantic cache are left out of the request. Batches over
+    MAX_BATCH_SECTIONS, or responses that don't hold one section per input, fall
+    back to generate_all_sections.
+    
+    Args:
+        inputs: The input data for each section to generate
+        
+    Returns:
+        List[DetailedSection]: The detailed sections, in the same order as the inputs
+    """
+    client = get_gemini_client()
+    sections: List[Optional[DetailedSection]] = [None] * len(inputs)
+    
+    # Serve whatever we can from the semantic cache
+    embeddings = await asyncio.gather(*[
+        embed_text(client, f"{input_data.section_title}||{input_data.topic}") for input_data in inputs
+    ], return_exceptions=True)
+    for index, (input_data, embedding) in enumerate(zip(inputs, embeddings)):
+        if isinstance(embedding, BaseException):
+            logger.warning("Error checking semantic cache: %s", embedding)
+            continue
+        cached = _section_cache.lookup(embedding)
+        if cached:
+            logger.info("Semantic cache hit for section: %s", input_data.section_title)
+            sections[index] = _with_input_fields(DetailedSection.model_validate_json(cached), input_data)
+    
+    missing = [index for index, section in enumerate(sections) if section is None]
+    if not missing:
+        return sections
+    missing_inputs = [inputs[index] for index in missing]
+    
+    generated: Optional[List[DetailedSection]] = None
+    if len(missing) <= MAX_BATCH_SECTIONS:
+        try:
+            generated = await _generate_batch(client, missing_inputs)
+            for index, detailed_section in zip(missing, generated):
+                if not isinstance(embeddings[index], BaseException):
+                    _section_cache.add(embeddings[index], detailed_section.model_dump_json())
+            logger.info("Generated %d sections in one batched call", len(missing))
+        except Exception as e:
+            logger.warning("Batched section generation failed, generating one by one: %s", e)
+    
+    if generated is None:
+        # Pass on the embeddings computed above so the fallback doesn't embed every section again
+        missing_embeddings = [None if isinstance(embeddings[index], BaseException) else embeddings[index] for index in missing]
+        generated = await generate_all_sections(missing_inputs, missing_embeddings)
+    
+    for index, detailed_section in zip(missing, generated):
+        sections[index] = detailed_section
+    return sections
+
+# Markdown row templates used by format_detailed_section_text
+_SOURCE_TEMPLATE = "{i}. [{title}]({url}){type_label}\n   {description}\n\n"
+_APPLICATION_TEMPLATE = "### Application {i}: {title}{context_label}\n\n{description}\n\n"
 
 def format_detailed_section_text(detailed_section: DetailedSection) -> str:
     """
@@ -208,59 +430,72 @@ def format_detailed_section_text(detailed_section: DetailedSection) -> str:
     Returns:
         str: Formatted text representation of the detailed section
     """
-    text = f"# {detailed_section.section_title}\n\n"
-    text += f"**Estimated Time to Comprehend:** {detailed_section.estimated_time}\n\n"
+    parts: List[str] = [
+        f"# {detailed_section.section_title}\n\n",
+        f"**Estimated Time to Comprehend:** {detailed_section.estimated_time}\n\n"
+    ]
     
     # Key Points
-    text += "## Key Points\n\n"
+    parts.append("## Key Points\n\n")
     for i, point in enumerate(detailed_section.key_points, 1):
-        text += f"{i}. {point}\n"
-    text += "\n"
+        parts.append(f"{i}. {point}\n")
+    parts.append("\n")
     
     # Subtopics
-    text += "## Subtopics\n\n"
-    for i, subtopic in enumerate(detailed_section.subtopics, 1):
-        text += f"- {subtopic}\n"
-    text += "\n"
+    parts.append("## Subtopics\n\n")
+    for subtopic in detailed_section.subtopics:
+        parts.append(f"- {subtopic}\n")
+    parts.append("\n")
     
     # Core Concepts
-    text += "## Overview of Core Concepts\n\n"
-    text += f"{detailed_section.core_concepts}\n\n"
+    parts.append(f"## Overview of Core Concepts\n\n{detailed_section.core_concepts}\n\n")
     
     # Information Sources
-    text += "## Information Sources\n\n"
-    for i, source in enumerate(detailed_section.information_sources, 1):
-        source_type = source.get("type", "")
-        type_label = f" ({source_type})" if source_type else ""
-        text += f"{i}. [{source.get('title', 'Source')}]({source.get('url', '#')}){type_label}\n"
-        text += f"   {source.get('description', '')}\n\n"
+    parts.append("## Information Sources\n\n")
+    parts.append("".join(
+        _SOURCE_TEMPLATE.format(
+            i=i,
+            title=source.get("title", "Source"),
+            url=source.get("url", "#"),
+            type_label=f" ({source_type})" if (source_type := source.get("type")) else "",
+            description=source.get("description", "")
+        )
+        for i, source in enumerate(detailed_section.information_sources, 1)
+    ))
     
     # Practical Applications
-    text += "## Practical Applications\n\n"
-    for i, application in enumerate(detailed_section.practical_applications, 1):
-        context = application.get("context", "")
-        context_label = f" (Context: {context})" if context else ""
-        text += f"### Application {i}: {application.get('title', '')}{context_label}\n\n"
-        text += f"{application.get('description', '')}\n\n"
+    parts.append("## Practical Applications\n\n")
+    parts.append("".join(
+        _APPLICATION_TEMPLATE.format(
+            i=i,
+            title=application.get("title", ""),
+            context_label=f" (Context: {context})" if (context := application.get("context")) else "",
+            description=application.get("description", "")
+        )
+        for i, application in enumerate(detailed_section.practical_applications, 1)
+    ))
     
     # Verification Methods
-    text += "## Verification Methods\n\n"
-    text += f"{detailed_section.verification_methods}\n\n"
+    parts.append(f"## Verification Methods\n\n{detailed_section.verification_methods}\n\n")
     
     # Advanced Exploration
-    text += "## Advanced Topics for Further Exploration\n\n"
+    parts.append("## Advanced Topics for Further Exploration\n\n")
     for topic in detailed_section.advanced_exploration:
-        text += f"- {topic}\n"
-    text += "\n"
+        parts.append(f"- {topic}\n")
+    parts.append("\n")
     
     # Relationships
-    text += "## Relationships to Other Knowledge Areas\n\n"
-    text += f"**Prerequisites:** {detailed_section.relationships.get('prerequisite', 'None')}\n\n"
-    text += f"**Related Areas:** {detailed_section.relationships.get('related', 'None')}\n\n"
+    parts.append(
+        "## Relationships to Other Knowledge Areas\n\n"
+        f"**Prerequisites:** {detailed_section.relationships.get('prerequisite', 'None')}\n\n"
+        f"**Related Areas:** {detailed_section.relationships.get('related', 'None')}\n\n"
+    )
     
-    return text
+    return "".join(parts)
 
 if __name__ == "__main__":
+    setup_logging()
+    
     # Example usage for testing
     test_input = SectionDetailInput(
         section_title="Quantum Computing Fundamentals",
@@ -268,7 +503,7 @@ if __name__ == "__main__":
         topic="Quantum Computing"
     )
     
-    result = generate_section_detail(test_input)
+    result = asyncio.run(generate_section_detail(test_input))
     formatted_text = format_detailed_section_text(result)
     
     print("DETAILED SECTION GENERATION COMPLETE")
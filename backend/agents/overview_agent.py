@@ -1,11 +1,19 @@
-import os
-import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional, TYPE_CHECKING
-from pydantic import BaseModel, Field
-from google import genai
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
 
 # Import Google search functionality
-from search import google_search
+from search import cached_google_search_async
+from utils.llm_cache import cached_generate
+from utils.gemini_client import get_gemini_client
+from utils.json_utils import dumps as json_dumps
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
 
 # Use TYPE_CHECKING to avoid circular imports
 if TYPE_CHECKING:
@@ -14,33 +22,86 @@ if TYPE_CHECKING:
 
 class KnowledgeSection(BaseModel):
     """Model for a knowledge section"""
-    title: str
-    estimated_time: str
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
+    title: str = "Untitled Section"
+    estimated_time: str = "Not specified"
 
 class KnowledgeOverview(BaseModel):
     """Model for the complete knowledge overview"""
-    research_id: str
-    title: str
-    overview: str
-    sections: List[KnowledgeSection]
-    complexity_level: str
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
+    # research_id and complexity_level are not part of the LLM response;
+    # they are filled in from the coordinator output after parsing
+    research_id: str = ""
+    title: str = ""
+    overview: str = ""
+    sections: List[KnowledgeSection] = Field(default_factory=list)
+    complexity_level: str = ""
 
 # For compatibility with curriculum_service imports
 class CurriculumStep(BaseModel):
     """Model for a curriculum step"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
     title: str
     objectives: List[str] = Field(default_factory=list)
     estimated_time: str
 
 class CurriculumOverview(BaseModel):
     """Model for the complete curriculum overview"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
     curriculum_id: str
     title: str
     overview: str
     steps: List[CurriculumStep]
     total_time: str
 
-def generate_overview(coordinator_output: "KnowledgeOutput") -> KnowledgeOverview:
+OVERVIEW_MODEL = "gemini-2.0-flash"
+
+# Static part of the overview prompt; kept free of per-request values so it can be
+# served from Gemini's prompt cache
+_STATIC_OVERVIEW_PREFIX = """
+You are an expert researcher and knowledge organizer. Create a simplified knowledge overview
+for the topic, key concepts and knowledge structure given below.
+
+Generate a knowledge overview with the following:
+1. A concise title for the research overview
+2. A brief overview paragraph (3-5 sentences) describing the topic's importance and structure
+3. 5-10 logical knowledge sections that present information from fundamental to advanced
+4. For each section, provide:
+   - A clear, descriptive title
+   - Estimated time to comprehend this knowledge section
+
+Format your response as JSON with this structure:
+{
+  "title": "Knowledge Overview Title",
+  "overview": "Brief overview paragraph",
+  "sections": [
+    {
+      "title": "Section Title",
+      "estimated_time": "X hours/days to comprehend"
+    }
+  ]
+}
+"""
+
+# Per-request part of the overview prompt, sent after the static prefix
+_OVERVIEW_SUFFIX_TEMPLATE = """
+Topic: {topic}
+
+Here are the key concepts and their relationships:
+{key_concepts}
+
+Here is the suggested knowledge structure:
+{knowledge_structure}
+
+Complexity level: {complexity_level}
+{search_results}
+"""
+
+async def generate_overview(coordinator_output: "KnowledgeOutput") -> KnowledgeOverview:
     """
     Generate a simplified knowledge overview from coordinator output
     
@@ -62,96 +123,52 @@ def generate_overview(coordinator_output: "KnowledgeOutput") -> KnowledgeOvervie
     # Perform additional Google search to enhance knowledge context
     search_results = ""
     try:
-        print(f"Performing additional search for knowledge context on: {topic}")
+        logger.info("Performing additional search for knowledge context on: %s", topic)
         search_query = f"{topic} research latest understanding"
-        search_text, _ = google_search(search_query)
+        search_text, _ = await cached_google_search_async(search_query)
         if search_text:
             search_results = f"\nAdditional context from search:\n{search_text}"
-            print("Successfully retrieved additional context from search")
+            logger.info("Successfully retrieved additional context from search")
         else:
-            print("No additional context retrieved from search")
+            logger.info("No additional context retrieved from search")
     except Exception as e:
-        print(f"Error performing additional search: {e}")
+        logger.warning("Error performing additional search: %s", e)
     
     # Use Gemini API to generate the knowledge overview
     try:
-        api_key = os.getenv("GEMINI_API_KEY", "")
-        client = genai.Client(api_key=api_key)
+        client = get_gemini_client()
         
         # Create a prompt for Gemini using the coordinator data with simplified requirements
-        overview_prompt = f"""
-        You are an expert researcher and knowledge organizer. Create a simplified knowledge overview 
-        for the topic: {topic}
-        
-        Here are the key concepts and their relationships:
-        {json.dumps(key_concepts)}
-        
-        Here is the suggested knowledge structure:
-        {json.dumps(knowledge_structure)}
-        
-        Complexity level: {complexity_level}
-        {search_results}
-        
-        Generate a knowledge overview with the following:
-        1. A concise title for the research overview
-        2. A brief overview paragraph (3-5 sentences) describing the topic's importance and structure
-        3. 5-10 logical knowledge sections that present information from fundamental to advanced
-        4. For each section, provide:
-           - A clear, descriptive title
-           - Estimated time to comprehend this knowledge section
+        overview_suffix = _OVERVIEW_SUFFIX_TEMPLATE.format_map({
+            "topic": topic,
+            "key_concepts": json_dumps(key_concepts),
+            "knowledge_structure": json_dumps(knowledge_structure),
+            "complexity_level": complexity_level,
+            "search_results": search_results
+        })
         
-        Format your response as JSON with this structure:
-        {{
-          "title": "Knowledge Overview Title",
-          "overview": "Brief overview paragraph",
-          "sections": [
-            {{
-              "title": "Section Title",
-              "estimated_time": "X hours/days to comprehend"
-            }}
-          ]
-        }}
-        """
-        
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=overview_prompt,
-            config={
+        response_text = await cached_generate(
+            client,
+            OVERVIEW_MODEL,
+            overview_suffix,
+            {
                 'response_mime_type': 'application/json'
-            }
+            },
+            static_prefix=_STATIC_OVERVIEW_PREFIX
         )
         
-        # Process the response
-        response_text = response.text
-        
-        # Clean up the response if needed
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        # Parse JSON
-        overview_data = json.loads(response_text.strip())
-        
-        # Create sections from the JSON data
-        sections = []
-        for section_data in overview_data.get("sections", []):
-            sections.append(KnowledgeSection(
-                title=section_data.get("title", "Untitled Section"),
-                estimated_time=section_data.get("estimated_time", "Not specified")
-            ))
-        
-        # Create and return the full knowledge overview
-        return KnowledgeOverview(
-            research_id=research_id,
-            title=overview_data.get("title", f"Knowledge Overview for {topic}"),
-            overview=overview_data.get("overview", summary),
-            sections=sections,
-            complexity_level=complexity_level
-        )
+        # Strip any markdown fence and validate the JSON straight into the model
+        response_text = response_text.removeprefix("```json").removesuffix("```")
+        overview = KnowledgeOverview.model_validate_json(response_text)
+        return overview.model_copy(update={
+            "research_id": research_id,
+            "complexity_level": complexity_level,
+            "title": overview.title or f"Knowledge Overview for {topic}",
+            "overview": overview.overview or summary
+        })
     
     except Exception as e:
-        print(f"Error generating knowledge overview: {e}")
+        logger.exception("Error generating knowledge overview: %s", e)
         
         # Create a fallback overview if API call fails
         sections = []
@@ -169,6 +186,77 @@ def generate_overview(coordinator_output: "KnowledgeOutput") -> KnowledgeOvervie
             complexity_level=complexity_level
         )
 
+# Formatted text of recently seen overviews, keyed by a hash of their content
+FORMAT_CACHE_SIZE = 256
+_formatted_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_formatted_cache_lock = threading.Lock()
+
+# Fields that differ between otherwise identical overviews and never appear in the text
+_ID_FIELDS = ("research_id", "curriculum_id")
+
+def _format_key(overview: Dict[str, Any]) -> bytes:
+    """Stable hash of the parts of an overview dict that end up in its formatted text"""
+    content = {key: value for key, value in overview.items() if key not in _ID_FIELDS}
+    return hashlib.blake2b(orjson.dumps(content, option=orjson.OPT_SORT_KEYS, default=str)).digest()
+
+def _format_dict_cached(overview: Dict[str, Any]) -> str:
+    """Format an overview dict, reusing the text from an identical earlier call"""
+    key = _format_key(overview)
+    with _formatted_cache_lock:
+        text = _formatted_cache.get(key)
+        if text is not None:
+            _formatted_cache.move_to_end(key)
+            return text
+    
+    if 'sections' in overview:
+        text = _format_knowledge_dict(overview)
+    elif 'steps' in overview:
+        text = _format_curriculum_dict(overview)
+    else:
+        return "Could not format overview: unknown overview type"
+    
+    with _formatted_cache_lock:
+        _formatted_cache[key] = text
+        if len(_formatted_cache) > FORMAT_CACHE_SIZE:
+            _formatted_cache.popitem(last=False)
+    return text
+
+def _format_knowledge_dict(overview: Dict[str, Any]) -> str:
+    """Format a knowledge overview given as a plain dict"""
+    parts: List[str] = [
+        f"# {overview.get('title', 'Untitled Overview')}\n\n",
+        f"## Overview\n{overview.get('overview', 'No overview available')}\n\n",
+        f"**Complexity Level: {overview.get('complexity_level', 'Not specified')}**\n\n",
+        "## Knowledge Sections\n\n"
+    ]
+    
+    for i, section in enumerate(overview.get('sections', []), 1):
+        parts.append(
+            f"### {i}. {section.get('title', 'Untitled')}\n"
+            f"**Estimated Time to Comprehend:** {section.get('estimated_time', 'Not specified')}\n\n"
+        )
+    
+    return "".join(parts)
+
+def _format_curriculum_dict(overview: Dict[str, Any]) -> str:
+    """Format a curriculum overview given as a plain dict"""
+    parts: List[str] = [
+        f"# {overview.get('title', 'Untitled Curriculum')}\n\n",
+        f"## Overview\n{overview.get('overview', 'No overview available')}\n\n",
+        f"**Total Time: {overview.get('total_time', 'Not specified')}**\n\n",
+        "## Learning Steps\n\n"
+    ]
+    
+    for i, step in enumerate(overview.get('steps', []), 1):
+        parts.append(f"### {i}. {step.get('title', 'Untitled')}\n**Estimated Time:** {step.get('estimated_time', 'Not specified')}\n")
+        objectives = step.get('objectives', [])
+        if objectives:
+            parts.append("**Objectives:**\n")
+            parts.extend(f"- {objective}\n" for objective in objectives)
+        parts.append("\n")
+    
+    return "".join(parts)
+
 def format_overview_text(overview: KnowledgeOverview) -> str:
     """
     Format the knowledge overview as a human-readable text
@@ -179,16 +267,7 @@ def format_overview_text(overview: KnowledgeOverview) -> str:
     Returns:
         str: Formatted text representation of the knowledge
     """
-    text = f"# {overview.title}\n\n"
-    text += f"## Overview\n{overview.overview}\n\n"
-    text += f"**Complexity Level: {overview.complexity_level}**\n\n"
-    text += "## Knowledge Sections\n\n"
-    
-    for i, section in enumerate(overview.sections, 1):
-        text += f"### {i}. {section.title}\n"
-        text += f"**Estimated Time to Comprehend:** {section.estimated_time}\n\n"
-    
-    return text
+    return _format_knowledge_dict(overview.model_dump())
 
 def format_curriculum_text(overview: CurriculumOverview) -> str:
     """
@@ -200,72 +279,31 @@ def format_curriculum_text(overview: CurriculumOverview) -> str:
     Returns:
         str: Formatted text representation of the curriculum
     """
-    text = f"# {overview.title}\n\n"
-    text += f"## Overview\n{overview.overview}\n\n"
-    text += f"**Total Time: {overview.total_time}**\n\n"
-    text += "## Learning Steps\n\n"
-    
-    for i, step in enumerate(overview.steps, 1):
-        text += f"### {i}. {step.title}\n"
-        text += f"**Estimated Time:** {step.estimated_time}\n"
-        if step.objectives:
-            text += "**Objectives:**\n"
-            for objective in step.objectives:
-                text += f"- {objective}\n"
-        text += "\n"
-    
-    return text
+    return _format_curriculum_dict(overview.model_dump())
 
 def format_any_overview_text(overview) -> str:
     """
     Format either a knowledge overview or curriculum overview as a human-readable text
     
     Args:
-        overview: Either a KnowledgeOverview or CurriculumOverview object
+        overview: A KnowledgeOverview or CurriculumOverview object, or its dict form
         
     Returns:
         str: Formatted text representation
     """
-    if hasattr(overview, 'sections'):  # It's a KnowledgeOverview
-        return format_overview_text(overview)
-    elif hasattr(overview, 'steps'):   # It's a CurriculumOverview
-        return format_curriculum_text(overview)
-    elif isinstance(overview, dict):   # It's a dictionary representation
-        if 'sections' in overview:
-            # Convert dict to KnowledgeOverview
-            sections = [KnowledgeSection(title=s.get('title', 'Untitled'), 
-                                        estimated_time=s.get('estimated_time', 'Not specified')) 
-                       for s in overview.get('sections', [])]
-            
-            temp_overview = KnowledgeOverview(
-                research_id=overview.get('research_id', 'unknown'),
-                title=overview.get('title', 'Untitled Overview'),
-                overview=overview.get('overview', 'No overview available'),
-                sections=sections,
-                complexity_level=overview.get('complexity_level', 'Not specified')
-            )
-            return format_overview_text(temp_overview)
-        elif 'steps' in overview:
-            # Convert dict to CurriculumOverview
-            steps = [CurriculumStep(title=s.get('title', 'Untitled'), 
-                                  estimated_time=s.get('estimated_time', 'Not specified'),
-                                  objectives=s.get('objectives', [])) 
-                   for s in overview.get('steps', [])]
-            
-            temp_overview = CurriculumOverview(
-                curriculum_id=overview.get('curriculum_id', 'unknown'),
-                title=overview.get('title', 'Untitled Curriculum'),
-                overview=overview.get('overview', 'No overview available'),
-                steps=steps,
-                total_time=overview.get('total_time', 'Not specified')
-            )
-            return format_curriculum_text(temp_overview)
+    if hasattr(overview, 'model_dump'):  # A KnowledgeOverview or CurriculumOverview
+        overview = overview.model_dump()
+    if isinstance(overview, dict):
+        # Repeated overviews (e.g. reused research) get their text from the cache
+        return _format_dict_cached(overview)
     
     # Fallback for unknown object types
     return "Could not format overview: unknown overview type"
 
 if __name__ == "__main__":
     # For testing purposes
+    setup_logging()
+    import asyncio
     from coordinator_agent import ResearchInput, coordinate
     
     test_input = ResearchInput(
@@ -274,7 +312,7 @@ if __name__ == "__main__":
     )
     
     coordinator_result = coordinate(test_input)
-    overview_result = generate_overview(coordinator_result.raw_data)
+    overview_result = asyncio.run(generate_overview(coordinator_result.raw_data))
     
     print("Overview Generation Complete!")
     print(f"Title: {overview_result.title}")
@@ -1,47 +1,141 @@
-from agno.agent import Agent
-from agno.models.google import Gemini
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Set, Tuple
 from pydantic import BaseModel
 from google.genai import types
-from google import genai
-import json
+import asyncio
+import copy
+import functools
+import hashlib
+import threading
 import re
 import logging
 import os
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from cachetools import TTLCache
+from config import GEMINI_API_KEY
+from utils.json_utils import dumps
+from utils.gemini_client import get_gemini_client, get_instruction_cache
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Get API key from environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
-    logging.warning("GEMINI_API_KEY not found in environment variables")
+    logger.warning("GEMINI_API_KEY not found in environment variables")
 
-def get_query_rewriter_agent() -> Agent:
-    """Initialize a query rewriting agent."""
-    return Agent(
-        name="Query Rewriter",
-        model=Gemini(id="gemini-2.0-flash"),
-        instructions="""You are an expert at reformulating questions to be more precise and detailed. 
+# Recent LLM responses keyed by a hash of the normalized input; failures are never cached
+_title_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_modification_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_response_cache_lock = threading.Lock()
+
+def _cache_key(text: str) -> str:
+    """Hash normalized input into a compact cache key"""
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+# Gemini model used by the instruction agents below
+AGENT_MODEL = "gemini-2.0-flash"
+
+class AgentResponse(BaseModel):
+    content: str
+
+class CachedInstructionAgent:
+    """
+    Minimal agent that sends static instructions to Gemini as a cached system prompt
+    
+    The instructions are byte-identical across calls, so they are stored once as
+    Gemini cached content and every request only sends the dynamic message. When
+    Gemini won't cache them (e.g. too short), they are sent inline as the system
+    instruction instead.
+    """
+    
+    def __init__(self, name: str, instructions: str, model: str = AGENT_MODEL, markdown: bool = False):
+        self.name = name
+        self.model = model
+        self.instructions = instructions
+        if markdown:
+            self.instructions += "\n- Use markdown to format your answers."
+    
+    def _config(self, config: Dict[str, Any]) -> types.GenerateContentConfig:
+        """Build the request config, referencing the cached instructions when available"""
+        cache_name = get_instruction_cache(self.model, self.instructions)
+        if cache_name:
+            config['cached_content'] = cache_name
+        else:
+            config['system_instruction'] = self.instructions
+        return types.GenerateContentConfig(**config)
+    
+    def generate(self, message: str, **config) -> types.GenerateContentResponse:
+        """
+        Send a message with the agent's instructions
+        
+        Args:
+            message: The dynamic user message
+            **config: Extra GenerateContentConfig fields
+            
+        Returns:
+            types.GenerateContentResponse: The raw Gemini response
+        """
+        return get_gemini_client().models.generate_content(
+            model=self.model,
+            contents=message,
+            config=self._config(config)
+        )
+    
+    def generate_stream(self, message: str, **config) -> Iterator[types.GenerateContentResponse]:
+        """
+        Stream a response to a message with the agent's instructions
+        
+        Args:
+            message: The dynamic user message
+            **config: Extra GenerateContentConfig fields
+            
+        Returns:
+            Iterator[types.GenerateContentResponse]: Response chunks as they arrive
+        """
+        return get_gemini_client().models.generate_content_stream(
+            model=self.model,
+            contents=message,
+            config=self._config(config)
+        )
+    
+    async def agenerate_stream(self, message: str, **config) -> AsyncIterator[types.GenerateContentResponse]:
+        """
+        Stream a response to a message with the agent's instructions using the async client
+        
+        Args:
+            message: The dynamic user message
+            **config: Extra GenerateContentConfig fields
+            
+        Returns:
+            AsyncIterator[types.GenerateContentResponse]: Response chunks as they arrive
+        """
+        # Creating the instruction cache on first use is a blocking call
+        request_config = await asyncio.to_thread(self._config, config)
+        return await get_gemini_client().aio.models.generate_content_stream(
+            model=self.model,
+            contents=message,
+            config=request_config
+        )
+    
+    def run(self, message: str) -> AgentResponse:
+        """
+        Send a message and return the response text
+        
+        Args:
+            message: The dynamic user message
+            
+        Returns:
+            AgentResponse: Object with the response text in content
+        """
+        return AgentResponse(content=self.generate(message).text or "")
+
+_QUERY_REWRITER_INSTRUCTIONS = """You are an expert at reformulating questions to be more precise and detailed. 
         Your task is to:
         1. Analyze the user's question
         2. Rewrite it to be more specific and search-friendly
         3. Expand any acronyms or technical terms
         4. Return ONLY the rewritten query without any additional text or explanations
         
-        """,
-        show_tool_calls=False,
-        markdown=True,
-    )
-
+        """
 
-def get_rag_agent() -> Agent:
-    """Initialize the main RAG agent."""
-    return Agent(
-        name="Gemini RAG Agent",
-        model=Gemini(id="gemini-2.0-flash"),
-        instructions="""You are an Intelligent Agent specializing in providing accurate answers.
+_RAG_INSTRUCTIONS = """You are an Intelligent Agent specializing in providing accurate answers.
         
         When given context from documents:
         - Focus on information from the provided documents
@@ -53,18 +147,9 @@ def get_rag_agent() -> Agent:
         - Reference the provided source links when possible
         
         Always maintain high accuracy and clarity in your responses.
-        """,
-        show_tool_calls=True,
-        markdown=True,
-    )
-
+        """
 
-def get_baseline_agent() -> Agent:
-    """Initialize a baseline agent that uses only internal knowledge without external tools."""
-    return Agent(
-        name="Baseline Agent",
-        model=Gemini(id="gemini-2.0-flash"),
-        instructions="""You are an assistant that answers questions using ONLY your internal knowledge.
+_BASELINE_INSTRUCTIONS = """You are an assistant that answers questions using ONLY your internal knowledge.
         
         Important instructions:
         - Do NOT reference any external documents, web searches, or other tools
@@ -74,18 +159,9 @@ def get_baseline_agent() -> Agent:
         - Do NOT pretend to have current or specialized information you don't possess
         
         Your purpose is to demonstrate how AI responds without access to additional information sources.
-        """,
-        show_tool_calls=False,
-        markdown=True,
-    )
-
+        """
 
-def get_session_title_generator() -> Agent:
-    """Initialize a session title generator agent."""
-    return Agent(
-        name="Session Title Generator",
-        model=Gemini(id="gemini-2.0-flash"),
-        instructions="""You are an expert at creating short, concise titles.
+_SESSION_TITLE_INSTRUCTIONS = """You are an expert at creating short, concise titles.
         
         Your task is to:
         1. Read the provided user query
@@ -93,11 +169,105 @@ def get_session_title_generator() -> Agent:
         3. Make the title clearly represent the topic or question
         4. Return ONLY the title without any additional text or explanations
         
-        """,
-        show_tool_calls=False,
+        """
+
+@functools.lru_cache(maxsize=1)
+def get_query_rewriter_agent() -> CachedInstructionAgent:
+    """Initialize a query rewriting agent."""
+    return CachedInstructionAgent(
+        name="Query Rewriter",
+        instructions=_QUERY_REWRITER_INSTRUCTIONS,
+        markdown=True,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_rag_agent() -> CachedInstructionAgent:
+    """Initialize the main RAG agent."""
+    return CachedInstructionAgent(
+        name="Gemini RAG Agent",
+        instructions=_RAG_INSTRUCTIONS,
+        markdown=True,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_baseline_agent() -> CachedInstructionAgent:
+    """Initialize a baseline agent that uses only internal knowledge without external tools."""
+    return CachedInstructionAgent(
+        name="Baseline Agent",
+        instructions=_BASELINE_INSTRUCTIONS,
+        markdown=True,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_session_title_generator() -> CachedInstructionAgent:
+    """Initialize a session title generator agent."""
+    return CachedInstructionAgent(
+        name="Session Title Generator",
+        instructions=_SESSION_TITLE_INSTRUCTIONS,
         markdown=True,
     )
 
+# Session titles are cut off after this many words
+TITLE_MAX_WORDS = 5
+
+# Streaming settings for title generation; the newline stop ends the title early
+_TITLE_STREAM_CONFIG = dict(max_output_tokens=12, temperature=0.3, stop_sequences=['\n'])
+
+# Words that carry no topic information and are skipped in heuristic titles
+_STOPWORDS = frozenset({
+    "a", "about", "all", "also", "am", "an", "and", "any", "are", "as", "at", "be", "been", "but",
+    "by", "can", "could", "did", "do", "does", "explain", "for", "from", "give", "had", "has",
+    "have", "hello", "help", "hey", "hi", "how", "i", "if", "in", "into", "is", "it", "its", "just",
+    "know", "let", "like", "me", "more", "my", "need", "no", "not", "of", "on", "or", "our",
+    "please", "s", "should", "show", "so", "some", "tell", "than", "that", "the", "their", "them",
+    "then", "there", "these", "they", "this", "those", "to", "us", "want", "was", "we", "were",
+    "what", "when", "where", "which", "who", "why", "will", "with", "would", "you", "your",
+})
+_TITLE_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+def _heuristic_title(query: str) -> Optional[str]:
+    """
+    Build a title from the first keywords of the query without calling the LLM
+    
+    Args:
+        query (str): The user's query
+        
+    Returns:
+        Optional[str]: The title, or None if the query has fewer than two keywords
+    """
+    # URLs and bare domains say where to look, not what the session is about
+    text = _BARE_DOMAIN_RE.sub(" ", _URL_RE.sub(" ", query))
+    words = [
+        word for word in _TITLE_WORD_RE.findall(text)
+        if word.lower() not in _STOPWORDS
+    ][:TITLE_MAX_WORDS]
+    if len(words) < 2:
+        return None
+    # Capitalize the first letter only, so acronyms like API stay intact
+    return " ".join(word[0].upper() + word[1:] for word in words)
+
+def _title_prompt(query: str) -> str:
+    """Build the title request for a query"""
+    return f"Generate a concise 4-5 word title for this query: {query}"
+
+def _title_complete(buffer: str) -> bool:
+    """Whether the streamed text already holds a full title"""
+    words = buffer.split()
+    return '\n' in buffer or len(words) > TITLE_MAX_WORDS or (len(words) == TITLE_MAX_WORDS and buffer[-1].isspace())
+
+def _finish_title(key: str, buffer: str) -> str:
+    """Trim the streamed text to a title and cache it"""
+    title_lines = buffer.strip().splitlines()
+    title = " ".join(title_lines[0].split()[:TITLE_MAX_WORDS]) if title_lines else ""
+    if not title:
+        return "Untitled Session"
+    with _response_cache_lock:
+        _title_cache[key] = title
+    return title
+
 def generate_session_title(query: str) -> str:
     """
     Generate a concise title (4-5 words) based on the user's query.
@@ -108,21 +278,114 @@ def generate_session_title(query: str) -> str:
     Returns:
         str: A concise 4-5 word title
     """
+    # Most queries have enough keywords for a title, so the LLM is only needed for short ones
+    title = _heuristic_title(query)
+    if title:
+        return title
+    
+    key = _cache_key(query.strip().lower())
+    with _response_cache_lock:
+        cached = _title_cache.get(key)
+    if cached is not None:
+        return cached
+    
     try:
-        title_agent = get_session_title_generator()
-        title = title_agent.run(f"Generate a concise 4-5 word title for this query: {query}").content
-        return title.strip()
+        stream = get_session_title_generator().generate_stream(_title_prompt(query), **_TITLE_STREAM_CONFIG)
+        # Stop reading as soon as the title is complete instead of waiting for the end of the stream
+        buffer = ""
+        try:
+            for chunk in stream:
+                buffer += chunk.text or ""
+                if _title_complete(buffer):
+                    break
+        finally:
+            # Closing the generator aborts the underlying HTTP stream
+            stream.close()
+        return _finish_title(key, buffer)
     except Exception as e:
+        logger.warning("Session title generation failed: %s", e)
         return "Untitled Session"
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+async def generate_session_title_async(query: str) -> str:
+    """
+    Async version of generate_session_title that uses the async Gemini client
+    
+    Args:
+        query (str): The user's query to base the title on
+        
+    Returns:
+        str: A concise 4-5 word title
+    """
+    # Most queries have enough keywords for a title, so the LLM is only needed for short ones
+    title = _heuristic_title(query)
+    if title:
+        return title
+    
+    key = _cache_key(query.strip().lower())
+    with _response_cache_lock:
+        cached = _title_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    try:
+        stream = await get_session_title_generator().agenerate_stream(_title_prompt(query), **_TITLE_STREAM_CONFIG)
+        buffer = ""
+        try:
+            async for chunk in stream:
+                buffer += chunk.text or ""
+                if _title_complete(buffer):
+                    break
+        finally:
+            await stream.aclose()
+        return _finish_title(key, buffer)
+    except Exception as e:
+        logger.warning("Session title generation failed: %s", e)
+        return "Untitled Session"
+
+# Ask the LLM about ambiguous URL-like input in test_url_detector; bare domains are
+# taken as they are when disabled
+URL_DETECT_USE_LLM = os.getenv("URL_DETECT_USE_LLM", "true").lower() == "true"
+
+# Explicit http(s):// and www. URLs
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+# Punctuation that ends a sentence rather than a URL
+_URL_TRAILING_PUNCTUATION = '.,;:!?)]}\'"'
+# A whole token that looks like a domain name
+_DOMAIN_RE = re.compile(r'^[a-zA-Z0-9][-a-zA-Z0-9]{0,62}(\.[a-zA-Z0-9][-a-zA-Z0-9]{0,62})+\.?$')
+
+# Longest we wait for the AI before settling for the regex result, in seconds
+URL_DETECT_LLM_TIMEOUT = float(os.getenv("URL_DETECT_LLM_TIMEOUT", "3.0"))
+# Runs AI URL detection calls so they can be bounded by a timeout
+_url_detect_executor = ThreadPoolExecutor(max_workers=4)
+
+# Bare domain tokens (e.g. example.com) that the http/www regex doesn't catch
+_BARE_DOMAIN_RE = re.compile(r'\b[a-zA-Z0-9][-a-zA-Z0-9]*(?:\.[a-zA-Z0-9][-a-zA-Z0-9]*)*\.[a-zA-Z]{2,}\b')
+
 class UrldetectionResult(BaseModel):
     urls: List[str]
     query: str
     
+# URL prefixes checked in order, with the scheme to prepend (None keeps the URL as is)
+_PREFIX_MAP = (('http://', None), ('https://', None), ('www.', 'https://'))
+
+def _validate_urls(urls: List[str]) -> List[str]:
+    """Keep URL-like strings, normalizing www. and bare domains to https:// URLs, without duplicates"""
+    # Collect normalized forms so the same URL found twice (e.g. by both regex and AI) is only fetched once
+    validated_urls: Set[str] = set()
+    for url in urls:
+        for prefix, rewrite in _PREFIX_MAP:
+            if url.startswith(prefix):
+                validated_urls.add(rewrite + url if rewrite else url)
+                break
+        else:
+            if _DOMAIN_RE.match(url):
+                # Try to fix common URL issues
+                validated_urls.add('https://' + url)
+    return sorted(validated_urls)
+
 def test_url_detector(query: str) -> UrldetectionResult:
     """
-    Detect URLs in a user query using both AI and regex approaches.
+    Detect URLs in a user query, using regex first and the AI only for ambiguous input.
     
     Args:
         query (str): The query to test
@@ -130,16 +393,25 @@ def test_url_detector(query: str) -> UrldetectionResult:
     Returns:
         UrldetectionResult: Object with urls list and query fields
     """
-    # First try regex-based URL detection as a fallback
-    url_pattern = re.compile(
-        r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+|'
-        r'www\.(?:[a-zA-Z0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    )
-    regex_urls = url_pattern.findall(query)
+    # First try regex-based URL detection
+    regex_urls = [url.rstrip(_URL_TRAILING_PUNCTUATION) for url in _URL_RE.findall(query)]
+    
+    # Explicit http(s)/www URLs are fully handled by the regex, so skip the LLM round trip
+    if regex_urls:
+        return UrldetectionResult(urls=_validate_urls(regex_urls), query=_URL_RE.sub('', query).strip())
+    
+    # Only ambiguous input (bare domains like example.com) is worth asking the LLM about
+    bare_domains = _BARE_DOMAIN_RE.findall(query)
+    if not bare_domains:
+        return UrldetectionResult(urls=[], query=query)
+    
+    # Without the LLM, or if it fails, treat every bare domain as a URL
+    regex_only = UrldetectionResult(urls=_validate_urls(bare_domains), query=_BARE_DOMAIN_RE.sub('', query).strip())
+    if not URL_DETECT_USE_LLM:
+        return regex_only
 
-    try:
-        # Use the GenerativeModel class for AI-based detection
-        prompt = f"""You are an expert at identifying URLs in user queries.
+    # Use the GenerativeModel class for AI-based detection
+    prompt = f"""You are an expert at identifying URLs in user queries.
         
         Your task is to:
         1. Analyze the following user input
@@ -152,70 +424,58 @@ def test_url_detector(query: str) -> UrldetectionResult:
         If no URLs are detected, return:
         {{"urls": [], "query": "original question"}}
         
-        Return ONLY the JSON object without any additional text or explanations.
-        
         User input: {query}
         """
-         
-        response = client.models.generate_content(
-            model='gemini-2.0-flash',
-            contents=query,
-            config=types.GenerateContentConfig(
-                temperature=0.2,
-                tools=[types.Tool(
-                    google_search=types.GoogleSearchRetrieval()
-                )]
-            )
+    
+    # Run the AI call on the executor so it can be bounded by a timeout
+    ai_future = _url_detect_executor.submit(
+        get_gemini_client().models.generate_content,
+        model='gemini-2.0-flash',
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            temperature=0.0,
+            response_mime_type='application/json',
+            response_schema=UrldetectionResult
         )
-        
-        
-        # Parse the response JSON
-        if hasattr(response, 'text'):
-            try:
-                # Clean the response text in case it has markdown formatting
-                clean_text = response.text
-                if clean_text.startswith("```json"):
-                    clean_text = clean_text[7:]
-                if clean_text.endswith("```"):
-                    clean_text = clean_text[:-3]
-                
-                result_json = json.loads(clean_text.strip())
-                ai_detected = UrldetectionResult(**result_json)
-                
-                # Combine AI and regex results, prioritizing AI detection
-                all_urls = list(set(ai_detected.urls + regex_urls))
-                
-                # Validate URLs (ensure they start with http/https/www)
-                validated_urls = []
-                for url in all_urls:
-                    if url.startswith(('http://', 'https://')):
-                        validated_urls.append(url)
-                    elif url.startswith('www.'):
-                        validated_urls.append('https://' + url)
-                    else:
-                        # Try to fix common URL issues
-                        if re.match(r'^[a-zA-Z0-9][-a-zA-Z0-9]{0,62}(\.[a-zA-Z0-9][-a-zA-Z0-9]{0,62})+\.?', url):
-                            validated_urls.append('https://' + url)
-                
-                return UrldetectionResult(urls=validated_urls, query=ai_detected.query)
-            except json.JSONDecodeError as e:
-                # Fall back to regex results if JSON parsing fails
-                print(f"JSON parsing error in URL detection: {e}. Raw response: {response.text}")
-                return UrldetectionResult(urls=regex_urls, query=query)
-        else:
-            return UrldetectionResult(urls=regex_urls, query=query)
-            
+    )
+    
+    try:
+        response = ai_future.result(timeout=URL_DETECT_LLM_TIMEOUT)
+    except FutureTimeoutError:
+        logger.warning("URL detection timed out after %ss, using regex results", URL_DETECT_LLM_TIMEOUT)
+        return regex_only
     except Exception as e:
-        print(f"URL detection error: {str(e)}")
+        logger.exception("URL detection failed")
         # Fall back to regex-based detection on error
-        return UrldetectionResult(urls=regex_urls, query=query)
+        return regex_only
+    
+    # Parse the response JSON
+    if not hasattr(response, 'text'):
+        return regex_only
+    
+    try:
+        # Structured output mode returns JSON matching UrldetectionResult
+        ai_detected = UrldetectionResult.model_validate_json(response.text)
+    except Exception as e:
+        # Fall back to regex results if the response can't be parsed
+        logger.exception("JSON parse failed in URL detection. Raw response: %s", response.text)
+        return regex_only
+    
+    return UrldetectionResult(urls=_validate_urls(ai_detected.urls), query=ai_detected.query)
 
-def get_curriculum_modifier_agent() -> Agent:
-    """Initialize an agent for modifying curriculum structure."""
-    return Agent(
-        name="Curriculum Modifier",
-        model=Gemini(id="gemini-2.0-flash"),
-        instructions="""You are an expert educational curriculum designer specializing in modifying existing curricula.
+async def test_url_detector_async(query: str) -> UrldetectionResult:
+    """
+    Async wrapper around test_url_detector that runs it off the event loop
+    
+    Args:
+        query (str): The query to test
+        
+    Returns:
+        UrldetectionResult: Object with urls list and query fields
+    """
+    return await asyncio.to_thread(test_url_detector, query)
+
+_CURRICULUM_MODIFIER_INSTRUCTIONS = """You are an expert educational curriculum designer specializing in modifying existing curricula.
 
         Your task is to:
         1. Review the existing curriculum structure
@@ -224,28 +484,48 @@ def get_curriculum_modifier_agent() -> Agent:
         4. Return a modified JSON structure that maintains the original format
         
         Return ONLY the JSON object without any additional text or explanations.
-        """,
-        show_tool_calls=False,
-        markdown=True,
+        """
+
+class CurriculumStepUpdate(BaseModel):
+    title: str
+    estimated_time: str
+
+class CurriculumSteps(BaseModel):
+    """Response schema for curriculum modifications"""
+    steps: List[CurriculumStepUpdate]
+
+class CurriculumModificationResults(BaseModel):
+    """Response schema for a batch of curriculum modifications, one entry per modification"""
+    results: List[CurriculumSteps]
+
+@functools.lru_cache(maxsize=1)
+def get_curriculum_modifier_agent() -> CachedInstructionAgent:
+    """Initialize an agent for modifying curriculum structure."""
+    return CachedInstructionAgent(
+        name="Curriculum Modifier",
+        instructions=_CURRICULUM_MODIFIER_INSTRUCTIONS,
     )
 
-def modify_curriculum(curriculum, user_input: str) -> dict:
+def _serialize_steps(curriculum) -> Tuple[List[Dict[str, str]], str]:
     """
-    Modify a curriculum structure based on user input using Agno agent.
+    Get a curriculum's steps as dicts and as a JSON string
     
     Args:
-        curriculum: The existing curriculum overview object
-        user_input: The user's modification request
+        curriculum: The curriculum overview object
         
     Returns:
-        dict: Modified curriculum data 
+        Tuple[List[Dict[str, str]], str]: The steps and their JSON serialization
     """
-    try:
-        # Get the curriculum modifier agent
-        modifier_agent = get_curriculum_modifier_agent()
-        
-        # Create a prompt that explains the current curriculum and asks for modifications
-        prompt = f"""
+    current_steps = [{"title": step.title, "estimated_time": step.estimated_time} for step in curriculum.steps]
+    return current_steps, dumps(current_steps)
+
+def _modification_cache_key(curriculum, serialized_steps: str, user_input: str) -> str:
+    """Cache key for one modification of a curriculum"""
+    return _cache_key(dumps([curriculum.title, curriculum.overview, curriculum.total_time, serialized_steps, user_input.strip()]))
+
+def _curriculum_prompt(curriculum, serialized_steps: str) -> str:
+    """Describe the current curriculum for the modifier agent"""
+    return f"""
         Here is a curriculum overview:
         
         Title: {curriculum.title}
@@ -253,39 +533,201 @@ def modify_curriculum(curriculum, user_input: str) -> dict:
         Total Time: {curriculum.total_time}
         
         Current learning steps:
-        {json.dumps([{"title": step.title, "estimated_time": step.estimated_time} for step in curriculum.steps])}
+        {serialized_steps}
+        """
+
+def modify_curriculum(curriculum, user_input: str) -> dict:
+    """
+    Modify a curriculum structure based on user input using Gemini structured output.
+    
+    Args:
+        curriculum: The existing curriculum overview object
+        user_input: The user's modification request
         
+    Returns:
+        dict: Modified curriculum data 
+    """
+    current_steps, serialized_steps = _serialize_steps(curriculum)
+    key = _modification_cache_key(curriculum, serialized_steps, user_input)
+    with _response_cache_lock:
+        cached = _modification_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    
+    try:
+        # Create a prompt that explains the current curriculum and asks for modifications
+        prompt = _curriculum_prompt(curriculum, serialized_steps) + f"""
         The user wants to modify this curriculum with the following request:
         "{user_input}"
         
         Based on this request, update the curriculum steps.
-        Return only a JSON object with this structure:
-        {{
-          "steps": [
-            {{
-              "title": "Step Title",
-              "estimated_time": "X hours/weeks"
-            }}
-          ]
-        }}
         """
         
-        # Use the agent to process the modification
-        response = modifier_agent.run(prompt)
-        
-        # Get the response content
-        response_text = response.content
+        # Structured output mode guarantees JSON matching CurriculumSteps
+        response = get_curriculum_modifier_agent().generate(
+            prompt,
+            temperature=0.0,
+            response_mime_type='application/json',
+            response_schema=CurriculumSteps
+        )
         
-        # Clean up the response if needed (e.g., removing markdown code block markers)
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        # Parse JSON
-        modified_data = json.loads(response_text.strip())
+        modified_data = CurriculumSteps.model_validate_json(response.text).model_dump()
+        with _response_cache_lock:
+            _modification_cache[key] = copy.deepcopy(modified_data)
         return modified_data
         
     except Exception as e:
+        logger.exception("Curriculum modification failed, keeping the current steps")
         # Return default data structure if there's an error
-        return {"steps": [{"title": step.title, "estimated_time": step.estimated_time} for step in curriculum.steps]}
\ No newline at end of file
+        return {"steps": current_steps}
+
+def modify_curriculum_batch(curriculum, user_inputs: List[str]) -> List[dict]:
+    """
+    Apply several independent modification requests to the same curriculum in one Gemini call.
+    
+    Each modification is applied to the original curriculum on its own, exactly as
+    modify_curriculum would, but all of them share a single round trip.
+    
+    Args:
+        curriculum: The existing curriculum overview object
+        user_inputs: The user's modification requests
+        
+    Returns:
+        List[dict]: Modified curriculum data for each request, in order
+    """
+    if len(user_inputs) <= 1:
+        return [modify_curriculum(curriculum, user_input) for user_input in user_inputs]
+    
+    _, serialized_steps = _serialize_steps(curriculum)
+    keys = [_modification_cache_key(curriculum, serialized_steps, user_input) for user_input in user_inputs]
+    with _response_cache_lock:
+        results = [_modification_cache.get(key) for key in keys]
+    results = [copy.deepcopy(result) if result is not None else None for result in results]
+    
+    # Only send the modifications we don't already have
+    pending = [index for index, result in enumerate(results) if result is None]
+    if len(pending) <= 1:
+        for index in pending:
+            results[index] = modify_curriculum(curriculum, user_inputs[index])
+        return results
+    
+    try:
+        modifications = "\n".join(
+            f'        Modification {number}: "{user_inputs[index]}"' for number, index in enumerate(pending, 1)
+        )
+        prompt = _curriculum_prompt(curriculum, serialized_steps) + f"""
+        The user has requested {len(pending)} independent modifications of this curriculum:
+{modifications}
+        
+        Apply each modification separately to the curriculum above, not on top of each other.
+        Return one entry in "results" per modification, in the same order, each with the updated curriculum steps.
+        """
+        
+        response = get_curriculum_modifier_agent().generate(
+            prompt,
+            temperature=0.0,
+            response_mime_type='application/json',
+            response_schema=CurriculumModificationResults
+        )
+        
+        batch = CurriculumModificationResults.model_validate_json(response.text).results
+        if len(batch) != len(pending):
+            raise ValueError(f"Expected {len(pending)} results, got {len(batch)}")
+    except Exception as e:
+        logger.warning("Batch curriculum modification failed, modifying one at a time: %s", e)
+        for index in pending:
+            results[index] = modify_curriculum(curriculum, user_inputs[index])
+        return results
+    
+    with _response_cache_lock:
+        for index, steps in zip(pending, batch):
+            results[index] = steps.model_dump()
+            _modification_cache[keys[index]] = copy.deepcopy(results[index])
+    return results
+
+# How long the coalescer waits for more modifications of the same curriculum, in seconds
+MODIFICATION_BATCH_WINDOW = float(os.getenv("MODIFICATION_BATCH_WINDOW", "0.05"))
+
+class _CurriculumModificationBatcher:
+    """
+    Coalesces modification requests that arrive close together into batched calls
+    
+    Requests are queued; the worker collects everything that arrives within
+    MODIFICATION_BATCH_WINDOW of the first one, groups it by curriculum and sends
+    each group through modify_curriculum_batch.
+    """
+    
+    def __init__(self):
+        self._loop = None
+        self._queue = None
+        self._worker = None
+    
+    async def submit(self, curriculum, user_input: str) -> dict:
+        """Queue a modification and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # The queue and worker belong to one event loop, so start them in the current one
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        await self._queue.put((curriculum, user_input, future))
+        return await future
+    
+    async def _run(self) -> None:
+        """Collect requests for one window at a time and dispatch them"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            deadline = loop.time() + MODIFICATION_BATCH_WINDOW
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            groups: Dict[str, list] = {}
+            for item in pending:
+                curriculum = item[0]
+                try:
+                    group_key = _cache_key(dumps([curriculum.title, curriculum.overview, curriculum.total_time, _serialize_steps(curriculum)[1]]))
+                except Exception as e:
+                    # Fail this caller only; the worker keeps serving the others
+                    item[2].set_exception(e)
+                    continue
+                groups.setdefault(group_key, []).append(item)
+            for group in groups.values():
+                loop.create_task(self._dispatch(group))
+    
+    async def _dispatch(self, group: list) -> None:
+        """Run one batch off the event loop and resolve its callers' futures"""
+        curriculum = group[0][0]
+        try:
+            results = await asyncio.to_thread(modify_curriculum_batch, curriculum, [item[1] for item in group])
+        except Exception as e:
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+_modification_batcher = _CurriculumModificationBatcher()
+
+async def modify_curriculum_async(curriculum, user_input: str) -> dict:
+    """
+    Modify a curriculum, batching with other modifications of it that arrive at the same time
+    
+    Args:
+        curriculum: The existing curriculum overview object
+        user_input: The user's modification request
+        
+    Returns:
+        dict: Modified curriculum data
+    """
+    return await _modification_batcher.submit(curriculum, user_input)
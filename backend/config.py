@@ -0,0 +1,16 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables once for the whole backend; modules import the
+# values below instead of calling load_dotenv and os.getenv themselves
+load_dotenv()
+
+# API keys
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
+API_KEY = os.getenv("API_KEY", "")  # Remove default value to make authentication optional
+API_AUTH_REQUIRED = os.getenv("API_AUTH_REQUIRED", "false").lower() == "true"  # Default to not requiring auth
+
+# Supabase credentials
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
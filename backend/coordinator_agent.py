@@ -1,18 +1,67 @@
 import os
-import json
 import uuid
+import atexit
+import io
+import copy
+import functools
+import shutil
+import asyncio
+import logging
+import threading
+import ijson
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from pydantic import BaseModel, Field
 
 # Import document processing and search functionalities
-from document_loader import process_web, process_pdf
-from search import google_search
+from document_loader import process_web, process_pdf_bytes
+from search import cached_google_search_async
 # Import Supabase client
 from utils.supabase_client import initialize_supabase
+from utils.curriculum_utils import invalidate_curriculum
+from utils.async_utils import run_sync
+from utils.gemini_client import get_gemini_client
+from utils.llm_cache import cached_generate_stream
+from utils.json_utils import dumps, parse_llm_json
+from utils.semantic_cache import SemanticCache, embed_text
 # Import overview agent
-from agents.overview_agent import generate_overview, format_curriculum_text, format_any_overview_text, CurriculumOverview
+from agents.overview_agent import generate_overview, format_any_overview_text, CurriculumOverview
+
+logger = logging.getLogger(__name__)
+
+# Gemini model used for topic extraction and structuring
+COORDINATOR_MODEL = "gemini-2.0-flash"
+
+# Minimum similarity for a previous research to be reused for a new query
+RESEARCH_SEM_THRESHOLD = float(os.getenv("RESEARCH_SEM_THRESHOLD", "0.85"))
+
+# Reuses complete research outputs for near-duplicate queries (e.g. "Intro to ML" vs "Introduction to Machine Learning")
+_research_cache = SemanticCache(
+    os.path.join(os.path.dirname(__file__), "data", "research_cache.npz"),
+    threshold=RESEARCH_SEM_THRESHOLD
+)
+
+# Source content sent for topic extraction, in tokens; estimated at CHARS_PER_TOKEN characters each
+CONTENT_TOKEN_BUDGET = int(os.getenv("CONTENT_TOKEN_BUDGET", "2500"))
+CHARS_PER_TOKEN = 4
+
+# Runs Supabase writes that the caller doesn't wait for
+_save_executor = ThreadPoolExecutor(max_workers=4)
+
+# Longest a syllabus PDF download may take, in seconds
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "30"))
+
+# Curriculum step rows waiting to be inserted in one batch; flushed after
+# STEP_FLUSH_INTERVAL seconds or as soon as STEP_FLUSH_SIZE rows are queued
+STEP_FLUSH_INTERVAL = 0.1
+STEP_FLUSH_SIZE = 32
+_pending_steps: List[Tuple[Dict[str, Any], Future]] = []
+_pending_lock = threading.Lock()
+_flush_timer: Optional[threading.Timer] = None
 
 class ResearchInput(BaseModel):
     """Input structure for the knowledge coordinator agent"""
@@ -37,9 +86,55 @@ class ResearchCompleteOutput(BaseModel):
     overview: Dict[str, Any]  # General knowledge overview
     formatted_text: str
 
-def save_curriculum_step(step_id: str, step_title: str, estimated_time: str, overview=None, detailed_content=None):
+def queue_curriculum_step(step_id: str, step_title: str, estimated_time: str, overview=None, detailed_content=None) -> Future:
+    """
+    Queue a curriculum step to be saved to Supabase
+    
+    The row is inserted together with any other pending rows, at the latest
+    STEP_FLUSH_INTERVAL seconds from now.
+    
+    Args:
+        step_id: UUID for the curriculum step
+        step_title: Title of the curriculum step (subject)
+        estimated_time: Estimated time for completion
+        overview: JSON data for overview (optional)
+        detailed_content: JSON data for detailed content (optional)
+        
+    Returns:
+        Future: Resolves to True once the row is saved, or False if saving it failed
+    """
+    # Prepare data
+    data = {
+        "step_id": step_id,
+        "step_title": step_title,
+        "estimated_time": estimated_time
+    }
+    
+    # Add JSON data if provided
+    if overview:
+        data["overview"] = overview
+        
+    if detailed_content:
+        data["detailed_content"] = detailed_content
+        
+    # Queue the row; it's written with the other pending rows in one insert
+    global _flush_timer
+    future: Future = Future()
+    with _pending_lock:
+        _pending_steps.append((data, future))
+        flush_now = len(_pending_steps) >= STEP_FLUSH_SIZE
+        if not flush_now and _flush_timer is None:
+            _flush_timer = threading.Timer(STEP_FLUSH_INTERVAL, flush_curriculum_steps)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    
+    if flush_now:
+        flush_curriculum_steps()
+    return future
+
+def save_curriculum_step(step_id: str, step_title: str, estimated_time: str, overview=None, detailed_content=None) -> bool:
     """
-    Save curriculum step to Supabase
+    Save a curriculum step to Supabase, batched with rows queued around the same time
     
     Args:
         step_id: UUID for the curriculum step
@@ -49,74 +144,437 @@ def save_curriculum_step(step_id: str, step_title: str, estimated_time: str, ove
         detailed_content: JSON data for detailed content (optional)
         
     Returns:
-        bool: True if save was successful, False otherwise
+        bool: True once the step is saved, False if saving failed
     """
+    return queue_curriculum_step(step_id, step_title, estimated_time, overview, detailed_content).result()
+
+def _insert_step(supabase, row: Dict[str, Any]) -> bool:
+    """Insert a single curriculum step, for rows whose batch failed"""
+    try:
+        supabase.table("curriculum_steps").insert(row).execute()
+        return True
+    except Exception as e:
+        logger.error("Error saving curriculum step %s to Supabase: %s", row["step_id"], e)
+        return False
+
+def flush_curriculum_steps() -> bool:
+    """
+    Insert every queued curriculum step into Supabase
+    
+    Rows are grouped by their columns, since a bulk insert needs every row
+    to carry the same keys. When a batch fails, its rows are retried one at
+    a time so one bad row doesn't lose the others. Each row's future is
+    resolved with whether it was saved.
+    
+    Returns:
+        bool: True if all queued rows were saved, False otherwise
+    """
+    global _flush_timer
+    with _pending_lock:
+        pending = _pending_steps[:]
+        _pending_steps.clear()
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+    
+    if not pending:
+        return True
+    
+    all_saved = True
     try:
         # Initialize Supabase client
         supabase = initialize_supabase()
         if not supabase:
-            print("Failed to initialize Supabase client")
+            logger.error("Failed to initialize Supabase client; %d curriculum step(s) not saved", len(pending))
             return False
-            
-        # Prepare data
-        data = {
-            "step_id": step_id,
-            "step_title": step_title,
-            "estimated_time": estimated_time
-        }
         
-        # Add JSON data if provided
-        if overview:
-            data["overview"] = overview
-            
-        if detailed_content:
-            data["detailed_content"] = detailed_content
+        batches: Dict[Tuple[str, ...], List[Tuple[Dict[str, Any], Future]]] = {}
+        for row, future in pending:
+            batches.setdefault(tuple(row), []).append((row, future))
             
         # Insert data into Supabase
-        response = supabase.table("curriculum_steps").insert(data).execute()
-        print(f"Successfully saved curriculum step with ID: {step_id}")
-        return True
+        for batch in batches.values():
+            rows = [row for row, _ in batch]
+            try:
+                supabase.table("curriculum_steps").insert(rows).execute()
+                results = [True] * len(rows)
+            except Exception as e:
+                logger.warning("Batch insert of %d curriculum step(s) failed, retrying one at a time: %s", len(rows), e)
+                results = [_insert_step(supabase, row) for row in rows]
+            
+            for (row, future), saved in zip(batch, results):
+                if saved:
+                    # Drop any cached lookup of this ID so the new row is read straight away
+                    invalidate_curriculum(row["step_id"])
+                future.set_result(saved)
+            all_saved = all_saved and all(results)
+        
+        saved_ids = [row["step_id"] for row, future in pending if future.result()]
+        if saved_ids:
+            logger.info("Saved %d curriculum step(s): %s", len(saved_ids), ", ".join(saved_ids))
+        return all_saved
         
     except Exception as e:
-        print(f"Error saving curriculum step to Supabase: {e}")
+        logger.exception("Error saving curriculum steps to Supabase: %s", e)
         return False
+    finally:
+        # Never leave a caller waiting on a row that wasn't attempted
+        for _, future in pending:
+            if not future.done():
+                future.set_result(False)
 
-def get_default_ml_topics():
-    """Fallback function to provide default ML curriculum topics when API is unavailable."""
+# The flush timer is a daemon thread, so write whatever is still queued on shutdown
+atexit.register(flush_curriculum_steps)
+
+def _save_research_step(output: KnowledgeOutput, flush: bool = False) -> bool:
+    """
+    Store the topics and knowledge structure of a research in Supabase
+    
+    Args:
+        output: The research to store
+        flush: Write the row straight away instead of waiting for the batch
+        
+    Returns:
+        bool: True if the research was saved, False otherwise
+    """
+    overview_data = {
+        "topics": output.key_concepts,
+        # Removed source_materials from what gets stored
+    }
+    
+    detailed_content = {
+        "knowledge_path": output.knowledge_structure.get("knowledge_path", []),
+        "depth_metrics": output.depth_metrics
+    }
+    
+    # Save to Supabase
+    save_future = queue_curriculum_step(
+        output.research_id,
+        output.topic,  # subject as step_title
+        output.complexity_level,  # total_time as estimated_time
+        overview_data,
+        detailed_content
+    )
+    if flush:
+        flush_curriculum_steps()
+    
+    save_result = save_future.result()
+    if not save_result:
+        logger.warning("Failed to save research %s to database", output.research_id)
+    return save_result
+
+def _report_save_error(future: Future) -> None:
+    """Surface errors from a background research save"""
+    if future.exception() is not None:
+        logger.error("Error saving research in the background: %s", future.exception())
+
+def _research_cache_scope(user_input: ResearchInput) -> str:
+    """Inputs besides the query that shape the research; a cached research is only reused when they match exactly"""
+    return f"{user_input.source_url or ''}||{user_input.depth_level or ''}"
+
+def _reuse_research(cached: ResearchCompleteOutput, research_id: str) -> ResearchCompleteOutput:
+    """
+    Turn a cached research into a new one with its own ID and database record
+    
+    Args:
+        cached: The research output found in the semantic cache
+        research_id: The ID for the new research
+        
+    Returns:
+        ResearchCompleteOutput: The reused research under the new ID
+    """
+    raw_data = cached.raw_data.model_copy(update={"research_id": research_id})
+    overview = dict(cached.overview)
+    for id_field in ("research_id", "curriculum_id"):
+        if id_field in overview:
+            overview[id_field] = research_id
+    
+    # Each research gets its own record so later modifications don't affect the original
+    # The caller may look the record up straight away, so don't wait for the batch
+    _save_research_step(raw_data, flush=True)
+    return cached.model_copy(update={"raw_data": raw_data, "overview": overview})
+
+# JSON layout of the knowledge structure, shared by both prompts
+_STRUCTURE_FORMAT = """  "knowledge_path": [
+    {
+      "module": "Module name",
+      "topics": ["Topic 1", "Topic 2"],
+      "learning_outcomes": ["outcome1", "outcome2"],
+      "suggested_duration": "X weeks/hours"
+    }
+  ],
+  "depth_metrics": {
+    "module1": "duration",
+    "module2": "duration"
+  }"""
+
+# Static parts of the prompts; kept free of per-request values so they can be
+# served from Gemini's prompt cache
+_STATIC_EXTRACT_PREFIX = """
+Based on the content about the topic given below, extract:
+
+1. The main topics that should be included in a research
+2. Key concepts and skills for each topic
+3. Logical ordering of topics
+4. Any prerequisites or dependent relationships between topics
+
+Then create a knowledge structure for the topic based on those topics.
+
+Format your response as JSON with this structure:
+{
+  "topics": [
+    {
+      "name": "Topic name",
+      "key_concepts": ["concept1", "concept2"],
+      "skills": ["skill1", "skill2"],
+      "prerequisites": ["prerequisite topics if any"]
+    }
+  ],
+""" + _STRUCTURE_FORMAT + """
+}
+"""
+
+_STATIC_STRUCTURE_PREFIX = """
+Create a knowledge structure for the topic given below based on its listed topics.
+
+Format your response as JSON with this structure:
+{
+""" + _STRUCTURE_FORMAT + """
+}
+"""
+
+# Per-request parts of the prompts, sent after the static prefixes
+_EXTRACT_SUFFIX_TEMPLATE = """
+Topic: {query}
+
+{depth}
+
+Content:
+{content}
+"""
+
+_STRUCTURE_SUFFIX_TEMPLATE = """
+Topic: {query}
+
+Topics:
+{topics}
+
+{depth}
+"""
+
+def _depth_line(depth_level: Optional[str]) -> str:
+    """Describe the requested depth level for the prompts"""
+    return "Depth level: " + depth_level if depth_level else "No specific depth level provided."
+
+def _join_within_budget(parts: List[str], token_budget: int) -> str:
+    """
+    Join content parts, stopping once the token budget is used up
+    
+    Only the text that fits is copied, so large documents aren't concatenated
+    in full just to be cut off.
+    
+    Args:
+        parts: The content parts, in priority order
+        token_budget: Maximum number of tokens to keep
+        
+    Returns:
+        str: The parts joined by blank lines, truncated to the budget
+    """
+    char_budget = token_budget * CHARS_PER_TOKEN
+    kept = []
+    total = 0
+    for part in parts:
+        piece = part[:char_budget - total]
+        kept.append(piece)
+        total += len(piece) + 2  # account for the separator
+        if total >= char_budget:
+            break
+    return "\n\n".join(kept)
+
+def _fallback_topics(query: str) -> List[Dict[str, Any]]:
+    """Topics used when none could be extracted for the query; a copy the caller may change"""
+    if "machine learning" in query.lower():
+        return get_default_ml_topics()
+    return copy.deepcopy(_generic_topics(query))
+
+@functools.lru_cache(maxsize=256)
+def _generic_topics(query: str) -> List[Dict[str, Any]]:
+    """Simple generic topics based on the query; cached and shared, so only ever copied"""
     return [
         {
-            "name": "Introduction to Machine Learning",
-            "key_concepts": ["Supervised Learning", "Unsupervised Learning", "Reinforcement Learning"],
-            "skills": ["Basic Python", "Understanding ML Terminology"],
+            "name": f"Introduction to {query}",
+            "key_concepts": ["Basic concepts", "Terminology", "History"],
+            "skills": ["Fundamental understanding"],
             "prerequisites": []
         },
         {
-            "name": "Data Preprocessing",
-            "key_concepts": ["Feature Scaling", "Missing Values", "Categorical Encoding"],
-            "skills": ["Data Cleaning", "Feature Engineering"],
-            "prerequisites": ["Introduction to Machine Learning"]
-        },
-        {
-            "name": "Regression Algorithms",
-            "key_concepts": ["Linear Regression", "Polynomial Regression", "Regularization"],
-            "skills": ["Model Evaluation", "Hyperparameter Tuning"],
-            "prerequisites": ["Data Preprocessing"]
+            "name": f"Core {query} Techniques",
+            "key_concepts": ["Key principles", "Standard methods"],
+            "skills": ["Application of concepts"],
+            "prerequisites": [f"Introduction to {query}"]
         },
         {
-            "name": "Classification Algorithms",
-            "key_concepts": ["Logistic Regression", "Decision Trees", "Random Forest"],
-            "skills": ["Confusion Matrix", "Classification Metrics"],
-            "prerequisites": ["Data Preprocessing"]
-        },
-        {
-            "name": "Clustering Algorithms",
-            "key_concepts": ["K-Means", "Hierarchical Clustering", "DBSCAN"],
-            "skills": ["Cluster Analysis", "Dimensionality Reduction"],
-            "prerequisites": ["Data Preprocessing"]
+            "name": f"Advanced {query}",
+            "key_concepts": ["Complex techniques", "Current research"],
+            "skills": ["Problem solving", "Critical analysis"],
+            "prerequisites": [f"Core {query} Techniques"]
         }
     ]
 
+def _apply_structure(output: KnowledgeOutput, structure_data: Dict[str, Any], depth_level: Optional[str]) -> None:
+    """Copy the knowledge path and depth metrics from a structure response onto the output"""
+    if "knowledge_path" in structure_data:
+        output.knowledge_structure = {
+            "knowledge_path": structure_data["knowledge_path"]
+        }
+        
+    if "depth_metrics" in structure_data:
+        output.depth_metrics = structure_data["depth_metrics"]
+        
+    # Set total time directly from time constraint
+    if depth_level:
+        output.complexity_level = depth_level
+    else:
+        output.complexity_level = "Not specified"
+
+# Fallback curriculum used for machine learning queries when topic extraction fails;
+# only handed out as copies, so callers can't change it for later requests
+_DEFAULT_ML_TOPICS = [
+    {
+        "name": "Introduction to Machine Learning",
+        "key_concepts": ["Supervised Learning", "Unsupervised Learning", "Reinforcement Learning"],
+        "skills": ["Basic Python", "Understanding ML Terminology"],
+        "prerequisites": []
+    },
+    {
+        "name": "Data Preprocessing",
+        "key_concepts": ["Feature Scaling", "Missing Values", "Categorical Encoding"],
+        "skills": ["Data Cleaning", "Feature Engineering"],
+        "prerequisites": ["Introduction to Machine Learning"]
+    },
+    {
+        "name": "Regression Algorithms",
+        "key_concepts": ["Linear Regression", "Polynomial Regression", "Regularization"],
+        "skills": ["Model Evaluation", "Hyperparameter Tuning"],
+        "prerequisites": ["Data Preprocessing"]
+    },
+    {
+        "name": "Classification Algorithms",
+        "key_concepts": ["Logistic Regression", "Decision Trees", "Random Forest"],
+        "skills": ["Confusion Matrix", "Classification Metrics"],
+        "prerequisites": ["Data Preprocessing"]
+    },
+    {
+        "name": "Clustering Algorithms",
+        "key_concepts": ["K-Means", "Hierarchical Clustering", "DBSCAN"],
+        "skills": ["Cluster Analysis", "Dimensionality Reduction"],
+        "prerequisites": ["Data Preprocessing"]
+    }
+]
+
+def get_default_ml_topics():
+    """Fallback function to provide default ML curriculum topics when API is unavailable."""
+    return copy.deepcopy(_DEFAULT_ML_TOPICS)
+
+async def _generate_json(client, prompt: str, static_prefix: str) -> Dict[str, Any]:
+    """
+    Stream a JSON response from Gemini and parse it while it arrives
+    
+    Args:
+        client: The genai client
+        prompt: The per-request part of the prompt
+        static_prefix: The static instructions, served from Gemini's prompt cache when possible
+        
+    Returns:
+        Dict[str, Any]: The parsed JSON object
+    """
+    # Build the top-level object incrementally so parsing overlaps with the network
+    objects = ijson.sendable_list()
+    parser = ijson.items_coro(objects, '')
+    chunks = []
+    async for text in cached_generate_stream(
+        client,
+        COORDINATOR_MODEL,
+        prompt,
+        config={
+            'response_mime_type': 'application/json'
+        },
+        static_prefix=static_prefix
+    ):
+        chunks.append(text)
+        if parser is None:
+            continue
+        try:
+            parser.send(text.encode())
+        except ijson.JSONError:
+            # Not plain JSON (e.g. fenced); the full text is parsed below
+            parser = None
+    
+    if parser is not None:
+        try:
+            parser.close()
+            if objects:
+                return objects[0]
+        except ijson.JSONError:
+            pass
+    # Parse JSON, ignoring any markdown fence around it
+    return parse_llm_json("".join(chunks))
+
+def _build_http_session() -> requests.Session:
+    """HTTP session with pooled keep-alive connections and retries for source downloads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(total=3, backoff_factor=0.3))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Shared across calls so repeated downloads from the same hosts reuse connections
+_http_session = _build_http_session()
+
+def _download_pdf(url: str) -> io.BytesIO:
+    """
+    Download a PDF into memory
+    
+    Args:
+        url: The PDF URL
+        
+    Returns:
+        io.BytesIO: The PDF contents, positioned at the start
+    """
+    buffer = io.BytesIO()
+    with _http_session.get(url, stream=True, timeout=PDF_DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        # Copy straight from the socket in 1 MiB reads instead of iterating over small chunks;
+        # decode_content undoes any gzip/deflate transfer encoding
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, buffer, length=1024 * 1024)
+    buffer.seek(0)
+    return buffer
+
+async def _search_for_sources(search_query: str) -> Tuple[str, List[str]]:
+    """Google search used when no source content could be extracted; errors yield no results"""
+    try:
+        return await cached_google_search_async(search_query)
+    except Exception as e:
+        logger.error("Error performing Google search: %s", e)
+        return "", []
+
 def coordinate(user_input: ResearchInput) -> ResearchCompleteOutput:
+    """
+    Synchronous wrapper around coordinate_async, for scripts
+    
+    Inside the API, await coordinate_async on the server's event loop instead:
+    the shared Gemini client's async connection pool must only be used from one loop.
+    
+    Args:
+        user_input: Structure containing query, optional syllabus URL, and time constraint
+        
+    Returns:
+        ResearchCompleteOutput: Complete output with raw data and formatted overview
+    """
+    return run_sync(coordinate_async(user_input))
+
+async def coordinate_async(user_input: ResearchInput) -> ResearchCompleteOutput:
     """
     Coordinates processing of user input to create structured data for curriculum planning.
     
@@ -135,6 +593,21 @@ def coordinate(user_input: ResearchInput) -> ResearchCompleteOutput:
     """
     # Generate UUID for this curriculum step
     research_id = str(uuid.uuid4())
+    client = get_gemini_client()
+    
+    # Reuse a previous research for a near-identical request
+    cache_embedding = None
+    try:
+        cache_embedding = await embed_text(client, user_input.query)
+        cached = _research_cache.lookup(cache_embedding, _research_cache_scope(user_input))
+        if cached:
+            logger.debug("Semantic cache hit for research: %s", user_input.query)
+            return await asyncio.to_thread(_reuse_research, ResearchCompleteOutput.model_validate_json(cached), research_id)
+    except Exception as e:
+        logger.error("Error checking research cache: %s", e)
+    
+    # Only complete results are cached; any fallback below clears this
+    cacheable = True
     
     # Extract inputs
     query = user_input.query
@@ -155,33 +628,23 @@ def coordinate(user_input: ResearchInput) -> ResearchCompleteOutput:
     
     # Step 1: Process syllabus if provided
     extracted_content = []
+    search_query = f"{query} research source"
+    search_task = None
     if source_url:
-        print(f"Processing source from: {source_url}")
+        logger.debug("Processing source from: %s", source_url)
+        
+        # Start the fallback search alongside the source download so a failed
+        # extraction doesn't have to wait for it
+        search_task = asyncio.create_task(_search_for_sources(search_query))
         
         # Determine if it's a web page or file to download
         if source_url.endswith('.pdf'):
             # Handle PDF syllabus
             try:
-                # Download the PDF
-                response = requests.get(source_url, stream=True)
-                response.raise_for_status()
-                
-                # Save to temporary file
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        tmp_file.write(chunk)
-                    temp_path = tmp_file.name
-                
-                # Process the PDF
-                documents = process_pdf(temp_path)
+                # Download the PDF and process it straight from memory
+                pdf_buffer = await asyncio.to_thread(_download_pdf, source_url)
+                documents = await asyncio.to_thread(process_pdf_bytes, pdf_buffer, source_url.split("/")[-1])
                 
-                # Clean up temp file
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
-                    
                 # Extract content
                 for doc in documents:
                     extracted_content.append(doc.page_content)
@@ -194,11 +657,11 @@ def coordinate(user_input: ResearchInput) -> ResearchCompleteOutput:
                 })
                 
             except Exception as e:
-                print(f"Error processing PDF source: {e}")
+                logger.error("Error processing PDF source: %s", e)
         else:
             # Process as web URL
             try:
-                documents = process_web(source_url)
+                documents = await asyncio.to_thread(process_web, source_url)
                 
                 # Extract content
                 for doc in documents:
@@ -212,258 +675,112 @@ def coordinate(user_input: ResearchInput) -> ResearchCompleteOutput:
                 })
                 
             except Exception as e:
-                print(f"Error processing web source: {e}")
+                logger.error("Error processing web source: %s", e)
     
     # Step 2: If no source provided or extraction failed, use Google search
     if not extracted_content:
-        print("No source provided or extraction failed, using Google search")
-        search_query = f"{query} research source"
-        try:
-            search_results, search_links = google_search(search_query)
+        logger.debug("No source provided or extraction failed, using Google search")
+        if search_task is None:
+            search_task = asyncio.create_task(_search_for_sources(search_query))
+        search_results, search_links = await search_task
+        
+        if search_results:
+            extracted_content.append(search_results)
             
-            if search_results:
-                extracted_content.append(search_results)
-                
-                # Add search links to source materials
-                for link in search_links:
-                    output.source_materials.append({
-                        "type": "web",
-                        "url": link,
-                        "title": link
-                    })
-                
-                # Always ensure we have extracted content from Google search
-                # to generate topics even without a source
-                print("Using search results to extract research topics")
-        except Exception as e:
-            print(f"Error performing Google search: {e}")
+            # Add search links to source materials
+            for link in search_links:
+                output.source_materials.append({
+                    "type": "web",
+                    "url": link,
+                    "title": link
+                })
+            
+            # Always ensure we have extracted content from Google search
+            # to generate topics even without a source
+            logger.debug("Using search results to extract research topics")
+    elif search_task is not None:
+        # The source was enough; the speculative search isn't needed
+        search_task.cancel()
     
-    # Step 3: Extract key topics and concepts from content
+    # Step 3: Extract key topics and concepts from content, and structure them in the same request
+    structured = False
     if extracted_content:
-        combined_content = "\n\n".join(extracted_content)
+        combined_content = _join_within_budget(extracted_content, CONTENT_TOKEN_BUDGET)
         
         # Use direct Gemini API to extract topics
-        from google import genai
-        
         try:
-            api_key = os.getenv("GEMINI_API_KEY", "")
-            client = genai.Client(api_key=api_key)
-            
-            extract_prompt = f"""
-            Based on the following content about '{query}', extract:
-            
-            1. The main topics that should be included in a research
-            2. Key concepts and skills for each topic
-            3. Logical ordering of topics
-            4. Any prerequisites or dependent relationships between topics
-            
-            Content:
-            {combined_content[:10000]}  # Limit content length to avoid token limits
+            extract_suffix = _EXTRACT_SUFFIX_TEMPLATE.format_map({
+                "query": query,
+                "depth": _depth_line(depth_level),
+                "content": combined_content
+            })
             
-            Format your response as JSON with this structure:
-            {{
-              "topics": [
-                {{
-                  "name": "Topic name",
-                  "key_concepts": ["concept1", "concept2"],
-                  "skills": ["skill1", "skill2"],
-                  "prerequisites": ["prerequisite topics if any"]
-                }}
-              ]
-            }}
-            """
-            
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=extract_prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            # Process the response
-            response_text = response.text
-            
-            # Clean up the response if needed
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-                
-            # Parse JSON
-            extracted_data = json.loads(response_text.strip())
+            # Repeat requests for the same query and content are answered from the LLM cache
+            extracted_data = await _generate_json(client, extract_suffix, _STATIC_EXTRACT_PREFIX)
             
             if "topics" in extracted_data:
                 output.key_concepts = extracted_data["topics"]
+                if "knowledge_path" in extracted_data:
+                    _apply_structure(output, extracted_data, depth_level)
+                    structured = True
         
         except Exception as e:
-            print(f"Error extracting topics: {e}")
+            logger.error("Error extracting topics: %s", e)
+            cacheable = False
             # Fallback to default topics if API call fails
-            print("Using default ML topics as fallback")
-            if "machine learning" in query.lower():
-                output.key_concepts = get_default_ml_topics()
-            else:
-                # Generate simple generic topics based on the query
-                output.key_concepts = [
-                    {
-                        "name": f"Introduction to {query}",
-                        "key_concepts": ["Basic concepts", "Terminology", "History"],
-                        "skills": ["Fundamental understanding"],
-                        "prerequisites": []
-                    },
-                    {
-                        "name": f"Core {query} Techniques",
-                        "key_concepts": ["Key principles", "Standard methods"],
-                        "skills": ["Application of concepts"],
-                        "prerequisites": [f"Introduction to {query}"]
-                    },
-                    {
-                        "name": f"Advanced {query}",
-                        "key_concepts": ["Complex techniques", "Current research"],
-                        "skills": ["Problem solving", "Critical analysis"],
-                        "prerequisites": [f"Core {query} Techniques"]
-                    }
-                ]
+            logger.debug("Using default ML topics as fallback")
+            output.key_concepts = _fallback_topics(query)
     else:
         # If we have no extracted content, use default topics
-        print("No content extracted, using default topic structure")
-        if "machine learning" in query.lower():
-            output.key_concepts = get_default_ml_topics()
-        else:
-            # Generate simple generic topics based on the query
-            output.key_concepts = [
-                {
-                    "name": f"Introduction to {query}",
-                    "key_concepts": ["Basic concepts", "Terminology", "History"],
-                    "skills": ["Fundamental understanding"],
-                    "prerequisites": []
-                },
-                {
-                    "name": f"Core {query} Techniques",
-                    "key_concepts": ["Key principles", "Standard methods"],
-                    "skills": ["Application of concepts"],
-                    "prerequisites": [f"Introduction to {query}"]
-                },
-                {
-                    "name": f"Advanced {query}",
-                    "key_concepts": ["Complex techniques", "Current research"],
-                    "skills": ["Problem solving", "Critical analysis"],
-                    "prerequisites": [f"Core {query} Techniques"]
-                }
-            ]
-    
-    # Step 4: Create suggested structure based on topics and time constraint
-    if output.key_concepts:
+        logger.debug("No content extracted, using default topic structure")
+        cacheable = False
+        output.key_concepts = _fallback_topics(query)
+    
+    # Step 4: Create suggested structure for topics that weren't structured in step 3
+    if output.key_concepts and not structured:
         try:
-            # Use direct Gemini API to create structure
-            api_key = os.getenv("GEMINI_API_KEY", "")
-            client = genai.Client(api_key=api_key)
-            
-            structure_prompt = f"""
-            Create a knowledge structure for '{query}' based on these topics:
-            
-            {json.dumps(output.key_concepts)}
-            
-            {"Depth level: " + depth_level if depth_level else "No specific depth level provided."}
-            
-            Format your response as JSON with this structure:
-            {{
-              "knowledge_path": [
-                {{
-                  "module": "Module name",
-                  "topics": ["Topic 1", "Topic 2"],
-                  "learning_outcomes": ["outcome1", "outcome2"],
-                  "suggested_duration": "X weeks/hours"
-                }}
-              ],
-              "depth_metrics": {{
-                "module1": "duration",
-                "module2": "duration"
-              }}
-            }}
-            """
-            
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=structure_prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            # Process the response
-            response_text = response.text
-            
-            # Clean up the response if needed
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-                
-            # Parse JSON
-            structure_data = json.loads(response_text.strip())
+            structure_suffix = _STRUCTURE_SUFFIX_TEMPLATE.format_map({
+                "query": query,
+                "topics": dumps(output.key_concepts),
+                "depth": _depth_line(depth_level)
+            })
             
-            if "knowledge_path" in structure_data:
-                output.knowledge_structure = {
-                    "knowledge_path": structure_data["knowledge_path"]
-                }
-                
-            if "depth_metrics" in structure_data:
-                output.depth_metrics = structure_data["depth_metrics"]
-                
-            # Set total time directly from time constraint
-            if depth_level:
-                output.complexity_level = depth_level
-            else:
-                output.complexity_level = "Not specified"
+            structure_data = await _generate_json(client, structure_suffix, _STATIC_STRUCTURE_PREFIX)
+            _apply_structure(output, structure_data, depth_level)
         
         except Exception as e:
-            print(f"Error creating knowledge structure: {e}")
+            logger.error("Error creating knowledge structure: %s", e)
+            cacheable = False
             # Set default time if structure creation failed
             output.complexity_level = depth_level if depth_level else "8 weeks (default)"
-    else:
+    elif not output.key_concepts:
         # No topics, set default time
         output.complexity_level = depth_level if depth_level else "Not specified"
     
-    # Save curriculum step to Supabase
-    overview_data = {
-        "topics": output.key_concepts,
-        # Removed source_materials from what gets stored
-    }
-    
-    detailed_content = {
-        "knowledge_path": output.knowledge_structure.get("knowledge_path", []),
-        "depth_metrics": output.depth_metrics
-    }
-    
-    # Save to Supabase
-    save_result = save_curriculum_step(
-        research_id,
-        query,  # subject as step_title
-        output.complexity_level,  # total_time as estimated_time
-        overview_data,
-        detailed_content
-    )
-    
-    if not save_result:
-        print("Warning: Failed to save curriculum step to database")
+    # Save curriculum step to Supabase in the background; the saved data doesn't
+    # depend on the overview, so the write overlaps with overview generation
+    save_future = _save_executor.submit(_save_research_step, output)
+    save_future.add_done_callback(_report_save_error)
     
     # Step 5: Generate curriculum overview using the overview agent
-    print("Generating detailed curriculum overview...")
+    logger.debug("Generating detailed curriculum overview...")
     try:
         # Clear source materials before passing to overview generation
         output.source_materials = []
         
-        overview_result = generate_overview(output)
+        overview_result = await generate_overview(output)
+        # Convert the overview model to the dictionary the services read from
+        overview_dict = overview_result.model_dump()
         
         # Format as text - use the new universal formatter
-        formatted_text = format_any_overview_text(overview_result)
-        print("Curriculum overview generation complete!")
+        formatted_text = format_any_overview_text(overview_dict)
+        logger.debug("Curriculum overview generation complete")
         
         # IMPORTANT: Do not perform automatic additional searches for knowledge context here
         # Let the user confirm the overview structure first before generating detailed content
     except Exception as e:
-        print(f"Error generating overview: {e}")
+        logger.error("Error generating overview: %s", e)
+        cacheable = False
         # Create a minimal overview if generation failed
         from agents.overview_agent import CurriculumStep, CurriculumOverview
         overview_result = CurriculumOverview(
@@ -479,21 +796,28 @@ def coordinate(user_input: ResearchInput) -> ResearchCompleteOutput:
             ],
             total_time=output.complexity_level
         )
-        formatted_text = format_curriculum_text(overview_result)
-    
-    # Convert the overview_result object to a dictionary
-    # Only convert if it's not already a dictionary
-    if isinstance(overview_result, dict):
-        overview_dict = overview_result
-    else:
-        overview_dict = overview_result.dict() if hasattr(overview_result, 'dict') else vars(overview_result)
+        overview_dict = overview_result.model_dump()
+        formatted_text = format_any_overview_text(overview_dict)
     
     # Return complete output
-    return ResearchCompleteOutput(
+    result = ResearchCompleteOutput(
         raw_data=output,
         overview=overview_dict,
         formatted_text=formatted_text
     )
+    
+    if cacheable and cache_embedding is not None:
+        _research_cache.add(cache_embedding, result.model_dump_json(), _research_cache_scope(user_input))
+    
+    # Callers may look the research up by its ID straight away, so only return once the
+    # row is written; the overview usually takes far longer, so this rarely waits
+    try:
+        await asyncio.wrap_future(save_future)
+    except Exception:
+        # Already reported by _report_save_error
+        pass
+    
+    return result
 
 if __name__ == "__main__":
     # Example usage
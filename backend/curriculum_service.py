@@ -1,16 +1,29 @@
-import os
-import json
+import asyncio
 import uuid
-import traceback
-from typing import Dict, Any, List, Optional, Tuple
+import logging
+from pathlib import Path
+import functools
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from pydantic import BaseModel
 
 # Import curriculum generation components
-from coordinator_agent import ResearchInput as CoordinatorInput, coordinate
+from coordinator_agent import ResearchInput as CoordinatorInput, coordinate_async
 from agents.overview_agent import CurriculumStep, CurriculumOverview, format_curriculum_text
-from utils.curriculum_utils import save_curriculum_step, get_curriculum_step, update_curriculum_step
-from agents.writeragents import modify_curriculum
-from agents.detailagent import generate_section_detail as generate_step_detail, format_detailed_section_text as format_detailed_step_text, SectionDetailInput as StepDetailInput, DetailedSection as DetailedStep
+from utils.curriculum_utils import save_curriculum_step, get_curriculum_step, save_curriculum_step_details, delete_curriculum_step
+from agents.writeragents import modify_curriculum_async
+from agents.detailagent import MAX_CONCURRENT_SECTIONS, generate_section_detail as generate_step_detail, generate_sections_batch as generate_all_step_details, format_detailed_section_text as format_detailed_step_text, SectionDetailInput as StepDetailInput, DetailedSection as DetailedStep
+
+logger = logging.getLogger(__name__)
+
+# Opening lines of every roadmap diagram
+_MERMAID_HEADER = "flowchart LR\n    Start([Start]) --> Step1\n"
+_NODE_TEMPLATE = '    {node_id}["{title}<br><small>{estimated_time}</small>"]\n'
+_EDGE_TEMPLATE = "    {node_id} --> Step{next_index}\n"
+
+# Node titles longer than this are cut short to keep the diagram readable
+_MAX_TITLE = 30
+_TRUNC = _MAX_TITLE - 1
+_ELLIPSIS = "…"
 
 class CurriculumRequest(BaseModel):
     """Request model for curriculum generation"""
@@ -46,12 +59,13 @@ class RoadmapResponse(BaseModel):
 class CurriculumListResponse(BaseModel):
     """Response model for listing curriculums"""
     curriculums: List[Dict[str, str]]
+    next_offset: Optional[int] = None
 
 class CurriculumCreateRequest(BaseModel):
     """Request model for creating a new curriculum"""
     curriculum_name: str
 
-def generate_curriculum(request: CurriculumRequest) -> CurriculumResponse:
+async def generate_curriculum(request: CurriculumRequest) -> CurriculumResponse:
     """
     Generate a curriculum based on the request parameters
     
@@ -69,8 +83,8 @@ def generate_curriculum(request: CurriculumRequest) -> CurriculumResponse:
             depth_level=request.time_constraint
         )
         
-        # Generate curriculum
-        result = coordinate(coordinator_input)
+        # Generate curriculum on the caller's event loop
+        result = await coordinate_async(coordinator_input)
         
         # Create response
         return CurriculumResponse(
@@ -83,10 +97,99 @@ def generate_curriculum(request: CurriculumRequest) -> CurriculumResponse:
             formatted_text=result.formatted_text
         )
     except Exception as e:
-        error_details = f"Error generating curriculum: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error generating curriculum: %s", e)
         raise Exception(f"Failed to generate curriculum: {str(e)}")
 
+def _row_content(curriculum_id: str, curriculum_step: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str], Tuple[str, ...]]:
+    """Hashable snapshot of the row fields a curriculum overview is built from, used as its memo key"""
+    step_data = (curriculum_step.get("overview", {}) or {}).get("topics", [])
+    return (
+        curriculum_id,
+        curriculum_step.get("step_title"),
+        curriculum_step.get("estimated_time"),
+        tuple(topic.get("name", "Unknown step") for topic in step_data)
+    )
+
+@functools.lru_cache(maxsize=256)
+def _overview_from_content(content: Tuple[str, Optional[str], Optional[str], Tuple[str, ...]]) -> CurriculumOverview:
+    """
+    Build a curriculum overview from row content, once per distinct content
+    
+    Keyed by what was read rather than by ID, so a changed row simply misses;
+    staleness is bounded by the row cache in curriculum_utils.
+    
+    Args:
+        content: Row snapshot from _row_content
+        
+    Returns:
+        CurriculumOverview built from the row's topics
+    """
+    curriculum_id, step_title, estimated_time, step_titles = content
+    
+    # Fields come from our own database, so skip validation
+    steps = [
+        CurriculumStep.model_construct(
+            title=title,
+            objectives=[],
+            estimated_time="Not specified"
+        )
+        for title in step_titles
+    ]
+    
+    return CurriculumOverview.model_construct(
+        curriculum_id=curriculum_id,
+        title=step_title or "Untitled Curriculum",
+        overview=f"A curriculum covering key aspects of {step_title or 'the subject'}.",
+        steps=steps,
+        total_time=estimated_time or "Not specified"
+    )
+
+def _overview_from_row(curriculum_id: str, curriculum_step: Dict[str, Any]) -> CurriculumOverview:
+    """
+    Build the curriculum overview stored in a curriculum_steps row
+    
+    Args:
+        curriculum_id: The UUID of the curriculum
+        curriculum_step: The database row for the curriculum
+        
+    Returns:
+        CurriculumOverview built from the row's topics
+    """
+    return _overview_from_content(_row_content(curriculum_id, curriculum_step))
+
+def _load_content(curriculum_id: str) -> Tuple[str, Optional[str], Optional[str], Tuple[str, ...]]:
+    """
+    Fetch a curriculum's row, through the TTL row cache, and snapshot its overview content
+    
+    Args:
+        curriculum_id: The UUID of the curriculum
+        
+    Returns:
+        Row snapshot from _row_content
+        
+    Raises:
+        Exception: If the curriculum doesn't exist
+    """
+    curriculum_step = get_curriculum_step(curriculum_id)
+    
+    if not curriculum_step:
+        raise Exception(f"Curriculum with ID {curriculum_id} not found")
+    
+    return _row_content(curriculum_id, curriculum_step)
+
+def _load_overview(curriculum_id: str) -> CurriculumOverview:
+    """Fetch a curriculum from the database and build its overview"""
+    return _overview_from_content(_load_content(curriculum_id))
+
+@functools.lru_cache(maxsize=256)
+def _formatted_text(content: Tuple[str, Optional[str], Optional[str], Tuple[str, ...]]) -> str:
+    """Formatted text of a curriculum's overview, computed once per distinct overview content"""
+    return format_curriculum_text(_overview_from_content(content))
+
+def _step_dicts(overview: CurriculumOverview) -> List[Dict[str, str]]:
+    """Response step dicts of a curriculum; a new list every call, so callers may change it"""
+    return [{"title": step.title, "estimated_time": step.estimated_time} for step in overview.steps]
+
 def get_curriculum(curriculum_id: str) -> CurriculumResponse:
     """
     Get a curriculum by ID
@@ -98,34 +201,12 @@ def get_curriculum(curriculum_id: str) -> CurriculumResponse:
         CurriculumResponse with the curriculum data
     """
     try:
-        # Get curriculum step from database
-        curriculum_step = get_curriculum_step(curriculum_id)
-        
-        if not curriculum_step:
-            raise Exception(f"Curriculum with ID {curriculum_id} not found")
-        
-        # Parse overview data
-        overview_data = curriculum_step.get("overview", {})
-        step_data = overview_data.get("topics", [])
-        
-        steps = []
-        for topic in step_data:
-            steps.append({
-                "title": topic.get("name", "Unknown step"),
-                "estimated_time": "Not specified"
-            })
-        
-        # Create curriculum overview
-        overview = CurriculumOverview(
-            curriculum_id=curriculum_id,
-            title=curriculum_step.get("step_title", "Untitled Curriculum"),
-            overview=f"A curriculum covering key aspects of {curriculum_step.get('step_title', 'the subject')}.",
-            steps=[CurriculumStep(title=step["title"], estimated_time=step["estimated_time"]) for step in steps],
-            total_time=curriculum_step.get("estimated_time", "Not specified")
-        )
+        content = _load_content(curriculum_id)
+        overview = _overview_from_content(content)
+        steps = _step_dicts(overview)
         
         # Format text
-        formatted_text = format_curriculum_text(overview)
+        formatted_text = _formatted_text(content)
         
         # Create response
         return CurriculumResponse(
@@ -137,11 +218,10 @@ def get_curriculum(curriculum_id: str) -> CurriculumResponse:
             formatted_text=formatted_text
         )
     except Exception as e:
-        error_details = f"Error retrieving curriculum: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error retrieving curriculum: %s", e)
         raise Exception(f"Failed to retrieve curriculum: {str(e)}")
 
-def modify_curriculum_by_id(curriculum_id: str, request: CurriculumModificationRequest) -> CurriculumResponse:
+async def modify_curriculum_by_id(curriculum_id: str, request: CurriculumModificationRequest) -> CurriculumResponse:
     """
     Modify a curriculum based on the request
     
@@ -154,65 +234,44 @@ def modify_curriculum_by_id(curriculum_id: str, request: CurriculumModificationR
     """
     try:
         # Get current curriculum
-        curriculum_step = get_curriculum_step(curriculum_id)
+        current_curriculum = await asyncio.to_thread(_load_overview, curriculum_id)
         
-        if not curriculum_step:
-            raise Exception(f"Curriculum with ID {curriculum_id} not found")
-            
-        # Parse current curriculum data
-        overview_data = curriculum_step.get("overview", {})
-        step_data = overview_data.get("topics", [])
-        
-        # Create curriculum overview object from data
-        steps = []
-        for topic in step_data:
-            steps.append(CurriculumStep(
-                title=topic.get("name", "Unknown step"),
-                estimated_time="Not specified"
-            ))
-        
-        current_curriculum = CurriculumOverview(
-            curriculum_id=curriculum_id,
-            title=curriculum_step.get("step_title", "Untitled Curriculum"),
-            overview=f"A curriculum covering key aspects of {curriculum_step.get('step_title', 'the subject')}.",
-            steps=steps,
-            total_time=curriculum_step.get("estimated_time", "Not specified")
-        )
+        # Apply modifications, batched with any other edits of this curriculum arriving at the same time
+        modified_data = await modify_curriculum_async(current_curriculum, request.modification_text)
         
-        # Apply modifications
-        modified_data = modify_curriculum(current_curriculum, request.modification_text)
+        # Step dicts for the response, built straight from the JSON data
+        step_dicts = [
+            {
+                "title": step_data.get("title", "Untitled Step"),
+                "estimated_time": step_data.get("estimated_time", "Not specified")
+            }
+            for step_data in modified_data.get("steps", [])
+        ]
         
-        # Create new steps from the JSON data
-        new_steps = []
-        for step_data in modified_data.get("steps", []):
-            new_steps.append(CurriculumStep(
-                title=step_data.get("title", "Untitled Step"),
-                estimated_time=step_data.get("estimated_time", "Not specified")
-            ))
+        # Create new steps from the same dicts; the LLM output is validated here, once
+        new_steps = [CurriculumStep(**step_dict) for step_dict in step_dicts]
         
-        # Create a new curriculum with the updated steps
-        updated_curriculum = CurriculumOverview(
-            curriculum_id=curriculum_id,
-            title=current_curriculum.title,
-            overview=current_curriculum.overview,
-            steps=new_steps,
-            total_time=current_curriculum.total_time
-        )
+        # Create a new curriculum with the updated steps, reusing the validated objects as they are
+        updated_curriculum = current_curriculum.model_copy(update={"steps": new_steps})
         
         # Format as text
         formatted_text = format_curriculum_text(updated_curriculum)
         
-        # Save updated curriculum to database
+        # Save updated curriculum to database, in the topics layout the overview is read back from
         updated_overview_data = {
-            "steps": [{"title": step.title, "estimated_time": step.estimated_time} 
+            "topics": [{"name": step.title, "estimated_time": step.estimated_time}
                     for step in updated_curriculum.steps]
         }
         
-        save_result = save_curriculum_step(
+        # Stored details belong to the previous steps, so they are cleared in the same
+        # write and regenerated on demand
+        save_result = await asyncio.to_thread(
+            save_curriculum_step,
             curriculum_id,
             updated_curriculum.title,
             updated_curriculum.total_time,
-            updated_overview_data
+            updated_overview_data,
+            detailed_content={}
         )
         
         if not save_result:
@@ -223,17 +282,53 @@ def modify_curriculum_by_id(curriculum_id: str, request: CurriculumModificationR
             curriculum_id=curriculum_id,
             title=updated_curriculum.title,
             overview=updated_curriculum.overview,
-            steps=[{"title": step.title, "estimated_time": step.estimated_time} 
-                  for step in updated_curriculum.steps],
+            steps=step_dicts,
             total_time=updated_curriculum.total_time,
             formatted_text=formatted_text
         )
     except Exception as e:
-        error_details = f"Error modifying curriculum: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error modifying curriculum: %s", e)
         raise Exception(f"Failed to modify curriculum: {str(e)}")
 
-def generate_curriculum_details(curriculum_id: str) -> Dict[int, StepDetailResponse]:
+def _stored_step(existing_detail: Dict[str, Any], step: CurriculumStep) -> DetailedStep:
+    """Rebuild a detailed step from the content stored in the database"""
+    # Missing fields fall back to the model defaults
+    return DetailedStep.model_validate({
+        "section_title": step.title,
+        "estimated_time": step.estimated_time,
+        **existing_detail
+    })
+
+def _step_input(curriculum: CurriculumOverview, index: int) -> StepDetailInput:
+    """Build the detail generator input for one step of a curriculum"""
+    # The detail generator works on sections: a step maps to a section of the curriculum's topic
+    step = curriculum.steps[index]
+    return StepDetailInput(
+        section_title=step.title,
+        estimated_time=step.estimated_time,
+        topic=curriculum.title
+    )
+
+def _step_response(detailed_step: DetailedStep, content: Optional[Dict[str, Any]] = None) -> StepDetailResponse:
+    """
+    Wrap a detailed step in the API response model, with its formatted text
+    
+    Args:
+        detailed_step: The detailed step
+        content: The step already dumped with model_dump(mode='json'), e.g. for a
+            database save; dumped here when not given
+        
+    Returns:
+        StepDetailResponse for the step
+    """
+    return StepDetailResponse(
+        step_title=detailed_step.section_title,
+        estimated_time=detailed_step.estimated_time,
+        content=content if content is not None else detailed_step.model_dump(mode='json'),
+        formatted_text=format_detailed_step_text(detailed_step)
+    )
+
+async def generate_curriculum_details(curriculum_id: str) -> Dict[int, StepDetailResponse]:
     """
     Generate detailed content for all steps in a curriculum
     
@@ -245,36 +340,21 @@ def generate_curriculum_details(curriculum_id: str) -> Dict[int, StepDetailRespo
     """
     try:
         # Get curriculum
-        curriculum_step = get_curriculum_step(curriculum_id)
+        curriculum_step = await asyncio.to_thread(get_curriculum_step, curriculum_id)
         
         if not curriculum_step:
             raise Exception(f"Curriculum with ID {curriculum_id} not found")
             
-        # Parse curriculum data
-        overview_data = curriculum_step.get("overview", {})
-        step_data = overview_data.get("topics", [])
-        
-        # Create curriculum overview object from data
-        steps = []
-        for topic in step_data:
-            steps.append(CurriculumStep(
-                title=topic.get("name", "Unknown step"),
-                estimated_time="Not specified"
-            ))
-        
-        curriculum = CurriculumOverview(
-            curriculum_id=curriculum_id,
-            title=curriculum_step.get("step_title", "Untitled Curriculum"),
-            overview=f"A curriculum covering key aspects of {curriculum_step.get('step_title', 'the subject')}.",
-            steps=steps,
-            total_time=curriculum_step.get("estimated_time", "Not specified")
-        )
+        curriculum = _overview_from_row(curriculum_id, curriculum_step)
         
         # Check if detailed_content already exists in the curriculum_step
         detailed_content = curriculum_step.get("detailed_content", {}) or {}
         
         # Process each step
         detailed_steps = {}
+        step_details = {}
+        step_contents = {}
+        missing_indices = []
         
         for index, step in enumerate(curriculum.steps):
             step_key = f"step_{index}"
@@ -283,67 +363,114 @@ def generate_curriculum_details(curriculum_id: str) -> Dict[int, StepDetailRespo
             if existing_detail:
                 print(f"Retrieved existing detailed content for step {index}")
                 # Use existing detailed content
-                detailed_step = DetailedStep(
-                    step_title=existing_detail.get("step_title", step.title),
-                    estimated_time=existing_detail.get("estimated_time", step.estimated_time),
-                    learning_objectives=existing_detail.get("learning_objectives", []),
-                    subtopics=existing_detail.get("subtopics", []),
-                    core_concepts=existing_detail.get("core_concepts", ""),
-                    learning_resources=existing_detail.get("learning_resources", []),
-                    practice_exercises=existing_detail.get("practice_exercises", []),
-                    assessment_methods=existing_detail.get("assessment_methods", ""),
-                    advanced_topics=existing_detail.get("advanced_topics", []),
-                    connections=existing_detail.get("connections", {})
-                )
+                step_details[index] = _stored_step(existing_detail, step)
             else:
                 print(f"Generating new detailed content for step {index}")
-                # Set up input for detail generator
-                detail_input = StepDetailInput(
-                    step_title=step.title,
-                    estimated_time=step.estimated_time,
-                    subject=curriculum.title
-                )
-                
-                # Generate detailed content
-                detailed_step = generate_step_detail(detail_input)
-                
-                # Save the detailed content to curriculum_steps table
-                try:
-                    from utils.curriculum_utils import save_curriculum_step_detail
-                    detail_dict = detailed_step.dict()
-                    detailed_content_key = f"{curriculum_id}_step_{index}"
-                    save_result = save_curriculum_step_detail(
-                        detailed_content_key,
-                        curriculum_id,
-                        index,
-                        detail_dict
-                    )
-                    if save_result:
-                        print(f"Successfully saved detailed content for step {index}")
-                    else:
-                        print(f"Failed to save detailed content for step {index}")
-                except Exception as e:
-                    print(f"Error saving detailed content: {e}")
+                missing_indices.append(index)
+        
+        if missing_indices:
+            # Generate all missing steps concurrently
+            detail_inputs = [_step_input(curriculum, index) for index in missing_indices]
+            generated_steps = await generate_all_step_details(detail_inputs)
             
-            # Format as text
-            detailed_text = format_detailed_step_text(detailed_step)
+            for index, detailed_step in zip(missing_indices, generated_steps):
+                step_details[index] = detailed_step
+                # Dumped once; shared by the database save and the response
+                step_contents[index] = detailed_step.model_dump(mode='json')
+            
+            # Save the detailed content of every new step to the database in one update
+            save_result = await asyncio.to_thread(save_curriculum_step_details, curriculum_id, step_contents)
+            if not save_result:
+                print(f"Failed to save detailed content for steps {missing_indices}")
+        
+        for index in range(len(curriculum.steps)):
+            detailed_step = step_details[index]
             
             # Store the results
             if detailed_step:
-                detailed_steps[index] = StepDetailResponse(
-                    step_title=detailed_step.step_title,
-                    estimated_time=detailed_step.estimated_time,
-                    content=detailed_step.dict(),
-                    formatted_text=detailed_text
-                )
+                detailed_steps[index] = _step_response(detailed_step, step_contents.get(index))
         
         return detailed_steps
     except Exception as e:
-        error_details = f"Error generating curriculum details: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error generating curriculum details: %s", e)
         raise Exception(f"Failed to generate curriculum details: {str(e)}")
 
-def get_step_detail(curriculum_id: str, step_index: int) -> StepDetailResponse:
+async def stream_curriculum_details(curriculum_id: str) -> AsyncIterator[Tuple[int, StepDetailResponse]]:
+    """
+    Yield the detailed content of each curriculum step as soon as it is available
+    
+    Stored details are yielded first, in step order. Missing steps are then
+    generated concurrently and yielded in completion order, so the first
+    step can be shown while the slowest one is still being generated. Each
+    generated step is saved as soon as it's ready, so progress survives the
+    client disconnecting mid-stream.
+    
+    Args:
+        curriculum_id: The UUID of the curriculum
+        
+    Yields:
+        Tuple[int, StepDetailResponse]: The step index and its detailed content
+    """
+    curriculum_step = await asyncio.to_thread(get_curriculum_step, curriculum_id)
+    
+    if not curriculum_step:
+        raise Exception(f"Curriculum with ID {curriculum_id} not found")
+    
+    curriculum = _overview_from_row(curriculum_id, curriculum_step)
+    detailed_content = curriculum_step.get("detailed_content", {}) or {}
+    
+    missing_indices = []
+    for index, step in enumerate(curriculum.steps):
+        existing_detail = detailed_content.get(f"step_{index}")
+        if existing_detail:
+            yield index, _step_response(_stored_step(existing_detail, step))
+        else:
+            missing_indices.append(index)
+    
+    if not missing_indices:
+        return
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SECTIONS)
+    # Saves read-modify-write the same detailed_content column, so run them one at a time
+    save_lock = asyncio.Lock()
+    
+    async def generate_and_save(index: int) -> Tuple[int, DetailedStep, Dict[str, Any]]:
+        async with semaphore:
+            detailed_step = await generate_step_detail(_step_input(curriculum, index))
+        content = detailed_step.model_dump(mode='json')
+        async with save_lock:
+            save_result = await asyncio.to_thread(save_curriculum_step_details, curriculum_id, {index: content})
+        if not save_result:
+            print(f"Failed to save detailed content for step {index}")
+        return index, detailed_step, content
+    
+    for next_step in asyncio.as_completed([generate_and_save(index) for index in missing_indices]):
+        index, detailed_step, content = await next_step
+        yield index, _step_response(detailed_step, content)
+
+async def _generate_single_step_detail(curriculum_id: str, curriculum: CurriculumOverview, index: int) -> Tuple[DetailedStep, Dict[str, Any]]:
+    """
+    Generate and store the detailed content of one curriculum step
+    
+    Args:
+        curriculum_id: The UUID of the curriculum
+        curriculum: The curriculum overview
+        index: The index of the step to generate
+        
+    Returns:
+        Tuple[DetailedStep, Dict[str, Any]]: The generated step detail and its dumped content
+    """
+    detailed_step = await generate_step_detail(_step_input(curriculum, index))
+    content = detailed_step.model_dump(mode='json')
+    
+    # Save the detailed content so the next read is served from the database
+    save_result = await asyncio.to_thread(save_curriculum_step_details, curriculum_id, {index: content})
+    if not save_result:
+        print(f"Failed to save detailed content for step {index}")
+    
+    return detailed_step, content
+
+async def get_step_detail(curriculum_id: str, step_index: int) -> StepDetailResponse:
     """
     Get detailed content for a specific step
     
@@ -356,66 +483,33 @@ def get_step_detail(curriculum_id: str, step_index: int) -> StepDetailResponse:
     """
     try:
         # Get the curriculum with detailed content
-        curriculum_step = get_curriculum_step(curriculum_id)
+        curriculum_step = await asyncio.to_thread(get_curriculum_step, curriculum_id)
         
         if not curriculum_step:
             raise Exception(f"Curriculum with ID {curriculum_id} not found")
         
+        curriculum = _overview_from_row(curriculum_id, curriculum_step)
+        
+        if step_index < 0 or step_index >= len(curriculum.steps):
+            raise Exception(f"Step index {step_index} out of range for curriculum {curriculum_id}")
+        
         # Check if detailed content exists in the curriculum_step
         detailed_content = curriculum_step.get("detailed_content", {}) or {}
-        step_key = f"step_{step_index}"
-        existing_detail = detailed_content.get(step_key)
+        existing_detail = detailed_content.get(f"step_{step_index}")
         
         if existing_detail:
             print(f"Retrieved existing detailed content for step {step_index}")
-            
-            # Parse curriculum data to get step title
-            overview_data = curriculum_step.get("overview", {})
-            step_data = overview_data.get("topics", [])
-            
-            if step_index >= len(step_data):
-                raise Exception(f"Step index {step_index} out of range for curriculum {curriculum_id}")
-            
-            step_title = step_data[step_index].get("name", "Unknown step")
-            estimated_time = "Not specified"
-            
-            # Create DetailedStep from stored data
-            detailed_step = DetailedStep(
-                step_title=existing_detail.get("step_title", step_title),
-                estimated_time=existing_detail.get("estimated_time", estimated_time),
-                learning_objectives=existing_detail.get("learning_objectives", []),
-                subtopics=existing_detail.get("subtopics", []),
-                core_concepts=existing_detail.get("core_concepts", ""),
-                learning_resources=existing_detail.get("learning_resources", []),
-                practice_exercises=existing_detail.get("practice_exercises", []),
-                assessment_methods=existing_detail.get("assessment_methods", ""),
-                advanced_topics=existing_detail.get("advanced_topics", []),
-                connections=existing_detail.get("connections", {})
-            )
-            
-            # Format as text
-            detailed_text = format_detailed_step_text(detailed_step)
-            
-            # Return the response
-            return StepDetailResponse(
-                step_title=detailed_step.step_title,
-                estimated_time=detailed_step.estimated_time,
-                content=detailed_step.dict(),
-                formatted_text=detailed_text
-            )
+            detailed_step = _stored_step(existing_detail, curriculum.steps[step_index])
+            content = None
         else:
-            print(f"No existing detail found for step {step_index}, will generate new content")
-            # If we don't have stored content, generate all details
-            all_details = generate_curriculum_details(curriculum_id)
-            
-            # Check if the requested step exists
-            if step_index not in all_details:
-                raise Exception(f"Step with index {step_index} not found in curriculum {curriculum_id}")
-            
-            return all_details[step_index]
+            print(f"No existing detail found for step {step_index}, generating it")
+            # Only the requested step is generated; the others are generated when they're read
+            detailed_step, content = await _generate_single_step_detail(curriculum_id, curriculum, step_index)
+        
+        # Return the response
+        return _step_response(detailed_step, content)
     except Exception as e:
-        error_details = f"Error retrieving step detail: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error retrieving step detail: %s", e)
         raise Exception(f"Failed to retrieve step detail: {str(e)}")
 
 def generate_roadmap(curriculum_id: str) -> RoadmapResponse:
@@ -430,76 +524,46 @@ def generate_roadmap(curriculum_id: str) -> RoadmapResponse:
     """
     try:
         # Get curriculum
-        curriculum_step = get_curriculum_step(curriculum_id)
-        
-        if not curriculum_step:
-            raise Exception(f"Curriculum with ID {curriculum_id} not found")
-            
-        # Parse curriculum data
-        overview_data = curriculum_step.get("overview", {})
-        step_data = overview_data.get("topics", [])
-        
-        # Create curriculum overview object from data
-        steps = []
-        for topic in step_data:
-            steps.append(CurriculumStep(
-                title=topic.get("name", "Unknown step"),
-                estimated_time="Not specified"
-            ))
-        
-        curriculum = CurriculumOverview(
-            curriculum_id=curriculum_id,
-            title=curriculum_step.get("step_title", "Untitled Curriculum"),
-            overview=f"A curriculum covering key aspects of {curriculum_step.get('step_title', 'the subject')}.",
-            steps=steps,
-            total_time=curriculum_step.get("estimated_time", "Not specified")
-        )
+        curriculum = _load_overview(curriculum_id)
         
-        # Create a flowchart diagram using Mermaid syntax
-        mermaid_code = """
-        flowchart LR
-            Start([Start]) --> Step1
-        """
+        # Create a flowchart diagram using Mermaid syntax, collecting the lines
+        # and joining them once at the end
+        n = len(curriculum.steps)
+        parts: List[str] = [_MERMAID_HEADER]
         
         # Add each step as a node
         for i, step in enumerate(curriculum.steps, 1):
             # Add the step node
             step_id = f"Step{i}"
-            step_title = step.title
-            estimated_time = step.estimated_time
             
             # Truncate long titles for better display
-            if len(step_title) > 30:
-                step_title = step_title[:27] + "..."
-                
-            mermaid_code += f"""
-            {step_id}["{step_title}<br><small>{estimated_time}</small>"]
-            """
+            step_title = step.title if len(step.title) <= _MAX_TITLE else step.title[:_TRUNC] + _ELLIPSIS
+            parts.append(_NODE_TEMPLATE.format(node_id=step_id, title=step_title, estimated_time=step.estimated_time))
             
             # Add connection to next step if not the last one
-            if i < len(curriculum.steps):
-                mermaid_code += f"""
-            {step_id} --> Step{i+1}
-                """
+            if i < n:
+                parts.append(_EDGE_TEMPLATE.format(node_id=step_id, next_index=i + 1))
         
         # Add final node
-        mermaid_code += """
-            Step{} --> Finish([Complete])
-        """.format(len(curriculum.steps))
+        parts.append(f"    Step{n} --> Finish([Complete])\n")
+        mermaid_code = "".join(parts)
         
         return RoadmapResponse(
             curriculum_id=curriculum_id,
             mermaid_code=mermaid_code
         )
     except Exception as e:
-        error_details = f"Error generating roadmap: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error generating roadmap: %s", e)
         raise Exception(f"Failed to generate roadmap: {str(e)}")
 
-def get_all_curriculums() -> CurriculumListResponse:
+def get_all_curriculums(limit: Optional[int] = None, offset: int = 0) -> CurriculumListResponse:
     """
     Get a list of all available curriculums
     
+    Args:
+        limit: Maximum number of curriculums to return, or None for all of them
+        offset: Number of curriculums to skip
+    
     Returns:
         CurriculumListResponse containing list of curriculum metadata
     """
@@ -508,7 +572,7 @@ def get_all_curriculums() -> CurriculumListResponse:
         from utils.curriculum_utils import get_all_curriculum_steps
         
         # Query all curriculum records from Supabase
-        curriculum_records = get_all_curriculum_steps()
+        curriculum_records = get_all_curriculum_steps(limit, offset)
         
         # Format the curriculum list for response
         curriculum_list = []
@@ -518,10 +582,12 @@ def get_all_curriculums() -> CurriculumListResponse:
                 "curriculum_name": record.get("step_title", "Untitled Curriculum")
             })
         
-        return CurriculumListResponse(curriculums=curriculum_list)
+        # A full page means there may be more rows after it
+        next_offset = offset + limit if limit is not None and len(curriculum_records) == limit else None
+        
+        return CurriculumListResponse(curriculums=curriculum_list, next_offset=next_offset)
     except Exception as e:
-        error_details = f"Error listing curriculums: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error listing curriculums: %s", e)
         raise Exception(f"Failed to list curriculums: {str(e)}")
 
 def create_curriculum(request: CurriculumCreateRequest) -> Dict[str, str]:
@@ -563,8 +629,7 @@ def create_curriculum(request: CurriculumCreateRequest) -> Dict[str, str]:
             "curriculum_name": curriculum_name
         }
     except Exception as e:
-        error_details = f"Error creating curriculum: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error creating curriculum: %s", e)
         raise Exception(f"Failed to create curriculum: {str(e)}")
 
 def delete_curriculum_by_id(curriculum_id: str) -> bool:
@@ -583,17 +648,14 @@ def delete_curriculum_by_id(curriculum_id: str) -> bool:
         if not curriculum_step:
             raise Exception(f"Curriculum with ID {curriculum_id} not found")
         
-        # Delete curriculum file
-        # In a real implementation, you would remove from your database
-        curriculum_file = os.path.join(os.path.dirname(__file__), "data", "curriculums", f"{curriculum_id}.json")
-        if os.path.exists(curriculum_file):
-            os.remove(curriculum_file)
-            return True
-        else:
-            # Not found on disk but was found by get_curriculum_step
-            # This suggests an inconsistency, but return True as the intent is fulfilled
-            return True
+        # Remove the database row, then any file left from the older file-based storage
+        if not delete_curriculum_step(curriculum_id):
+            raise Exception(f"Failed to delete curriculum {curriculum_id} from the database")
+        
+        curriculum_file = Path(__file__).parent / "data" / "curriculums" / f"{curriculum_id}.json"
+        curriculum_file.unlink(missing_ok=True)
+        
+        return True
     except Exception as e:
-        error_details = f"Error deleting curriculum: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error deleting curriculum: %s", e)
         raise Exception(f"Failed to delete curriculum: {str(e)}")
@@ -1,128 +1,263 @@
 import tempfile
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import BinaryIO, Dict, List, Tuple, Optional
 import os
+import re
+import asyncio
+import hashlib
+import mimetypes
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
 import bs4
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader, CSVLoader
+import requests
+from cachetools import TTLCache
+from langchain_community.document_loaders import PyPDFLoader, CSVLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from google import genai
 from google.genai import types  # Add the types import
+from config import GEMINI_API_KEY
+from utils.gemini_client import get_gemini_client, get_instruction_cache
+from utils import llm_cache
+from utils.llm_cache import make_key
 
-def prepare_document(file_path: str) -> List[Document]:
-    """
-    Processes any document type using Gemini API and returns it in a format
-    compatible with the vector storage system.
-    
-    Args:
-        file_path (str): Path to the document file
-        
-    Returns:
-        List[Document]: List containing the processed document
-    """
-    try:
-        # Handle API key retrieval for both Streamlit and FastAPI environments
-        if 'st' in globals() and hasattr(st, 'session_state'):
-            # Streamlit environment
-            api_key = st.session_state.get("google_api_key", os.getenv("GEMINI_API_KEY", ""))
-        else:
-            # FastAPI environment - get from environment only
-            api_key = os.getenv("GEMINI_API_KEY", "")
-            
-        client = genai.Client(api_key=api_key)
-        
-        # Determine appropriate prompt based on file type
-        file_extension = os.path.splitext(file_path)[1].lower()
-        
-        # Upload the file directly using the improved approach
-        try:
-            uploaded_file = client.files.upload(file=file_path)
-        except Exception as upload_error:
-            raise ValueError(f"File upload failed: {str(upload_error)}")
+# Gemini model used to extract the content of uploaded files
+DOCUMENT_MODEL = "gemini-2.0-flash"
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+TABULAR_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Most files sent to Gemini in one extraction request by prepare_documents
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "8"))
+
+# Marker Gemini writes before the content of each file in a batched response
+_FILE_MARKER = re.compile(r"^=== FILE (\d+) ===[ \t]*$", re.MULTILINE)
+
+_BATCH_INSTRUCTIONS = """
+The {count} files above are each introduced by a line "=== FILE <number> ===".
+For every file, in order, write the line "=== FILE <number> ===" on its own and then
+the content requested for that file below. Write nothing before the first marker.
+"""
+
+# Block size used when hashing uploaded files for the response cache
+DIGEST_BLOCK_SIZE = 64 * 1024
+
+# How long a fetched web page is kept for revalidation, in seconds
+WEB_CACHE_TTL = int(os.getenv("WEB_CACHE_TTL", "3600"))
 
-        # Build appropriate prompt based on file type
-        if file_extension in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-            prompt = """
+# Web pages keyed by URL: (etag, last_modified, body hash, parsed documents)
+_web_cache: TTLCache = TTLCache(maxsize=256, ttl=WEB_CACHE_TTL)
+_web_cache_lock = threading.Lock()
+
+# Instructions sent along with each uploaded file, by source type
+DOCUMENT_PROMPTS = {
+    "image": """
             Please analyze and describe this image in detail. Include:
             1. Type of content and main subject
             2. Key information or features
             3. Visual elements and their significance
             4. Any text present in the image
             5. Overall meaning and context
-            """
-            source_type = "image"
-        elif file_extension == ['.csv', '.xlsx', '.xls']:
-            prompt = """
+            """,
+    "csv": """
             Please analyze this CSV data thoroughly. For each row and column:
             1. Extract all data in a structured format
             2. List all column headers
             3. Provide a summary of the data
             4. Include all numerical values and text content exactly as they appear
             5. Preserve any relationships between data points
-            """
-            source_type = "csv"
-        else:
-            prompt = """
+            """,
+    "document": """
             just type all the content of the document in a single line without any formatting.
             if there is any image describe it in detail.
             """
-            source_type = "document"
-
-        # Create content with the file and prompt
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_uri(
-                        file_uri=uploaded_file.uri,
-                        mime_type=uploaded_file.mime_type,
-                    ),
-                    types.Part.from_text(text=prompt),
-                ],
-            ),
-        ]
+}
+
+def _get_api_key() -> str:
+    """Handle API key retrieval for both Streamlit and FastAPI environments"""
+    if 'st' in globals() and hasattr(st, 'session_state'):
+        # Streamlit environment
+        return st.session_state.get("google_api_key", GEMINI_API_KEY)
+    # FastAPI environment - get from environment only
+    return GEMINI_API_KEY
+
+def _get_client(api_key: str) -> genai.Client:
+    """Get the shared, pooled Gemini client, or a dedicated one for a user-supplied key"""
+    return get_gemini_client() if api_key == GEMINI_API_KEY else genai.Client(api_key=api_key)
+
+def _source_type(file_path: str) -> str:
+    """Pick the source type, and with it the extraction instructions, from the file extension"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension in IMAGE_EXTENSIONS:
+        return "image"
+    if file_extension in TABULAR_EXTENSIONS:
+        return "csv"
+    return "document"
+
+def _content_cache_key(file_path: str, file_obj: Optional[BinaryIO], prompt: str) -> str:
+    """Response cache key for a file's extracted content: the same file with the same instructions yields the same content"""
+    return make_key(DOCUMENT_MODEL, f"{prompt}\nfile:{_file_digest(file_path, file_obj)}")
+
+def _file_digest(file_path: str, file_obj: Optional[BinaryIO] = None) -> str:
+    """
+    Hash a file's contents in fixed-size blocks, without loading it all at once
+    
+    Args:
+        file_path: Path to the file, used when file_obj is not given
+        file_obj: In-memory file contents, positioned at the start; rewound afterwards
+        
+    Returns:
+        str: BLAKE2b hex digest of the contents
+    """
+    digest = hashlib.blake2b()
+    if file_obj is not None:
+        for block in iter(lambda: file_obj.read(DIGEST_BLOCK_SIZE), b""):
+            digest.update(block)
+        file_obj.seek(0)
+    else:
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(DIGEST_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _upload_file(client: genai.Client, file_path: str, file_obj: Optional[BinaryIO] = None):
+    """Upload a file to Gemini, from its path or from memory"""
+    # Upload the file directly using the improved approach
+    try:
+        if file_obj is not None:
+            # In-memory uploads need an explicit MIME type since there is no file to inspect
+            mime_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            return client.files.upload(file=file_obj, config=types.UploadFileConfig(mime_type=mime_type))
+        return client.files.upload(file=file_path)
+    except Exception as upload_error:
+        raise ValueError(f"File upload failed: {str(upload_error)}")
 
-        # Configure response generation
-        generate_content_config = types.GenerateContentConfig(
+def _extraction_requests(uploaded_file, prompt: str, cache_name: Optional[str]) -> Tuple[list, Optional[types.GenerateContentConfig], list, types.GenerateContentConfig]:
+    """
+    Build the extraction request for an uploaded file
+    
+    Args:
+        uploaded_file: The file uploaded to Gemini
+        prompt: The extraction instructions
+        cache_name: Gemini cached-content handle holding the instructions, if any
+        
+    Returns:
+        Tuple: Contents and config for the first attempt, which uses the cache when there
+        is one, then contents and config with the instructions inline for the fallback
+    """
+    file_part = types.Part.from_uri(
+        file_uri=uploaded_file.uri,
+        mime_type=uploaded_file.mime_type,
+    )
+
+    # Create content with the file and prompt
+    contents = [types.Content(role="user", parts=[file_part, types.Part.from_text(text=prompt)])]
+
+    # Configure response generation
+    generate_content_config = types.GenerateContentConfig(
+        response_mime_type="text/plain",
+    )
+
+    if cache_name:
+        first_contents = [types.Content(role="user", parts=[file_part])]
+        first_config = types.GenerateContentConfig(
             response_mime_type="text/plain",
+            cached_content=cache_name,
         )
+        return first_contents, first_config, contents, generate_content_config
+    return contents, None, contents, generate_content_config
+
+def _extract_content(client: genai.Client, api_key: str, file_path: str, file_obj: Optional[BinaryIO], prompt: str) -> str:
+    """
+    Upload a file to Gemini and have it extract the file's content
+    
+    Args:
+        client: The genai client to use
+        api_key: The API key the client was created with
+        file_path: Path to the file, or just its name when file_obj is given
+        file_obj: In-memory file contents to upload instead of reading file_path
+        prompt: The extraction instructions
+        
+    Returns:
+        str: The extracted content
+    """
+    uploaded_file = _upload_file(client, file_path, file_obj)
 
-        # Generate content with streaming
+    # Serve the instructions from a Gemini context cache when Gemini accepts them, so
+    # only the file is sent with the request. Caches belong to the API key that made
+    # them, so this only applies to the shared key.
+    cache_name = get_instruction_cache(DOCUMENT_MODEL, prompt) if api_key == GEMINI_API_KEY else None
+    first_contents, first_config, contents, generate_content_config = _extraction_requests(uploaded_file, prompt, cache_name)
+
+    # Generate content with streaming
+    try:
+        # First try non-streaming method as fallback if needed
         try:
-            # First try non-streaming method as fallback if needed
-            try:
-                response = client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=contents,
-                )
-                content = response.text
-                print(f"Generated content using non-streaming method, length: {len(content)}")
-            except Exception as non_streaming_error:
-                print(f"Non-streaming attempt failed: {str(non_streaming_error)}")
-                # Try streaming as backup
-                response_chunks = []
-                for chunk in client.models.generate_content_stream(
-                    model="gemini-2.0-flash",
-                    contents=contents,
-                    config=generate_content_config,
-                ):
-                    if hasattr(chunk, 'text') and chunk.text:
-                        response_chunks.append(chunk.text)
-                    
-                if not response_chunks:
-                    raise ValueError("No content received from the streaming API")
-                    
-                content = "".join(response_chunks)
-                print(f"Generated content using streaming method, length: {len(content)}")
-            
-            if not content:
-                raise ValueError("Empty content received from the API")
+            response = client.models.generate_content(
+                model=DOCUMENT_MODEL,
+                contents=first_contents,
+                config=first_config,
+            )
+            content = response.text
+            print(f"Generated content using non-streaming method, length: {len(content)}")
+        except Exception as non_streaming_error:
+            print(f"Non-streaming attempt failed: {str(non_streaming_error)}")
+            # Try streaming as backup, with the instructions inline in case the cache expired
+            response_chunks = []
+            for chunk in client.models.generate_content_stream(
+                model=DOCUMENT_MODEL,
+                contents=contents,
+                config=generate_content_config,
+            ):
+                if hasattr(chunk, 'text') and chunk.text:
+                    response_chunks.append(chunk.text)
+                
+            if not response_chunks:
+                raise ValueError("No content received from the streaming API")
                 
-        except Exception as generation_error:
-            print(f"Detailed generation error: {str(generation_error)}")
-            raise ValueError(f"Content generation failed: {str(generation_error)}")
+            content = "".join(response_chunks)
+            print(f"Generated content using streaming method, length: {len(content)}")
+        
+        if not content:
+            raise ValueError("Empty content received from the API")
+            
+    except Exception as generation_error:
+        print(f"Detailed generation error: {str(generation_error)}")
+        raise ValueError(f"Content generation failed: {str(generation_error)}")
+    
+    return content
+
+def prepare_document(file_path: str, file_obj: Optional[BinaryIO] = None) -> List[Document]:
+    """
+    Processes any document type using Gemini API and returns it in a format
+    compatible with the vector storage system.
+    
+    Args:
+        file_path (str): Path to the document file, or just its name when file_obj is given
+        file_obj (Optional[BinaryIO]): In-memory file contents to upload instead of reading file_path
+        
+    Returns:
+        List[Document]: List containing the processed document
+    """
+    try:
+        api_key = _get_api_key()
+        
+        # Determine appropriate prompt based on file type
+        source_type = _source_type(file_path)
+        prompt = DOCUMENT_PROMPTS[source_type]
+        
+        # A re-upload is served from the response cache without calling Gemini
+        cache_key = _content_cache_key(file_path, file_obj, prompt)
+        content = llm_cache.get(cache_key)
+        if content is not None:
+            print(f"Reused cached content for {os.path.basename(file_path)}, length: {len(content)}")
+        else:
+            client = _get_client(api_key)
+            content = _extract_content(client, api_key, file_path, file_obj, prompt)
+            llm_cache.put(cache_key, content)
         
         # Create a Document object
         doc = Document(
@@ -154,6 +289,224 @@ def prepare_document(file_path: str) -> List[Document]:
         # Re-raise the exception with a clearer message
         raise ValueError(f"No text content could be extracted from the file: {str(e)}")
 
+async def _extract_content_async(client: genai.Client, api_key: str, file_path: str, prompt: str) -> str:
+    """
+    Async counterpart of _extract_content, using the client's async API
+    
+    Args:
+        client: The genai client to use
+        api_key: The API key the client was created with
+        file_path: Path to the file
+        prompt: The extraction instructions
+        
+    Returns:
+        str: The extracted content
+    """
+    try:
+        uploaded_file = await client.aio.files.upload(file=file_path)
+    except Exception as upload_error:
+        raise ValueError(f"File upload failed: {str(upload_error)}")
+
+    cache_name = await asyncio.to_thread(get_instruction_cache, DOCUMENT_MODEL, prompt) if api_key == GEMINI_API_KEY else None
+    first_contents, first_config, contents, generate_content_config = _extraction_requests(uploaded_file, prompt, cache_name)
+
+    try:
+        try:
+            response = await client.aio.models.generate_content(
+                model=DOCUMENT_MODEL,
+                contents=first_contents,
+                config=first_config,
+            )
+        except Exception as first_error:
+            print(f"First attempt failed: {str(first_error)}")
+            # Retry with the instructions inline in case the cache expired
+            response = await client.aio.models.generate_content(
+                model=DOCUMENT_MODEL,
+                contents=contents,
+                config=generate_content_config,
+            )
+        content = response.text
+        
+        if not content:
+            raise ValueError("Empty content received from the API")
+        print(f"Generated content using async method, length: {len(content)}")
+            
+    except Exception as generation_error:
+        print(f"Detailed generation error: {str(generation_error)}")
+        raise ValueError(f"Content generation failed: {str(generation_error)}")
+    
+    return content
+
+async def prepare_document_async(file_path: str) -> List[Document]:
+    """
+    Async counterpart of prepare_document for callers running on an event loop
+    
+    Network calls use the Gemini async API; the cache lookups and the text
+    splitting run in worker threads, so the event loop is never blocked.
+    
+    Args:
+        file_path (str): Path to the document file
+        
+    Returns:
+        List[Document]: List containing the processed document
+    """
+    try:
+        api_key = _get_api_key()
+        source_type = _source_type(file_path)
+        prompt = DOCUMENT_PROMPTS[source_type]
+        
+        # A re-upload is served from the response cache without calling Gemini
+        cache_key = await asyncio.to_thread(_content_cache_key, file_path, None, prompt)
+        content = await asyncio.to_thread(llm_cache.get, cache_key)
+        if content is not None:
+            print(f"Reused cached content for {os.path.basename(file_path)}, length: {len(content)}")
+        else:
+            # The shared client keeps a pooled async connection to Gemini
+            client = _get_client(api_key)
+            content = await _extract_content_async(client, api_key, file_path, prompt)
+            await asyncio.to_thread(llm_cache.put, cache_key, content)
+        
+        doc = Document(
+            page_content=content,
+            metadata={
+                "source_type": source_type,
+                "file_name": os.path.basename(file_path),
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+        
+        # Apply text splitting; it's pure CPU work
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        chunks = await asyncio.to_thread(text_splitter.split_documents, [doc])
+        print(f"Number of document chunks: {len(chunks)}")
+        
+        return chunks
+        
+    except Exception as e:
+        print(f"Document processing error: {str(e)}")
+        raise ValueError(f"No text content could be extracted from the file: {str(e)}")
+
+def _extract_batch(client: genai.Client, file_paths: List[str], prompts: List[str]) -> List[str]:
+    """
+    Upload several files in parallel and extract all of their contents with one Gemini request
+    
+    Args:
+        client: The genai client to use
+        file_paths: Paths to the files
+        prompts: The extraction instructions for each file
+        
+    Returns:
+        List[str]: The extracted content of each file, in input order
+        
+    Raises:
+        ValueError: If the response doesn't hold one non-empty section per file
+    """
+    # Uploads are network-bound, so run them side by side
+    with ThreadPoolExecutor(max_workers=len(file_paths)) as executor:
+        uploaded_files = list(executor.map(lambda path: _upload_file(client, path), file_paths))
+    
+    parts = []
+    instructions = []
+    for number, (uploaded_file, prompt) in enumerate(zip(uploaded_files, prompts), 1):
+        parts.append(types.Part.from_text(text=f"=== FILE {number} ==="))
+        parts.append(types.Part.from_uri(file_uri=uploaded_file.uri, mime_type=uploaded_file.mime_type))
+        instructions.append(f"FILE {number}:\n{textwrap.dedent(prompt).strip()}")
+    parts.append(types.Part.from_text(
+        text=_BATCH_INSTRUCTIONS.format(count=len(file_paths)) + "\n" + "\n\n".join(instructions)
+    ))
+    
+    response = client.models.generate_content(
+        model=DOCUMENT_MODEL,
+        contents=[types.Content(role="user", parts=parts)],
+    )
+    
+    # split() gives [preamble, number, content, number, content, ...]
+    sections = _FILE_MARKER.split(response.text or "")
+    contents: Dict[int, str] = {
+        int(number): content.strip() for number, content in zip(sections[1::2], sections[2::2])
+    }
+    expected = range(1, len(file_paths) + 1)
+    if sorted(contents) != list(expected) or not all(contents.values()):
+        raise ValueError(f"Expected {len(file_paths)} file sections, got {len(contents)}")
+    
+    print(f"Generated content for {len(file_paths)} files in one request")
+    return [contents[number] for number in expected]
+
+def prepare_documents(file_paths: List[str]) -> List[Document]:
+    """
+    Process several documents, extracting their contents with as few Gemini requests as possible
+    
+    Files already seen are served from the response cache. The rest are sent in
+    batches of up to MAX_BATCH_FILES files per request; a batch whose response
+    can't be split back into its files is processed one file at a time.
+    
+    Args:
+        file_paths (List[str]): Paths to the document files
+        
+    Returns:
+        List[Document]: The chunks of all documents, in input order
+    """
+    try:
+        api_key = _get_api_key()
+        source_types = [_source_type(file_path) for file_path in file_paths]
+        prompts = [DOCUMENT_PROMPTS[source_type] for source_type in source_types]
+        cache_keys = [_content_cache_key(file_path, None, prompt) for file_path, prompt in zip(file_paths, prompts)]
+        
+        contents: Dict[int, str] = {}
+        missing_indices = []
+        for index, cache_key in enumerate(cache_keys):
+            content = llm_cache.get(cache_key)
+            if content is not None:
+                contents[index] = content
+            else:
+                missing_indices.append(index)
+        
+        if missing_indices:
+            client = _get_client(api_key)
+            for start in range(0, len(missing_indices), MAX_BATCH_FILES):
+                batch = missing_indices[start:start + MAX_BATCH_FILES]
+                batch_contents = None
+                if len(batch) > 1:
+                    try:
+                        batch_contents = _extract_batch(client, [file_paths[i] for i in batch], [prompts[i] for i in batch])
+                    except Exception as batch_error:
+                        print(f"Batched extraction failed, processing files one at a time: {str(batch_error)}")
+                if batch_contents is None:
+                    batch_contents = [_extract_content(client, api_key, file_paths[i], None, prompts[i]) for i in batch]
+                
+                for index, content in zip(batch, batch_contents):
+                    contents[index] = content
+                    llm_cache.put(cache_keys[index], content)
+        
+        docs = [
+            Document(
+                page_content=contents[index],
+                metadata={
+                    "source_type": source_types[index],
+                    "file_name": os.path.basename(file_path),
+                    "timestamp": datetime.now().isoformat()
+                }
+            )
+            for index, file_path in enumerate(file_paths)
+        ]
+        
+        # Apply text splitting
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        chunks = text_splitter.split_documents(docs)
+        print(f"Number of document chunks: {len(chunks)}")
+        
+        return chunks
+        
+    except Exception as e:
+        print(f"Document processing error: {str(e)}")
+        raise ValueError(f"No text content could be extracted from the files: {str(e)}")
+
 # Keep existing functions for backward compatibility
 def process_pdf(file) -> List:
     """Process PDF file and add source metadata."""
@@ -182,6 +535,23 @@ def process_pdf(file) -> List:
         print(f"PDF processing error: {str(e)}")
         return []
 
+def process_pdf_bytes(buffer: BinaryIO, file_name: str) -> List:
+    """
+    Process a PDF held in memory, without staging it in a temporary file
+    
+    Args:
+        buffer: The PDF contents, positioned at the start
+        file_name: Name recorded in the document metadata
+        
+    Returns:
+        List: The document chunks, or an empty list on error
+    """
+    try:
+        return prepare_document(file_name, file_obj=buffer)
+    except Exception as e:
+        print(f"PDF processing error: {str(e)}")
+        return []
+
 def process_csv(file) -> List:
     """Process CSV file and add source metadata."""
     try:
@@ -248,9 +618,27 @@ def process_csv(file) -> List:
         # Raise the error instead of returning an empty list
         raise ValueError(f"Failed to process CSV file: {str(e)}")
 
+def _parse_web_page(url: str, html: str) -> List[Document]:
+    """Turn a fetched HTML page into a document with the same text and metadata WebBaseLoader produces"""
+    soup = bs4.BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    title = soup.find("title")
+    if title:
+        metadata["title"] = title.get_text()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description:
+        metadata["description"] = description.get("content", "No description found.")
+    html_tag = soup.find("html")
+    if html_tag:
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return [Document(page_content=soup.get_text(), metadata=metadata)]
+
 def load_web_document(url: str) -> List:
     """
-    Load a document from a specified URL using WebBaseLoader.
+    Load a document from a specified URL.
+
+    Pages fetched before are revalidated with a conditional GET, and the stored
+    documents are reused when the server answers 304 or returns the same body.
 
     Args:
         url (str): The URL of the webpage to load.
@@ -259,10 +647,37 @@ def load_web_document(url: str) -> List:
         List: The loaded document(s).
     """
     try:
-        loader = WebBaseLoader(url)
-        docs = loader.load()
-        print(f"Number of web documents loaded: {len(docs)}")
-        return docs
+        with _web_cache_lock:
+            cached = _web_cache.get(url)
+        
+        headers = {}
+        if cached:
+            etag, last_modified = cached[0], cached[1]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        
+        response = requests.get(url, headers=headers, timeout=15)
+        
+        if cached and response.status_code == 304:
+            docs = cached[3]
+            print(f"Web document not modified, reusing {len(docs)} cached document(s)")
+        else:
+            response.raise_for_status()
+            body_hash = hashlib.blake2b(response.content).hexdigest()
+            if cached and cached[2] == body_hash:
+                docs = cached[3]
+                print(f"Web document unchanged, reusing {len(docs)} cached document(s)")
+            else:
+                docs = _parse_web_page(url, response.text)
+                print(f"Number of web documents loaded: {len(docs)}")
+            
+            with _web_cache_lock:
+                _web_cache[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"), body_hash, docs)
+        
+        # Callers add their own metadata, so hand out copies of the cached documents
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
     except Exception as e:
         st.error(f"🌐 Web loading error: {str(e)}")
         return []
@@ -1,16 +1,28 @@
-import os
-import json
+import asyncio
 import uuid
-import traceback
+import logging
+from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
 from pydantic import BaseModel
 
 # Import knowledge generation components
-from coordinator_agent import ResearchInput, coordinate
-from agents.overview_agent import KnowledgeSection, KnowledgeOverview, format_overview_text, format_any_overview_text
-from utils.curriculum_utils import save_curriculum_step, get_curriculum_step, update_curriculum_step
-from agents.writeragents import modify_curriculum
-from agents.detailagent import generate_section_detail, format_detailed_section_text, SectionDetailInput, DetailedSection
+from coordinator_agent import ResearchInput, coordinate_async
+from agents.overview_agent import KnowledgeSection, KnowledgeOverview, CurriculumStep, CurriculumOverview, format_overview_text, format_any_overview_text
+from utils.curriculum_utils import save_curriculum_step, get_curriculum_step, update_curriculum_step, save_curriculum_step_details, delete_curriculum_step
+from agents.writeragents import modify_curriculum_async
+from agents.detailagent import generate_sections_batch, format_detailed_section_text, SectionDetailInput, DetailedSection
+
+logger = logging.getLogger(__name__)
+
+# Opening lines of every knowledge map diagram
+_MERMAID_HEADER = "flowchart LR\n    Start([Start]) --> Section1\n"
+_NODE_TEMPLATE = '    {node_id}["{title}<br><small>{estimated_time}</small>"]\n'
+_EDGE_TEMPLATE = "    {node_id} --> Section{next_index}\n"
+
+# Node titles longer than this are cut short to keep the diagram readable
+_MAX_TITLE = 30
+_TRUNC = _MAX_TITLE - 1
+_ELLIPSIS = "…"
 
 class KnowledgeRequest(BaseModel):
     """Request model for knowledge research generation"""
@@ -46,12 +58,13 @@ class KnowledgeMapResponse(BaseModel):
 class KnowledgeListResponse(BaseModel):
     """Response model for listing knowledge research"""
     researches: List[Dict[str, str]]
+    next_offset: Optional[int] = None
 
 class KnowledgeCreateRequest(BaseModel):
     """Request model for creating a new knowledge research"""
     research_name: str
 
-def generate_knowledge(request: KnowledgeRequest) -> KnowledgeResponse:
+async def generate_knowledge(request: KnowledgeRequest) -> KnowledgeResponse:
     """
     Generate a knowledge research based on the request parameters
     
@@ -70,7 +83,7 @@ def generate_knowledge(request: KnowledgeRequest) -> KnowledgeResponse:
         )
         
         # Generate knowledge research
-        result = coordinate(coordinator_input)
+        result = await coordinate_async(coordinator_input)
         
         # Use the new format_any_overview_text function instead of specific formatters
         formatted_text = format_any_overview_text(result.overview)
@@ -87,10 +100,43 @@ def generate_knowledge(request: KnowledgeRequest) -> KnowledgeResponse:
             formatted_text=formatted_text
         )
     except Exception as e:
-        error_details = f"Error generating knowledge research: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error generating knowledge research: %s", e)
         raise Exception(f"Failed to generate knowledge research: {str(e)}")
 
+def _knowledge_from_row(research_id: str, research_data: Dict[str, Any]) -> KnowledgeOverview:
+    """
+    Build the knowledge overview stored in a curriculum_steps row
+    
+    Args:
+        research_id: The UUID of the research
+        research_data: The database row for the research
+        
+    Returns:
+        KnowledgeOverview built from the row's topics
+    """
+    # Fields come from our own database, so skip validation
+    section_data = (research_data.get("overview", {}) or {}).get("topics", [])
+    
+    return KnowledgeOverview.model_construct(
+        research_id=research_id,
+        title=research_data.get("step_title", "Untitled Research"),
+        overview=f"Research covering key aspects of {research_data.get('step_title', 'the topic')}.",
+        sections=[
+            KnowledgeSection.model_construct(title=topic.get("name", "Unknown section"), estimated_time="Not specified")
+            for topic in section_data
+        ],
+        complexity_level=research_data.get("estimated_time", "Not specified")
+    )
+
+def _stored_section(existing_detail: Dict[str, Any], section_title: str, estimated_time: str) -> DetailedSection:
+    """Rebuild a detailed section from the content stored in the database"""
+    # Missing fields fall back to the model defaults
+    return DetailedSection.model_validate({
+        "section_title": section_title,
+        "estimated_time": estimated_time,
+        **existing_detail
+    })
+
 def get_knowledge(research_id: str) -> KnowledgeResponse:
     """
     Get a knowledge research by ID
@@ -108,25 +154,8 @@ def get_knowledge(research_id: str) -> KnowledgeResponse:
         if not research_data:
             raise Exception(f"Knowledge research with ID {research_id} not found")
         
-        # Parse overview data
-        overview_data = research_data.get("overview", {})
-        section_data = overview_data.get("topics", [])
-        
-        sections = []
-        for topic in section_data:
-            sections.append({
-                "title": topic.get("name", "Unknown section"),
-                "estimated_time": "Not specified"
-            })
-        
-        # Create knowledge overview
-        overview = KnowledgeOverview(
-            research_id=research_id,
-            title=research_data.get("step_title", "Untitled Research"),
-            overview=f"Research covering key aspects of {research_data.get('step_title', 'the topic')}.",
-            sections=[KnowledgeSection(title=section["title"], estimated_time=section["estimated_time"]) for section in sections],
-            complexity_level=research_data.get("estimated_time", "Not specified")
-        )
+        overview = _knowledge_from_row(research_id, research_data)
+        sections = [section.model_dump(include={"title", "estimated_time"}) for section in overview.sections]
         
         # Format text
         formatted_text = format_overview_text(overview)
@@ -141,11 +170,10 @@ def get_knowledge(research_id: str) -> KnowledgeResponse:
             formatted_text=formatted_text
         )
     except Exception as e:
-        error_details = f"Error retrieving knowledge research: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error retrieving knowledge research: %s", e)
         raise Exception(f"Failed to retrieve knowledge research: {str(e)}")
 
-def modify_knowledge_by_id(research_id: str, request: KnowledgeModificationRequest) -> KnowledgeResponse:
+async def modify_knowledge_by_id(research_id: str, request: KnowledgeModificationRequest) -> KnowledgeResponse:
     """
     Modify a knowledge research based on the request
     
@@ -158,51 +186,36 @@ def modify_knowledge_by_id(research_id: str, request: KnowledgeModificationReque
     """
     try:
         # Get current research
-        research_data = get_curriculum_step(research_id)
+        research_data = await asyncio.to_thread(get_curriculum_step, research_id)
         
         if not research_data:
             raise Exception(f"Knowledge research with ID {research_id} not found")
             
-        # Parse current research data
-        overview_data = research_data.get("overview", {})
-        section_data = overview_data.get("topics", [])
-        
-        # Create knowledge overview object from data
-        sections = []
-        for topic in section_data:
-            sections.append(KnowledgeSection(
-                title=topic.get("name", "Unknown section"),
-                estimated_time="Not specified"
-            ))
-        
-        current_knowledge = KnowledgeOverview(
-            research_id=research_id,
-            title=research_data.get("step_title", "Untitled Research"),
-            overview=f"Research covering key aspects of {research_data.get('step_title', 'the topic')}.",
-            sections=sections,
-            complexity_level=research_data.get("estimated_time", "Not specified")
-        )
+        current_knowledge = _knowledge_from_row(research_id, research_data)
         
-        # Apply modifications - reusing the curriculum modification function
-        # but adapting the response
-        modified_data = modify_curriculum(current_knowledge, request.modification_text)
+        # Apply modifications - reusing the curriculum modification function,
+        # which works on steps, then adapting the response back to sections
+        as_curriculum = CurriculumOverview.model_construct(
+            curriculum_id=research_id,
+            title=current_knowledge.title,
+            overview=current_knowledge.overview,
+            steps=[CurriculumStep.model_construct(title=section.title, estimated_time=section.estimated_time)
+                   for section in current_knowledge.sections],
+            total_time=current_knowledge.complexity_level
+        )
+        modified_data = await modify_curriculum_async(as_curriculum, request.modification_text)
         
-        # Create new sections from the JSON data
-        new_sections = []
-        for section_data in modified_data.get("steps", []):
-            new_sections.append(KnowledgeSection(
+        # Create new sections from the JSON data; the LLM output is validated here, once
+        new_sections = [
+            KnowledgeSection(
                 title=section_data.get("title", "Untitled Section"),
                 estimated_time=section_data.get("estimated_time", "Not specified")
-            ))
+            )
+            for section_data in modified_data.get("steps", [])
+        ]
         
-        # Create a new knowledge with the updated sections
-        updated_knowledge = KnowledgeOverview(
-            research_id=research_id,
-            title=current_knowledge.title,
-            overview=current_knowledge.overview,
-            sections=new_sections,
-            complexity_level=current_knowledge.complexity_level
-        )
+        # Create a new knowledge with the updated sections, reusing the validated objects as they are
+        updated_knowledge = current_knowledge.model_copy(update={"sections": new_sections})
         
         # Format as text
         formatted_text = format_overview_text(updated_knowledge)
@@ -213,11 +226,15 @@ def modify_knowledge_by_id(research_id: str, request: KnowledgeModificationReque
                     for section in updated_knowledge.sections]
         }
         
-        save_result = save_curriculum_step(
+        # Stored details belong to the previous sections, so they are cleared in the same
+        # write and regenerated on demand
+        save_result = await asyncio.to_thread(
+            save_curriculum_step,
             research_id,
             updated_knowledge.title,
             updated_knowledge.complexity_level,
-            updated_overview_data
+            updated_overview_data,
+            detailed_content={}
         )
         
         if not save_result:
@@ -228,17 +245,16 @@ def modify_knowledge_by_id(research_id: str, request: KnowledgeModificationReque
             research_id=research_id,
             title=updated_knowledge.title,
             overview=updated_knowledge.overview,
-            sections=[{"title": section.title, "estimated_time": section.estimated_time} 
-                  for section in updated_knowledge.sections],
+            sections=[section.model_dump(include={"title", "estimated_time"})
+                      for section in updated_knowledge.sections],
             complexity_level=updated_knowledge.complexity_level,
             formatted_text=formatted_text
         )
     except Exception as e:
-        error_details = f"Error modifying knowledge research: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error modifying knowledge research: %s", e)
         raise Exception(f"Failed to modify knowledge research: {str(e)}")
 
-def generate_section_details(research_id: str) -> Dict[int, SectionDetailResponse]:
+async def generate_section_details(research_id: str) -> Dict[int, SectionDetailResponse]:
     """
     Generate detailed content for all sections in a knowledge research
     
@@ -250,36 +266,20 @@ def generate_section_details(research_id: str) -> Dict[int, SectionDetailRespons
     """
     try:
         # Get research
-        research_data = get_curriculum_step(research_id)
+        research_data = await asyncio.to_thread(get_curriculum_step, research_id)
         
         if not research_data:
             raise Exception(f"Knowledge research with ID {research_id} not found")
             
-        # Parse research data
-        overview_data = research_data.get("overview", {})
-        section_data = overview_data.get("topics", [])
-        
-        # Create knowledge overview object from data
-        sections = []
-        for topic in section_data:
-            sections.append(KnowledgeSection(
-                title=topic.get("name", "Unknown section"),
-                estimated_time="Not specified"
-            ))
-        
-        knowledge = KnowledgeOverview(
-            research_id=research_id,
-            title=research_data.get("step_title", "Untitled Research"),
-            overview=f"Research covering key aspects of {research_data.get('step_title', 'the topic')}.",
-            sections=sections,
-            complexity_level=research_data.get("estimated_time", "Not specified")
-        )
+        knowledge = _knowledge_from_row(research_id, research_data)
         
         # Check if detailed_content already exists in the research_data
         detailed_content = research_data.get("detailed_content", {}) or {}
         
         # Process each section
         detailed_sections = {}
+        section_details = {}
+        missing_indices = []
         
         for index, section in enumerate(knowledge.sections):
             section_key = f"section_{index}"
@@ -288,47 +288,38 @@ def generate_section_details(research_id: str) -> Dict[int, SectionDetailRespons
             if existing_detail:
                 print(f"Retrieved existing detailed content for section {index}")
                 # Use existing detailed content
-                detailed_section = DetailedSection(
-                    section_title=existing_detail.get("section_title", section.title),
-                    estimated_time=existing_detail.get("estimated_time", section.estimated_time),
-                    key_points=existing_detail.get("key_points", []),
-                    subtopics=existing_detail.get("subtopics", []),
-                    core_concepts=existing_detail.get("core_concepts", ""),
-                    information_sources=existing_detail.get("information_sources", []),
-                    practical_applications=existing_detail.get("practical_applications", []),
-                    verification_methods=existing_detail.get("verification_methods", ""),
-                    advanced_exploration=existing_detail.get("advanced_exploration", []),
-                    relationships=existing_detail.get("relationships", {})
-                )
+                section_details[index] = _stored_section(existing_detail, section.title, section.estimated_time)
             else:
                 print(f"Generating new detailed content for section {index}")
-                # Set up input for detail generator
-                detail_input = SectionDetailInput(
-                    section_title=section.title,
-                    estimated_time=section.estimated_time,
+                missing_indices.append(index)
+        
+        if missing_indices:
+            # Generate all missing sections concurrently
+            detail_inputs = [
+                SectionDetailInput(
+                    section_title=knowledge.sections[index].title,
+                    estimated_time=knowledge.sections[index].estimated_time,
                     topic=knowledge.title
                 )
-                
-                # Generate detailed content
-                detailed_section = generate_section_detail(detail_input)
-                
-                # Save the detailed content to database
-                try:
-                    from utils.curriculum_utils import save_curriculum_step_detail
-                    detail_dict = detailed_section.dict()
-                    detailed_content_key = f"{research_id}_section_{index}"
-                    save_result = save_curriculum_step_detail(
-                        detailed_content_key,
-                        research_id,
-                        index,
-                        detail_dict
-                    )
-                    if save_result:
-                        print(f"Successfully saved detailed content for section {index}")
-                    else:
-                        print(f"Failed to save detailed content for section {index}")
-                except Exception as e:
-                    print(f"Error saving detailed content: {e}")
+                for index in missing_indices
+            ]
+            generated_sections = await generate_sections_batch(detail_inputs)
+            
+            for index, detailed_section in zip(missing_indices, generated_sections):
+                section_details[index] = detailed_section
+            
+            # Save the detailed content of every new section to the database in one update
+            save_result = await asyncio.to_thread(
+                save_curriculum_step_details,
+                research_id,
+                {index: section_details[index].model_dump(mode='json') for index in missing_indices},
+                key_prefix="section"
+            )
+            if not save_result:
+                print(f"Failed to save detailed content for sections {missing_indices}")
+        
+        for index in range(len(knowledge.sections)):
+            detailed_section = section_details[index]
             
             # Format as text
             detailed_text = format_detailed_section_text(detailed_section)
@@ -338,17 +329,16 @@ def generate_section_details(research_id: str) -> Dict[int, SectionDetailRespons
                 detailed_sections[index] = SectionDetailResponse(
                     section_title=detailed_section.section_title,
                     estimated_time=detailed_section.estimated_time,
-                    content=detailed_section.dict(),
+                    content=detailed_section.model_dump(mode='json'),
                     formatted_text=detailed_text
                 )
         
         return detailed_sections
     except Exception as e:
-        error_details = f"Error generating section details: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error generating section details: %s", e)
         raise Exception(f"Failed to generate section details: {str(e)}")
 
-def get_section_detail(research_id: str, section_index: int) -> SectionDetailResponse:
+async def get_section_detail(research_id: str, section_index: int) -> SectionDetailResponse:
     """
     Get detailed content for a specific section
     
@@ -361,7 +351,7 @@ def get_section_detail(research_id: str, section_index: int) -> SectionDetailRes
     """
     try:
         # Get the research with detailed content
-        research_data = get_curriculum_step(research_id)
+        research_data = await asyncio.to_thread(get_curriculum_step, research_id)
         
         if not research_data:
             raise Exception(f"Knowledge research with ID {research_id} not found")
@@ -385,18 +375,7 @@ def get_section_detail(research_id: str, section_index: int) -> SectionDetailRes
             estimated_time = "Not specified"
             
             # Create DetailedSection from stored data
-            detailed_section = DetailedSection(
-                section_title=existing_detail.get("section_title", section_title),
-                estimated_time=existing_detail.get("estimated_time", estimated_time),
-                key_points=existing_detail.get("key_points", []),
-                subtopics=existing_detail.get("subtopics", []),
-                core_concepts=existing_detail.get("core_concepts", ""),
-                information_sources=existing_detail.get("information_sources", []),
-                practical_applications=existing_detail.get("practical_applications", []),
-                verification_methods=existing_detail.get("verification_methods", ""),
-                advanced_exploration=existing_detail.get("advanced_exploration", []),
-                relationships=existing_detail.get("relationships", {})
-            )
+            detailed_section = _stored_section(existing_detail, section_title, estimated_time)
             
             # Format as text
             detailed_text = format_detailed_section_text(detailed_section)
@@ -405,13 +384,13 @@ def get_section_detail(research_id: str, section_index: int) -> SectionDetailRes
             return SectionDetailResponse(
                 section_title=detailed_section.section_title,
                 estimated_time=detailed_section.estimated_time,
-                content=detailed_section.dict(),
+                content=detailed_section.model_dump(mode='json'),
                 formatted_text=detailed_text
             )
         else:
             print(f"No existing detail found for section {section_index}, will generate new content")
             # If we don't have stored content, generate all details
-            all_details = generate_section_details(research_id)
+            all_details = await generate_section_details(research_id)
             
             # Check if the requested section exists
             if section_index not in all_details:
@@ -419,8 +398,7 @@ def get_section_detail(research_id: str, section_index: int) -> SectionDetailRes
             
             return all_details[section_index]
     except Exception as e:
-        error_details = f"Error retrieving section detail: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error retrieving section detail: %s", e)
         raise Exception(f"Failed to retrieve section detail: {str(e)}")
 
 def generate_knowledge_map(research_id: str) -> KnowledgeMapResponse:
@@ -440,71 +418,46 @@ def generate_knowledge_map(research_id: str) -> KnowledgeMapResponse:
         if not research_data:
             raise Exception(f"Knowledge research with ID {research_id} not found")
             
-        # Parse research data
-        overview_data = research_data.get("overview", {})
-        section_data = overview_data.get("topics", [])
-        
-        # Create knowledge overview object from data
-        sections = []
-        for topic in section_data:
-            sections.append(KnowledgeSection(
-                title=topic.get("name", "Unknown section"),
-                estimated_time="Not specified"
-            ))
-        
-        knowledge = KnowledgeOverview(
-            research_id=research_id,
-            title=research_data.get("step_title", "Untitled Research"),
-            overview=f"Research covering key aspects of {research_data.get('step_title', 'the topic')}.",
-            sections=sections,
-            complexity_level=research_data.get("estimated_time", "Not specified")
-        )
+        knowledge = _knowledge_from_row(research_id, research_data)
         
-        # Create a flowchart diagram using Mermaid syntax
-        mermaid_code = """
-        flowchart LR
-            Start([Start]) --> Section1
-        """
+        # Create a flowchart diagram using Mermaid syntax, collecting the lines
+        # and joining them once at the end
+        n = len(knowledge.sections)
+        parts: List[str] = [_MERMAID_HEADER]
         
         # Add each section as a node
         for i, section in enumerate(knowledge.sections, 1):
             # Add the section node
             section_id = f"Section{i}"
-            section_title = section.title
-            estimated_time = section.estimated_time
             
             # Truncate long titles for better display
-            if len(section_title) > 30:
-                section_title = section_title[:27] + "..."
-                
-            mermaid_code += f"""
-            {section_id}["{section_title}<br><small>{estimated_time}</small>"]
-            """
+            section_title = section.title if len(section.title) <= _MAX_TITLE else section.title[:_TRUNC] + _ELLIPSIS
+            parts.append(_NODE_TEMPLATE.format(node_id=section_id, title=section_title, estimated_time=section.estimated_time))
             
             # Add connection to next section if not the last one
-            if i < len(knowledge.sections):
-                mermaid_code += f"""
-            {section_id} --> Section{i+1}
-                """
+            if i < n:
+                parts.append(_EDGE_TEMPLATE.format(node_id=section_id, next_index=i + 1))
         
         # Add final node
-        mermaid_code += """
-            Section{} --> Finish([Complete])
-        """.format(len(knowledge.sections))
+        parts.append(f"    Section{n} --> Finish([Complete])\n")
+        mermaid_code = "".join(parts)
         
         return KnowledgeMapResponse(
             research_id=research_id,
             mermaid_code=mermaid_code
         )
     except Exception as e:
-        error_details = f"Error generating knowledge map: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error generating knowledge map: %s", e)
         raise Exception(f"Failed to generate knowledge map: {str(e)}")
 
-def get_all_knowledge_researches() -> KnowledgeListResponse:
+def get_all_knowledge_researches(limit: Optional[int] = None, offset: int = 0) -> KnowledgeListResponse:
     """
     Get a list of all available knowledge researches
     
+    Args:
+        limit: Maximum number of researches to return, or None for all of them
+        offset: Number of researches to skip
+    
     Returns:
         KnowledgeListResponse containing list of research metadata
     """
@@ -513,7 +466,7 @@ def get_all_knowledge_researches() -> KnowledgeListResponse:
         from utils.curriculum_utils import get_all_curriculum_steps
         
         # Query all records from Supabase
-        research_records = get_all_curriculum_steps()
+        research_records = get_all_curriculum_steps(limit, offset)
         
         # Format the list for response
         research_list = []
@@ -523,10 +476,12 @@ def get_all_knowledge_researches() -> KnowledgeListResponse:
                 "research_name": record.get("step_title", "Untitled Research")
             })
         
-        return KnowledgeListResponse(researches=research_list)
+        # A full page means there may be more rows after it
+        next_offset = offset + limit if limit is not None and len(research_records) == limit else None
+        
+        return KnowledgeListResponse(researches=research_list, next_offset=next_offset)
     except Exception as e:
-        error_details = f"Error listing knowledge researches: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error listing knowledge researches: %s", e)
         raise Exception(f"Failed to list knowledge researches: {str(e)}")
 
 def create_knowledge(request: KnowledgeCreateRequest) -> Dict[str, str]:
@@ -568,8 +523,7 @@ def create_knowledge(request: KnowledgeCreateRequest) -> Dict[str, str]:
             "research_name": research_name
         }
     except Exception as e:
-        error_details = f"Error creating knowledge research: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error creating knowledge research: %s", e)
         raise Exception(f"Failed to create knowledge research: {str(e)}")
 
 def delete_knowledge_by_id(research_id: str) -> bool:
@@ -588,17 +542,13 @@ def delete_knowledge_by_id(research_id: str) -> bool:
         if not research_data:
             raise Exception(f"Knowledge research with ID {research_id} not found")
         
-        # Delete research file
-        # In a real implementation, you would remove from your database
-        research_file = os.path.join(os.path.dirname(__file__), "data", "researches", f"{research_id}.json")
-        if os.path.exists(research_file):
-            os.remove(research_file)
-            return True
-        else:
-            # Not found on disk but was found by get_curriculum_step
-            # This suggests an inconsistency, but return True as the intent is fulfilled
-            return True
+        # Remove the database row, then any file left from the older file-based storage
+        if not delete_curriculum_step(research_id):
+            raise Exception(f"Failed to delete research {research_id} from the database")
+        
+        research_file = Path(__file__).parent / "data" / "researches" / f"{research_id}.json"
+        research_file.unlink(missing_ok=True)
+        return True
     except Exception as e:
-        error_details = f"Error deleting knowledge research: {e}\n{traceback.format_exc()}"
-        print(error_details)
+        logger.exception("Error deleting knowledge research: %s", e)
         raise Exception(f"Failed to delete knowledge research: {str(e)}")
\ No newline at end of file
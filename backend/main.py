@@ -3,13 +3,18 @@ import json
 import tempfile
 import uuid
 import importlib
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
-from dotenv import load_dotenv
+# Environment variables are loaded by config before the other project modules import
+from config import GEMINI_API_KEY as GOOGLE_API_KEY, PINECONE_API_KEY, API_KEY, API_AUTH_REQUIRED
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks, Query, Header, Security
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, HttpUrl
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 import google.generativeai as genai
 import sys
 from pathlib import Path
@@ -38,10 +43,10 @@ from langchain_pinecone import PineconeVectorStore
 from search import google_search
 
 # Import document processing functions using direct imports
-from document_loader import prepare_document, process_csv, process_pdf, process_web, process_image
+from document_loader import prepare_document, prepare_document_async, prepare_documents, process_csv, process_web
 
 # Import agents using direct imports
-from agents.writeragents import get_query_rewriter_agent, get_rag_agent, test_url_detector, generate_session_title, get_baseline_agent
+from agents.writeragents import get_query_rewriter_agent, get_rag_agent, test_url_detector_async, generate_session_title_async, get_baseline_agent
 
 # Import session management functions
 from utils.session_manager import (
@@ -54,6 +59,8 @@ from utils.session_manager import (
 
 # Import supabase client
 from utils.supabase_client import initialize_supabase
+from utils.logging_config import setup_logging, shutdown_logging
+from utils.json_utils import dumps as json_dumps
 
 from agents.intentdetectorAgent import detect_google_search_intent
 
@@ -82,6 +89,7 @@ from curriculum_service import (
     get_curriculum,
     modify_curriculum_by_id,
     generate_curriculum_details,
+    stream_curriculum_details,
     get_step_detail,
     get_all_curriculums,
     create_curriculum,
@@ -108,14 +116,10 @@ from knowledge_service import (
     delete_knowledge_by_id
 )
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Get API keys from environment variables with fallbacks
-GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY", "")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
-API_KEY = os.getenv("API_KEY", "")  # Remove default value to make authentication optional
-API_AUTH_REQUIRED = os.getenv("API_AUTH_REQUIRED", "false").lower() == "true"  # Default to not requiring auth
+# Size of the default thread pool used for blocking work offloaded from the event loop
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
 
 # Hardcoded similarity threshold
 SIMILARITY_THRESHOLD = 0.7
@@ -146,10 +150,26 @@ def get_api_key(api_key: str = Security(api_key_header)):
         detail="Invalid API key",
     )
 
+def _require_uuid(value: str, name: str) -> None:
+    """Reject IDs that can't be a UUID before they reach the database"""
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+
+def valid_curriculum_id(curriculum_id: str):
+    _require_uuid(curriculum_id, "curriculum_id")
+
+def valid_research_id(research_id: str):
+    _require_uuid(research_id, "research_id")
+
 # Setup lifespan for FastAPI
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize on startup
+    setup_logging()
+    # Bound the pool that asyncio.to_thread and run_in_executor use
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS))
     os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
     genai.configure(api_key=GOOGLE_API_KEY)
     app_state["pinecone_client"] = init_pinecone(PINECONE_API_KEY)
@@ -161,12 +181,15 @@ async def lifespan(app: FastAPI):
     app_state["vector_store"] = None
     app_state["processed_documents"] = []
     app_state["session_vector_stores"] = {}
+    shutdown_logging()
 
 app = FastAPI(
     title="Teacher Assistant API", 
     description="API for teacher assistant with RAG capabilities",
     lifespan=lifespan,
-    version="1.0.0"
+    version="1.0.0",
+    # Encode JSON responses (e.g. large detailed curricula) with orjson rather than the stdlib json module
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS
@@ -247,6 +270,52 @@ def get_session_vector_store(session_id: str):
     
     return None
 
+def add_documents_to_session(session_id: str, texts: List, sources: List[str]) -> List[str]:
+    """
+    Add document chunks to the session's vector store and record their sources in the session
+    
+    Args:
+        session_id: The session to add the documents to
+        texts: The document chunks
+        sources: Names of the processed files
+        
+    Returns:
+        List[str]: The session's processed documents, including the new sources
+    """
+    try:
+        # Get or create vector store for the session
+        vector_store = get_session_vector_store(session_id)
+        if not vector_store:
+            # Create new vector store with session namespace
+            vector_store = create_vector_store(app_state["pinecone_client"], texts, namespace=session_id)
+            app_state["session_vector_stores"][session_id] = vector_store
+        else:
+            # Add to existing vector store
+            vector_store.add_documents(texts)
+        
+    except Exception as e:
+        print(f"Error adding to vector store: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to add document to vector store: {str(e)}"
+        )
+        
+    # Track processed documents in session
+    processed_documents = list(sources)
+    
+    # Update session in database if it exists
+    session_data, _ = load_session(session_id)
+    if session_data:
+        # Append to existing documents if any
+        if "processed_documents" in session_data:
+            processed_documents = list(set(session_data["processed_documents"] + list(sources)))
+        
+        # Update session
+        session_data["processed_documents"] = processed_documents
+        save_session(session_id, session_data)
+    
+    return processed_documents
+
 # API routes
 @app.get("/")
 async def root():
@@ -395,15 +464,16 @@ async def process_document(
         
         # Process based on file type
         try:
+            # Uploads and generation are awaited so the event loop keeps serving other requests
             if file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-                texts = process_image(temp_path)
                 doc_type = "Image"
+                texts = await prepare_document_async(temp_path)
             elif file_ext in ['.csv', '.xlsx', '.xls']:
-                texts = process_csv(temp_path)
                 doc_type = "CSV"
+                texts = await asyncio.to_thread(process_csv, temp_path)
             else:  # PDF or other document types
-                texts = process_pdf(temp_path)
                 doc_type = "Document"
+                texts = await prepare_document_async(temp_path)
                 
             # Ensure we got valid text chunks
             if not texts or len(texts) == 0:
@@ -413,48 +483,21 @@ async def process_document(
             
         except Exception as e:
             print(f"Error processing {doc_type} content: {str(e)}")
-            os.unlink(temp_path)  # Clean up temp file
+            # Clean up temp file; a failed cleanup mustn't hide the processing error
+            with suppress(OSError):
+                os.unlink(temp_path)
             raise HTTPException(
                 status_code=422, 
                 detail=f"Failed to process {doc_type.lower()} content: {str(e)}"
             )
             
         # Clean up temp file
-        os.unlink(temp_path)
+        with suppress(OSError):
+            os.unlink(temp_path)
         
         # Add to vector store
         if texts and app_state["pinecone_client"]:
-            try:
-                # Get or create vector store for the session
-                vector_store = get_session_vector_store(session_id)
-                if not vector_store:
-                    # Create new vector store with session namespace
-                    vector_store = create_vector_store(app_state["pinecone_client"], texts, namespace=session_id)
-                    app_state["session_vector_stores"][session_id] = vector_store
-                else:
-                    # Add to existing vector store
-                    vector_store.add_documents(texts)
-                
-            except Exception as e:
-                print(f"Error adding to vector store: {str(e)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to add document to vector store: {str(e)}"
-                )
-                
-            # Track processed document in session
-            processed_documents = [file_name]
-            
-            # Update session in database if it exists
-            session_data, _ = load_session(session_id)
-            if session_data:
-                # Append to existing documents if any
-                if "processed_documents" in session_data:
-                    processed_documents = list(set(session_data["processed_documents"] + [file_name]))
-                
-                # Update session
-                session_data["processed_documents"] = processed_documents
-                save_session(session_id, session_data)
+            processed_documents = add_documents_to_session(session_id, texts, [file_name])
             
             return {"success": True, "sources": processed_documents, "session_id": session_id}
         else:
@@ -464,11 +507,79 @@ async def process_document(
         # Re-raise HTTP exceptions as they already have status_code and detail
         raise e
     except Exception as e:
-        print(f"Unexpected error processing document: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unexpected error processing document: %s", e)
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
+@app.post("/process/documents", response_model=ProcessResponse, dependencies=[Depends(get_api_key)])
+async def process_documents(
+    files: List[UploadFile] = File(...),
+    session_id: Optional[str] = Form(None)
+):
+    """Process several documents at once and add them to the vector store"""
+    # Generate session ID if not provided
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    
+    file_names = [file.filename for file in files]
+    temp_paths = []
+    try:
+        # Without a vector store the extracted text has nowhere to go, so fail before paying for extraction
+        if not app_state["pinecone_client"]:
+            raise HTTPException(status_code=503, detail="Vector store is not available")
+        
+        for file in files:
+            file_ext = os.path.splitext(file.filename)[1].lower()
+            if file_ext not in ['.pdf', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.csv']:
+                raise HTTPException(
+                    status_code=415,
+                    detail=f"Unsupported file format: {file_ext}. Supported formats are: PDF, PNG, JPG, JPEG, GIF, WEBP, CSV"
+                )
+            
+            file_content = await file.read()
+            if len(file_content) > 10 * 1024 * 1024:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large: {file.filename}, maximum size is 10 MB"
+                )
+            
+            # Save uploaded file to temp location
+            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
+                temp_file.write(file_content)
+                temp_paths.append(temp_file.name)
+        
+        try:
+            # CSV files keep their CSVLoader path; everything else is extracted in batched Gemini requests
+            texts = []
+            batch_paths = []
+            for temp_path in temp_paths:
+                if temp_path.endswith('.csv'):
+                    texts.extend(await asyncio.to_thread(process_csv, temp_path))
+                else:
+                    batch_paths.append(temp_path)
+            if batch_paths:
+                texts.extend(await asyncio.to_thread(prepare_documents, batch_paths))
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Failed to process documents: {str(e)}")
+        
+        if not texts:
+            raise HTTPException(status_code=422, detail="No content could be extracted from the documents")
+        
+        logger.info("Processed %d documents, extracted %d text chunks", len(files), len(texts))
+        processed_documents = add_documents_to_session(session_id, texts, file_names)
+        return {"success": True, "sources": processed_documents, "session_id": session_id}
+    
+    except HTTPException as e:
+        # Re-raise HTTP exceptions as they already have status_code and detail
+        raise e
+    except Exception as e:
+        logger.exception("Unexpected error processing documents: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error processing documents: {str(e)}")
+    finally:
+        # Clean up temp files; a failed cleanup mustn't replace the response or the real error
+        for temp_path in temp_paths:
+            with suppress(OSError):
+                os.unlink(temp_path)
+
 @app.post("/process/url", response_model=ProcessResponse, dependencies=[Depends(get_api_key)])
 async def process_url(request: ProcessUrlRequest):
     """Process a URL and add to vector store"""
@@ -582,7 +693,7 @@ async def chat(request: MessageRequest):
             # Continue even if baseline response fails
         
         # Check for URLs in prompt
-        url_detector = test_url_detector(prompt)
+        url_detector = await test_url_detector_async(prompt)
         detected_urls = url_detector.urls
         
         # Process any detected URLs
@@ -706,7 +817,7 @@ Rewritten Question: {rewritten_query}
         session_name = session_data.get("session_name", "Untitled Session")
         if (session_name == "Untitled Session" or not session_name) and prompt:
             try:
-                session_title = generate_session_title(prompt)
+                session_title = await generate_session_title_async(prompt)
                 # Ensure we never return an empty title
                 if session_title and session_title.strip() != "":
                     session_name = session_title
@@ -715,8 +826,8 @@ Rewritten Question: {rewritten_query}
                 print(f"Error generating session title: {str(e)}")
                 # Keep default title if generation fails
         
-        # Save session data
-        save_session(session_id, session_data)
+        # Save session data before responding, so a quick follow-up message loads this turn's history
+        await asyncio.to_thread(save_session, session_id, session_data)
         
         # Prepare sources for response
         sources = []
@@ -755,11 +866,13 @@ Rewritten Question: {rewritten_query}
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
 
 # CURRICULUM API ENDPOINTS - PLURAL FORM (RECOMMENDED)
+# The curriculum and knowledge services block on Supabase and Gemini calls, so
+# the routes run them in the worker pool instead of on the event loop
 @app.get("/curriculums", response_model=CurriculumListResponse, dependencies=[Depends(get_api_key)])
-async def list_curriculums():
+async def list_curriculums(limit: Optional[int] = Query(None, ge=1, le=100), offset: int = Query(0, ge=0)):
     """Get a list of all available curriculums"""
     try:
-        result = get_all_curriculums()
+        result = await asyncio.to_thread(get_all_curriculums, limit, offset)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing curriculums: {str(e)}")
@@ -768,27 +881,27 @@ async def list_curriculums():
 async def create_new_curriculum(request: CurriculumCreateRequest):
     """Create a new empty curriculum"""
     try:
-        result = create_curriculum(request)
+        result = await asyncio.to_thread(create_curriculum, request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating curriculum: {str(e)}")
 
-@app.get("/curriculums/{curriculum_id}", response_model=CurriculumResponse, dependencies=[Depends(get_api_key)])
+@app.get("/curriculums/{curriculum_id}", response_model=CurriculumResponse, dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
 async def get_curriculum_by_id(curriculum_id: str):
     """Get a specific curriculum by ID"""
     try:
-        result = get_curriculum(curriculum_id)
+        result = await asyncio.to_thread(get_curriculum, curriculum_id)
         return result
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error retrieving curriculum: {str(e)}")
 
-@app.delete("/curriculums/{curriculum_id}", dependencies=[Depends(get_api_key)])
+@app.delete("/curriculums/{curriculum_id}", dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
 async def delete_curriculum(curriculum_id: str):
     """Delete a specific curriculum"""
     try:
-        success = delete_curriculum_by_id(curriculum_id)
+        success = await asyncio.to_thread(delete_curriculum_by_id, curriculum_id)
         return {"success": success, "message": f"Curriculum {curriculum_id} deleted"}
     except Exception as e:
         if "not found" in str(e):
@@ -800,38 +913,38 @@ async def delete_curriculum(curriculum_id: str):
 async def create_curriculum_endpoint(request: CurriculumRequest):
     """Generate a new curriculum based on subject, syllabus URL, and time constraint"""
     try:
-        result = generate_curriculum(request)
+        result = await generate_curriculum(request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating curriculum: {str(e)}")
 
-@app.get("/curriculum/{curriculum_id}", response_model=CurriculumResponse, dependencies=[Depends(get_api_key)])
+@app.get("/curriculum/{curriculum_id}", response_model=CurriculumResponse, dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
 async def retrieve_curriculum(curriculum_id: str):
     """Get a specific curriculum by ID"""
     try:
-        result = get_curriculum(curriculum_id)
+        result = await asyncio.to_thread(get_curriculum, curriculum_id)
         return result
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error retrieving curriculum: {str(e)}")
 
-@app.put("/curriculum/{curriculum_id}", response_model=CurriculumResponse, dependencies=[Depends(get_api_key)])
+@app.put("/curriculum/{curriculum_id}", response_model=CurriculumResponse, dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
 async def update_curriculum(curriculum_id: str, request: CurriculumModificationRequest):
     """Modify a curriculum based on the modification request"""
     try:
-        result = modify_curriculum_by_id(curriculum_id, request)
+        result = await modify_curriculum_by_id(curriculum_id, request)
         return result
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error modifying curriculum: {str(e)}")  # Fixed syntax: changed detail[ to detail=
 
-@app.post("/curriculum/{curriculum_id}/details", response_model=Dict[str, StepDetailResponse], dependencies=[Depends(get_api_key)])
+@app.post("/curriculum/{curriculum_id}/details", response_model=Dict[str, StepDetailResponse], dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
 async def create_curriculum_details(curriculum_id: str):
     """Generate detailed content for all steps in a curriculum"""
     try:
-        result = generate_curriculum_details(curriculum_id)
+        result = await generate_curriculum_details(curriculum_id)
         # Convert integer keys to strings for JSON serialization
         return {str(k): v for k, v in result.items()}
     except Exception as e:
@@ -839,11 +952,35 @@ async def create_curriculum_details(curriculum_id: str):
             raise HTTPException(status_code=404, detail=str(e))  # Fixed syntax: changed detail[ to detail=
         raise HTTPException(status_code=500, detail=f"Error generating curriculum details: {str(e)}")  # Fixed syntax: changed detail[ to detail=
 
-@app.get("/curriculum/{curriculum_id}/details/{step_index}", response_model=StepDetailResponse, dependencies=[Depends(get_api_key)])
+@app.post("/curriculum/{curriculum_id}/details/stream", dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
+async def stream_curriculum_details_endpoint(curriculum_id: str, accept: Optional[str] = Header(None)):
+    """
+    Stream the detailed content of each step as soon as it is ready
+    
+    Sent as Server-Sent Events when the client accepts text/event-stream,
+    otherwise as NDJSON lines.
+    """
+    use_sse = bool(accept) and "text/event-stream" in accept
+    
+    def frame(payload: Dict[str, Any]) -> str:
+        data = json_dumps(payload)
+        return f"data: {data}\n\n" if use_sse else data + "\n"
+    
+    async def events():
+        try:
+            async for index, detail in stream_curriculum_details(curriculum_id):
+                yield frame({"step_index": index, "detail": detail.model_dump()})
+        except Exception as e:
+            # The status line has already been sent, so report the failure in-band
+            yield frame({"error": f"Error generating curriculum details: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream" if use_sse else "application/x-ndjson")
+
+@app.get("/curriculum/{curriculum_id}/details/{step_index}", response_model=StepDetailResponse, dependencies=[Depends(get_api_key), Depends(valid_curriculum_id)])
 async def retrieve_step_detail(curriculum_id: str, step_index: int):
     """Get detailed content for a specific step"""
     try:
-        result = get_step_detail(curriculum_id, step_index)
+        result = await get_step_detail(curriculum_id, step_index)
         return result
     except Exception as e:
         if "not found" in str(e):
@@ -852,10 +989,10 @@ async def retrieve_step_detail(curriculum_id: str, step_index: int):
 
 # KNOWLEDGE RESEARCH API ENDPOINTS
 @app.get("/knowledge", response_model=KnowledgeListResponse, dependencies=[Depends(get_api_key)])
-async def list_knowledge_research():
+async def list_knowledge_research(limit: Optional[int] = Query(None, ge=1, le=100), offset: int = Query(0, ge=0)):
     """Get a list of all available knowledge research"""
     try:
-        result = get_all_knowledge_researches()
+        result = await asyncio.to_thread(get_all_knowledge_researches, limit, offset)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing knowledge research: {str(e)}")
@@ -864,7 +1001,7 @@ async def list_knowledge_research():
 async def create_knowledge_research(request: KnowledgeRequest):
     """Generate a new knowledge research based on topic, source URL, and depth level"""
     try:
-        result = generate_knowledge(request)
+        result = await generate_knowledge(request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating knowledge research: {str(e)}")
@@ -873,49 +1010,49 @@ async def create_knowledge_research(request: KnowledgeRequest):
 async def create_empty_knowledge(request: KnowledgeCreateRequest):
     """Create a new empty knowledge research"""
     try:
-        result = create_knowledge(request)
+        result = await asyncio.to_thread(create_knowledge, request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating knowledge research: {str(e)}")
 
-@app.get("/knowledge/{research_id}", response_model=KnowledgeResponse, dependencies=[Depends(get_api_key)])
+@app.get("/knowledge/{research_id}", response_model=KnowledgeResponse, dependencies=[Depends(get_api_key), Depends(valid_research_id)])
 async def get_knowledge_by_id(research_id: str):
     """Get a specific knowledge research by ID"""
     try:
-        result = get_knowledge(research_id)
+        result = await asyncio.to_thread(get_knowledge, research_id)
         return result
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error retrieving knowledge research: {str(e)}")
 
-@app.put("/knowledge/{research_id}", response_model=KnowledgeResponse, dependencies=[Depends(get_api_key)])
+@app.put("/knowledge/{research_id}", response_model=KnowledgeResponse, dependencies=[Depends(get_api_key), Depends(valid_research_id)])
 async def update_knowledge(research_id: str, request: KnowledgeModificationRequest):
     """Modify a knowledge research based on the modification request"""
     try:
-        result = modify_knowledge_by_id(research_id, request)
+        result = await modify_knowledge_by_id(research_id, request)
         return result
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error modifying knowledge research: {str(e)}")
 
-@app.delete("/knowledge/{research_id}", dependencies=[Depends(get_api_key)])
+@app.delete("/knowledge/{research_id}", dependencies=[Depends(get_api_key), Depends(valid_research_id)])
 async def delete_knowledge_research(research_id: str):
     """Delete a specific knowledge research"""
     try:
-        success = delete_knowledge_by_id(research_id)
+        success = await asyncio.to_thread(delete_knowledge_by_id, research_id)
         return {"success": success, "message": f"Knowledge research {research_id} deleted"}
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error deleting knowledge research: {str(e)}")
 
-@app.post("/knowledge/{research_id}/details", response_model=Dict[str, SectionDetailResponse], dependencies=[Depends(get_api_key)])
+@app.post("/knowledge/{research_id}/details", response_model=Dict[str, SectionDetailResponse], dependencies=[Depends(get_api_key), Depends(valid_research_id)])
 async def create_section_details(research_id: str):
     """Generate detailed content for all sections in a knowledge research"""
     try:
-        result = generate_section_details(research_id)
+        result = await generate_section_details(research_id)
         # Convert integer keys to strings for JSON serialization
         return {str(k): v for k, v in result.items()}
     except Exception as e:
@@ -923,22 +1060,22 @@ async def create_section_details(research_id: str):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error generating section details: {str(e)}")
 
-@app.get("/knowledge/{research_id}/details/{section_index}", response_model=SectionDetailResponse, dependencies=[Depends(get_api_key)])
+@app.get("/knowledge/{research_id}/details/{section_index}", response_model=SectionDetailResponse, dependencies=[Depends(get_api_key), Depends(valid_research_id)])
 async def retrieve_section_detail(research_id: str, section_index: int):
     """Get detailed content for a specific section"""
     try:
-        result = get_section_detail(research_id, section_index)
+        result = await get_section_detail(research_id, section_index)
         return result
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error retrieving section detail: {str(e)}")
 
-@app.get("/knowledge/{research_id}/map", response_model=KnowledgeMapResponse, dependencies=[Depends(get_api_key)])
+@app.get("/knowledge/{research_id}/map", response_model=KnowledgeMapResponse, dependencies=[Depends(get_api_key), Depends(valid_research_id)])
 async def get_knowledge_map(research_id: str):
     """Generate a visual map for the knowledge research"""
     try:
-        result = generate_knowledge_map(research_id)
+        result = await asyncio.to_thread(generate_knowledge_map, research_id)
         return result
     except Exception as e:
         if "not found" in str(e):
@@ -0,0 +1,30 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine to completion from synchronous code
+
+    Works both from plain scripts and from sync helpers that are called
+    inside a running event loop (e.g. from a FastAPI async route), where
+    asyncio.run cannot be used directly.
+
+    Args:
+        coro: The coroutine to run
+
+    Returns:
+        The coroutine's result
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # No loop running in this thread, so we can own one
+        return asyncio.run(coro)
+
+    # A loop is already running in this thread; run the coroutine on its own
+    # loop in a worker thread and wait for the result
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -1,7 +1,26 @@
+import os
 import uuid
+import threading
 from typing import Dict, Any, Optional, Tuple, List
+from cachetools import TTLCache
 from utils.supabase_client import initialize_supabase
 
+# Recently fetched curriculum rows keyed by step_id. Writes made through this module
+# invalidate their entry; the short TTL bounds staleness from writes made elsewhere.
+CURRICULUM_CACHE_TTL = int(os.getenv("CURRICULUM_CACHE_TTL", "30"))
+_step_cache: TTLCache = TTLCache(maxsize=512, ttl=CURRICULUM_CACHE_TTL)
+_step_cache_lock = threading.Lock()
+
+def invalidate_curriculum(step_id: str) -> None:
+    """
+    Drop a curriculum row from the read cache after it was written or deleted
+    
+    Args:
+        step_id: UUID of the curriculum step
+    """
+    with _step_cache_lock:
+        _step_cache.pop(step_id, None)
+
 def create_curriculum_step(step_title: str, estimated_time: str, overview=None, detailed_content=None) -> Tuple[str, bool]:
     """
     Create a new curriculum step and save to Supabase
@@ -21,14 +40,14 @@ def create_curriculum_step(step_title: str, estimated_time: str, overview=None,
 
 def save_curriculum_step(step_id: str, step_title: str, estimated_time: str, overview=None, detailed_content=None) -> bool:
     """
-    Save curriculum step to Supabase
+    Save curriculum step to Supabase, replacing the stored row if the step already exists
     
     Args:
         step_id: UUID for the curriculum step
         step_title: Title of the curriculum step
         estimated_time: Estimated time for completion
         overview: JSON data for overview (optional)
-        detailed_content: JSON data for detailed content (optional)
+        detailed_content: JSON data for detailed content (optional); pass {} to clear stored details
         
     Returns:
         bool: True if save was successful, False otherwise
@@ -51,11 +70,13 @@ def save_curriculum_step(step_id: str, step_title: str, estimated_time: str, ove
         if overview:
             data["overview"] = overview
             
-        if detailed_content:
+        if detailed_content is not None:
             data["detailed_content"] = detailed_content
             
-        # Insert data into Supabase
-        response = supabase.table("curriculum_steps").insert(data).execute()
+        # Upsert so rewriting an existing step is a single request with no read first;
+        # columns left out of data keep their stored values
+        response = supabase.table("curriculum_steps").upsert(data, on_conflict="step_id").execute()
+        invalidate_curriculum(step_id)
         print(f"Successfully saved curriculum step with ID: {step_id}")
         return True
         
@@ -73,6 +94,11 @@ def get_curriculum_step(step_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Optional[Dict[str, Any]]: Curriculum step data or None if not found
     """
+    with _step_cache_lock:
+        cached = _step_cache.get(step_id)
+    if cached is not None:
+        return cached
+    
     try:
         # Initialize Supabase client
         supabase = initialize_supabase()
@@ -84,6 +110,8 @@ def get_curriculum_step(step_id: str) -> Optional[Dict[str, Any]]:
         response = supabase.table("curriculum_steps").select("*").eq("step_id", step_id).execute()
         
         if response and response.data and len(response.data) > 0:
+            with _step_cache_lock:
+                _step_cache[step_id] = response.data[0]
             return response.data[0]
             
         return None
@@ -92,12 +120,16 @@ def get_curriculum_step(step_id: str) -> Optional[Dict[str, Any]]:
         print(f"Error getting curriculum step from Supabase: {e}")
         return None
 
-def get_all_curriculum_steps() -> List[Dict[str, Any]]:
+def get_all_curriculum_steps(limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
     """
-    Get all curriculum steps from Supabase
+    Get the id and title of curriculum steps from Supabase, newest first
+    
+    Args:
+        limit: Maximum number of rows to return, or None for all rows
+        offset: Number of rows to skip
     
     Returns:
-        List[Dict[str, Any]]: List of curriculum step data
+        List[Dict[str, Any]]: List of rows with step_id and step_title
     """
     try:
         # Initialize Supabase client
@@ -107,7 +139,11 @@ def get_all_curriculum_steps() -> List[Dict[str, Any]]:
             return []
             
         # Query Supabase
-        response = supabase.table("curriculum_steps").select("*").execute()
+        # Only the listing columns are needed, not the overview and detail JSON
+        query = supabase.table("curriculum_steps").select("step_id, step_title").order("created_at", desc=True)
+        if limit is not None:
+            query = query.range(offset, offset + limit - 1)
+        response = query.execute()
         
         if response and response.data:
             return response.data
@@ -154,6 +190,7 @@ def update_curriculum_step(step_id: str, step_title: str, estimated_time: str, o
             
         # Update data in Supabase
         response = supabase.table("curriculum_steps").update(data).eq("step_id", step_id).execute()
+        invalidate_curriculum(step_id)
         print(f"Successfully updated curriculum step with ID: {step_id}")
         return True
         
@@ -161,16 +198,56 @@ def update_curriculum_step(step_id: str, step_title: str, estimated_time: str, o
         print(f"Error updating curriculum step in Supabase: {e}")
         return False
 
-def save_curriculum_step_detail(detail_id: str, curriculum_id: str, step_index: int, detail_data: Dict[str, Any]) -> bool:
+def delete_curriculum_step(step_id: str) -> bool:
+    """
+    Delete a curriculum step from Supabase
+    
+    Args:
+        step_id: UUID of the curriculum step
+        
+    Returns:
+        bool: True if delete was successful, False otherwise
+    """
+    try:
+        # Initialize Supabase client
+        supabase = initialize_supabase()
+        if not supabase:
+            print("Failed to initialize Supabase client")
+            return False
+            
+        supabase.table("curriculum_steps").delete().eq("step_id", step_id).execute()
+        invalidate_curriculum(step_id)
+        print(f"Successfully deleted curriculum step with ID: {step_id}")
+        return True
+        
+    except Exception as e:
+        print(f"Error deleting curriculum step from Supabase: {e}")
+        return False
+
+def save_curriculum_step_detail(curriculum_id: str, step_index: int, detail_data: Dict[str, Any]) -> bool:
     """
     Save detailed curriculum step content to the detailed_content column of curriculum_steps
     
     Args:
-        detail_id: Unique identifier for the detailed step content (not used directly)
         curriculum_id: The curriculum ID this detail belongs to
         step_index: The index of the step within the curriculum
         detail_data: The detailed step content data
         
+    Returns:
+        bool: True if save was successful, False otherwise
+    """
+    return save_curriculum_step_details(curriculum_id, {step_index: detail_data})
+
+def save_curriculum_step_details(curriculum_id: str, details: Dict[int, Dict[str, Any]], key_prefix: str = "step") -> bool:
+    """
+    Save the detailed content of several steps with one read and one update
+    
+    Args:
+        curriculum_id: The curriculum ID the details belong to
+        details: Detailed step content data keyed by step index
+        key_prefix: Prefix of the detailed_content keys, "step" for curriculums
+            and "section" for knowledge researches
+        
     Returns:
         bool: True if save was successful, False otherwise
     """
@@ -191,10 +268,10 @@ def save_curriculum_step_detail(detail_id: str, curriculum_id: str, step_index:
         # Extract current detailed_content, or create a new object if it doesn't exist
         current_detailed_content = response.data[0].get("detailed_content", {}) or {}
         
-        # Add the new step detail into the detailed_content object
+        # Add the new step details into the detailed_content object
         # Use a string key for step index to ensure consistent JSON format
-        step_key = f"step_{step_index}"
-        current_detailed_content[step_key] = detail_data
+        for step_index, detail_data in details.items():
+            current_detailed_content[f"{key_prefix}_{step_index}"] = detail_data
         
         # Update the curriculum_steps table with the new detailed_content
         update_data = {
@@ -202,8 +279,9 @@ def save_curriculum_step_detail(detail_id: str, curriculum_id: str, step_index:
         }
         
         update_response = supabase.table("curriculum_steps").update(update_data).eq("step_id", curriculum_id).execute()
+        invalidate_curriculum(curriculum_id)
         
-        print(f"Successfully saved detailed content for curriculum {curriculum_id}, step {step_index}")
+        print(f"Successfully saved detailed content for curriculum {curriculum_id}, steps {sorted(details)}")
         return True
         
     except Exception as e:
@@ -0,0 +1,141 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, Optional, Set, Tuple
+import httpx
+from google import genai
+from google.genai import types
+from config import GEMINI_API_KEY
+
+# Per-request timeout for Gemini calls, in milliseconds
+GEMINI_HTTP_TIMEOUT_MS = int(os.getenv("GEMINI_HTTP_TIMEOUT_MS", "30000"))
+
+# Connection pool shared by all Gemini calls
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60.0)
+
+_client: Optional[genai.Client] = None
+_client_lock = threading.Lock()
+
+def _http_options() -> types.HttpOptions:
+    """HTTP/2 keep-alive transports with connection retries for the sync and async clients"""
+    return types.HttpOptions(
+        timeout=GEMINI_HTTP_TIMEOUT_MS,
+        client_args={'transport': httpx.HTTPTransport(http2=True, limits=_HTTP_LIMITS, retries=2)},
+        async_client_args={'transport': httpx.AsyncHTTPTransport(http2=True, limits=_HTTP_LIMITS, retries=2)}
+    )
+
+def get_gemini_client() -> genai.Client:
+    """
+    Get the shared Gemini client, creating it on first use
+    
+    Reusing one client keeps its HTTP connection pool alive across calls
+    instead of paying for a new connection and TLS handshake every time.
+    Requests are multiplexed over HTTP/2 and idle connections kept for a minute.
+    
+    Returns:
+        genai.Client: The shared client
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(api_key=GEMINI_API_KEY, http_options=_http_options())
+    return _client
+
+# How long an explicit prompt-prefix cache lives on the Gemini side
+PREFIX_CACHE_TTL_SECONDS = 3600
+
+# (model, prefix hash) -> (cached content name, expiry timestamp)
+_prefix_caches: Dict[Tuple[str, str], Tuple[str, float]] = {}
+# Prefixes Gemini refused to cache (e.g. below the minimum token count)
+_uncacheable_prefixes: Set[Tuple[str, str]] = set()
+_prefix_lock = threading.Lock()
+
+def _lookup_prefix_cache(cache_id: Tuple[str, str]) -> Tuple[bool, Optional[str]]:
+    """Return (known, name) for a prefix: known is False when a cache still has to be created"""
+    with _prefix_lock:
+        if cache_id in _uncacheable_prefixes:
+            return True, None
+        entry = _prefix_caches.get(cache_id)
+        if entry and entry[1] - time.time() > 60:
+            return True, entry[0]
+    return False, None
+
+def _store_prefix_cache(cache_id: Tuple[str, str], cache_name: Optional[str]) -> None:
+    """Remember a newly created cache, or that the prefix can't be cached when cache_name is None"""
+    with _prefix_lock:
+        if cache_name is None:
+            _uncacheable_prefixes.add(cache_id)
+        else:
+            _prefix_caches[cache_id] = (cache_name, time.time() + PREFIX_CACHE_TTL_SECONDS)
+
+async def get_prefix_cache(model: str, prefix: str) -> Optional[str]:
+    """
+    Get a Gemini cached-content handle for a static prompt prefix
+    
+    The cache is created on first use and recreated shortly before it expires.
+    Prefixes Gemini won't cache are remembered so we don't retry them on every call.
+    
+    Args:
+        model: The model the cache is created for
+        prefix: The static prompt prefix
+        
+    Returns:
+        Optional[str]: The cached content name, or None if the prefix must be sent inline
+    """
+    cache_id = (model, hashlib.sha256(prefix.encode()).hexdigest())
+    known, cache_name = _lookup_prefix_cache(cache_id)
+    if known:
+        return cache_name
+    
+    try:
+        cache = await get_gemini_client().aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix],
+                ttl=f"{PREFIX_CACHE_TTL_SECONDS}s"
+            )
+        )
+    except Exception as e:
+        print(f"Prompt prefix not cached, sending it inline: {e}")
+        _store_prefix_cache(cache_id, None)
+        return None
+    
+    _store_prefix_cache(cache_id, cache.name)
+    return cache.name
+
+def get_instruction_cache(model: str, instructions: str) -> Optional[str]:
+    """
+    Get a Gemini cached-content handle holding static system instructions
+    
+    Synchronous counterpart of get_prefix_cache for callers that aren't async.
+    The instructions are cached as the system instruction rather than as contents.
+    
+    Args:
+        model: The model the cache is created for
+        instructions: The static system instructions
+        
+    Returns:
+        Optional[str]: The cached content name, or None if the instructions must be sent inline
+    """
+    cache_id = (model, "system:" + hashlib.sha256(instructions.encode()).hexdigest())
+    known, cache_name = _lookup_prefix_cache(cache_id)
+    if known:
+        return cache_name
+    
+    try:
+        cache = get_gemini_client().caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=instructions,
+                ttl=f"{PREFIX_CACHE_TTL_SECONDS}s"
+            )
+        )
+    except Exception as e:
+        print(f"System instructions not cached, sending them inline: {e}")
+        _store_prefix_cache(cache_id, None)
+        return None
+    
+    _store_prefix_cache(cache_id, cache.name)
+    return cache.name
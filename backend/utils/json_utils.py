@@ -0,0 +1,34 @@
+import re
+from typing import Any
+import orjson
+
+# The outermost {...} object in an LLM response, ignoring code fences and surrounding prose
+_JSON_BLOCK_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+def dumps(obj: Any) -> str:
+    """
+    Serialize an object to a JSON string using orjson
+    
+    Args:
+        obj: The object to serialize; values orjson can't handle natively are converted with str()
+        
+    Returns:
+        str: The JSON string
+    """
+    return orjson.dumps(obj, default=str).decode()
+
+def parse_llm_json(response_text: str) -> Any:
+    """
+    Parse the JSON object out of an LLM response
+    
+    Args:
+        response_text: Raw response text, possibly wrapped in a ```json fence or prose
+        
+    Returns:
+        Any: The parsed JSON value
+        
+    Raises:
+        json.JSONDecodeError: If no valid JSON could be parsed (orjson's error subclasses it)
+    """
+    match = _JSON_BLOCK_RE.search(response_text)
+    return orjson.loads(match.group(0) if match else response_text)
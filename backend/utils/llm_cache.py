@@ -0,0 +1,205 @@
+import os
+import asyncio
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from utils.gemini_client import get_prefix_cache
+
+logger = logging.getLogger(__name__)
+
+# How long a cached LLM response stays valid, in seconds
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 60 * 60)))
+
+# Location of the SQLite cache database
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "llm_cache.db")
+)
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+# Requests currently being generated, keyed by cache key
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def _get_connection() -> sqlite3.Connection:
+    """Open the cache database on first use and make sure the table exists"""
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)"
+        )
+        _connection.commit()
+    return _connection
+
+def normalize_prompt(prompt: str) -> str:
+    """Strip surrounding and trailing whitespace so formatting noise doesn't change the cache key"""
+    return "\n".join(line.rstrip() for line in prompt.strip().splitlines())
+
+def make_key(model: str, prompt: str, config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the cache key for an LLM request
+
+    Args:
+        model: The model name
+        prompt: The prompt text
+        config: The generation config
+
+    Returns:
+        str: SHA256 hex digest identifying the request
+    """
+    payload = f"{model}|{normalize_prompt(prompt)}|{json.dumps(config or {}, sort_keys=True, default=str)}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def get(key: str) -> Optional[str]:
+    """
+    Look up a cached response
+
+    Args:
+        key: The cache key from make_key
+
+    Returns:
+        Optional[str]: The cached response text, or None on a miss or expired entry
+    """
+    try:
+        with _lock:
+            row = _get_connection().execute(
+                "SELECT response, ts FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row and time.time() - row[1] < LLM_CACHE_TTL:
+            return row[0]
+    except Exception as e:
+        logger.warning("Error reading LLM cache: %s", e)
+    return None
+
+def put(key: str, response: str) -> None:
+    """
+    Store a response in the cache
+
+    Args:
+        key: The cache key from make_key
+        response: The response text to store
+    """
+    try:
+        with _lock:
+            connection = _get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, ts) VALUES (?, ?, ?)",
+                (key, response, int(time.time()))
+            )
+            connection.commit()
+    except Exception as e:
+        logger.warning("Error writing LLM cache: %s", e)
+
+async def cached_generate(client, model: str, prompt: str, config: Optional[Dict[str, Any]] = None, static_prefix: Optional[str] = None) -> str:
+    """
+    Generate content with Gemini, returning a cached response when the same request was seen before
+
+    Args:
+        client: The genai client to use on a cache miss
+        model: The model name
+        prompt: The prompt text, or only its dynamic part when static_prefix is given
+        config: The generation config
+        static_prefix: Optional static instructions sent ahead of the prompt; served from
+            a Gemini cached-content handle when possible so the prefix tokens are discounted
+
+    Returns:
+        str: The response text
+    """
+    full_prompt = f"{static_prefix}\n\n{prompt}" if static_prefix else prompt
+    key = make_key(model, full_prompt, config)
+    # SQLite calls block, so keep them off the event loop
+    cached = await asyncio.to_thread(get, key)
+    if cached is not None:
+        return cached
+
+    # Coalesce identical concurrent requests: the first caller makes the API call
+    # and everyone else waits for its result. A concurrent.futures.Future is used so
+    # callers on other threads' event loops (see utils.async_utils.run_sync) can share it.
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        return await asyncio.wrap_future(future)
+
+    try:
+        response_text = await _generate(client, model, prompt, full_prompt, config, static_prefix)
+        if response_text:
+            await asyncio.to_thread(put, key, response_text)
+        future.set_result(response_text)
+        return response_text
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+async def _request_contents(model: str, prompt: str, full_prompt: str, config: Optional[Dict[str, Any]], static_prefix: Optional[str]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Pick the contents and config to send, referencing the prefix cache when available"""
+    if static_prefix:
+        cache_name = await get_prefix_cache(model, static_prefix)
+        if cache_name:
+            return prompt, {**(config or {}), 'cached_content': cache_name}
+    return full_prompt, config
+
+async def _generate(client, model: str, prompt: str, full_prompt: str, config: Optional[Dict[str, Any]], static_prefix: Optional[str]) -> str:
+    """Call Gemini for a request that missed the cache, using the prefix cache when available"""
+    contents, config = await _request_contents(model, prompt, full_prompt, config, static_prefix)
+    response = await client.aio.models.generate_content(
+        model=model,
+        contents=contents,
+        config=config
+    )
+    return response.text
+
+async def cached_generate_stream(client, model: str, prompt: str, config: Optional[Dict[str, Any]] = None, static_prefix: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Stream generated text from Gemini, replaying a cached response when the same request was seen before
+    
+    A cached response is yielded as a single chunk. On a miss the text is yielded
+    as it arrives and the complete response is cached once the stream ends.
+    
+    Args:
+        client: The genai client to use on a cache miss
+        model: The model name
+        prompt: The prompt text, or only its dynamic part when static_prefix is given
+        config: The generation config
+        static_prefix: Optional static instructions sent ahead of the prompt, as in cached_generate
+        
+    Yields:
+        str: Chunks of response text
+    """
+    full_prompt = f"{static_prefix}\n\n{prompt}" if static_prefix else prompt
+    key = make_key(model, full_prompt, config)
+    cached = await asyncio.to_thread(get, key)
+    if cached is not None:
+        yield cached
+        return
+    
+    contents, request_config = await _request_contents(model, prompt, full_prompt, config, static_prefix)
+    chunks = []
+    async for chunk in await client.aio.models.generate_content_stream(
+        model=model,
+        contents=contents,
+        config=request_config
+    ):
+        if chunk.text:
+            chunks.append(chunk.text)
+            yield chunk.text
+    
+    response_text = "".join(chunks)
+    if response_text:
+        await asyncio.to_thread(put, key, response_text)
@@ -0,0 +1,76 @@
+import os
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from utils.json_utils import dumps
+
+# Root log level, e.g. DEBUG, INFO, WARNING
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# "text" for human-readable lines, "json" for one JSON object per record
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+_listener: Optional[QueueListener] = None
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues records untouched
+    
+    The stock handler formats the message and exception traceback in the
+    calling thread before enqueueing. The queue here never leaves the
+    process, so that work can be left to the listener thread instead.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class _JsonFormatter(logging.Formatter):
+    """Formats each record as a single-line JSON object for log collectors"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps(entry)
+
+def setup_logging() -> QueueListener:
+    """
+    Route all logging through a queue drained by a background thread
+    
+    Request handlers only enqueue records; formatting and writing to the
+    console happen on the listener thread, off the request path.
+    
+    Returns:
+        QueueListener: The started listener (stop it on shutdown to flush pending records)
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    
+    log_queue: queue.Queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(_JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def shutdown_logging() -> None:
+    """Stop the listener thread, flushing any queued records"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,183 @@
+import os
+import atexit
+import threading
+from typing import List, Optional
+import numpy as np
+
+# Minimum cosine similarity for two keys to be treated as the same request
+SEM_THRESHOLD = float(os.getenv("SEM_THRESHOLD", "0.92"))
+
+# Most entries a cache holds; the oldest are overwritten once it is full
+SEM_CACHE_MAX_ENTRIES = int(os.getenv("SEM_CACHE_MAX_ENTRIES", "10000"))
+
+# Number of additions after which the index is written to disk in the background
+SEM_CACHE_SAVE_EVERY = int(os.getenv("SEM_CACHE_SAVE_EVERY", "25"))
+
+# Rows allocated for the first entries; the buffer doubles as it fills, up to the maximum
+_INITIAL_CAPACITY = 256
+
+# Gemini embedding model used for cache keys
+EMBEDDING_MODEL = "text-embedding-004"
+
+async def embed_text(client, text: str) -> np.ndarray:
+    """
+    Embed text with Gemini and L2-normalize the result
+
+    Args:
+        client: The genai client
+        text: The text to embed
+
+    Returns:
+        np.ndarray: The normalized embedding vector
+    """
+    result = await client.aio.models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=text
+    )
+    vector = np.asarray(result.embeddings[0].values, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticCache:
+    """
+    Cache of serialized results keyed by normalized embeddings
+
+    Lookups return the value stored under the most similar key, provided its
+    cosine similarity exceeds the threshold. Entries can carry a scope string
+    for inputs that must match exactly rather than semantically; a lookup only
+    considers entries with the same scope. Embeddings live in a preallocated
+    buffer that grows by doubling; once max_entries is reached the oldest entry
+    is overwritten. The index is loaded from disk on startup, written back every
+    save_every additions and again when the process exits.
+    """
+
+    def __init__(self, path: str, threshold: float = SEM_THRESHOLD,
+                 max_entries: int = SEM_CACHE_MAX_ENTRIES, save_every: int = SEM_CACHE_SAVE_EVERY):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._embeddings: Optional[np.ndarray] = None
+        self._values: List[str] = []
+        self._scopes: List[str] = []
+        # Number of filled rows, and the row the next entry is written to
+        self._size = 0
+        self._next = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self) -> None:
+        """Load a previously saved index, if one exists"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                embeddings = data["embeddings"]
+                values = [str(value) for value in data["values"]]
+                # Indexes saved before scopes existed are all unscoped
+                scopes = [str(scope) for scope in data["scopes"]] if "scopes" in data else [""] * len(values)
+        except Exception as e:
+            print(f"Error loading semantic cache: {e}")
+            return
+
+        # Entries are saved oldest first, so keep the newest ones if the limit shrank
+        start = max(0, len(values) - self.max_entries)
+        self._size = len(values) - start
+        self._next = self._size % self.max_entries
+        self._embeddings = np.zeros((self._capacity_for(self._size), embeddings.shape[1]), dtype=np.float32)
+        self._embeddings[:self._size] = embeddings[start:]
+        self._values = values[start:]
+        self._scopes = scopes[start:]
+        print(f"Loaded {self._size} entries from semantic cache")
+
+    def _capacity_for(self, size: int) -> int:
+        """Smallest doubling of the initial capacity that holds size rows, capped at max_entries"""
+        capacity = min(_INITIAL_CAPACITY, self.max_entries)
+        while capacity < size:
+            capacity *= 2
+        return min(capacity, self.max_entries)
+
+    def lookup(self, embedding: np.ndarray, scope: str = "") -> Optional[str]:
+        """
+        Find the value stored under the most similar key within a scope
+
+        Args:
+            embedding: The normalized query embedding
+            scope: Exact-match part of the key
+
+        Returns:
+            Optional[str]: The cached value, or None if nothing is similar enough
+        """
+        with self._lock:
+            if not self._size:
+                return None
+            scores = self._embeddings[:self._size] @ embedding
+            candidates = np.flatnonzero(scores > self.threshold)
+            # Most similar first; only the few entries above the threshold are checked for scope
+            for index in candidates[np.argsort(-scores[candidates])]:
+                if self._scopes[index] == scope:
+                    return self._values[index]
+        return None
+
+    def add(self, embedding: np.ndarray, value: str, scope: str = "") -> None:
+        """
+        Store a value under the given key embedding and scope
+
+        Args:
+            embedding: The normalized key embedding
+            value: The serialized value to store
+            scope: Exact-match part of the key
+        """
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self._capacity_for(1), embedding.shape[0]), dtype=np.float32)
+            elif self._next == len(self._embeddings) and self._next < self.max_entries:
+                # Out of room below the limit: double the buffer instead of growing it row by row
+                grown = np.zeros((self._capacity_for(self._next + 1), self._embeddings.shape[1]), dtype=np.float32)
+                grown[:self._size] = self._embeddings[:self._size]
+                self._embeddings = grown
+
+            index = self._next
+            self._embeddings[index] = embedding
+            if index < self._size:
+                # Full: overwrite the oldest entry
+                self._values[index] = value
+                self._scopes[index] = scope
+            else:
+                self._values.append(value)
+                self._scopes.append(scope)
+                self._size += 1
+            self._next = (index + 1) % self.max_entries
+
+            self._unsaved += 1
+            save_now = self._unsaved >= self.save_every
+            if save_now:
+                self._unsaved = 0
+
+        # Callers may be on the event loop, so the disk write happens in a thread
+        if save_now:
+            threading.Thread(target=self.save, daemon=True).start()
+
+    def save(self) -> None:
+        """Write the index to disk, oldest entries first"""
+        with self._lock:
+            if not self._size:
+                return
+            order = np.r_[self._next:self._size, 0:self._next] if self._size == self.max_entries else np.arange(self._size)
+            embeddings = self._embeddings[order]
+            values = np.array([self._values[index] for index in order])
+            scopes = np.array([self._scopes[index] for index in order])
+
+        with self._save_lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # Write a temporary file and swap it in, so a crash mid-write keeps the previous index
+                temp_path = self.path + ".tmp"
+                with open(temp_path, "wb") as f:
+                    np.savez(f, embeddings=embeddings, values=values, scopes=scopes)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"Error saving semantic cache: {e}")
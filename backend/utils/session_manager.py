@@ -2,7 +2,6 @@ import uuid
 import streamlit as st
 from typing import Dict, Any, List, Tuple, Optional
 from langchain_pinecone import PineconeVectorStore
-import traceback
 
 from utils.supabase_client import initialize_supabase
 from embedder import INDEX_NAME, GeminiEmbedder
@@ -46,7 +45,6 @@ def delete_session(session_id: str) -> Tuple[bool, str]:
         supabase_client.table('sessions').delete().eq('session_id', session_id).execute()
         return True, ""
     except Exception as e:
-        error_details = traceback.format_exc()
         error_message = f"Error deleting session: {str(e)}"
         return False, error_message
 
@@ -105,7 +103,6 @@ def save_session(session_id: str, session_data: Dict[str, Any]) -> Tuple[bool, s
             }).execute()
         return True, ""
     except Exception as e:
-        error_details = traceback.format_exc()
         error_message = f"Error saving session: {str(e)}"
         return False, error_message
 
@@ -123,7 +120,6 @@ def load_session(session_id: str) -> Tuple[Optional[Dict[str, Any]], str]:
             return response.data[0], ""
         return None, "Session not found"
     except Exception as e:
-        error_details = traceback.format_exc()
         error_message = f"Error loading session: {str(e)}"
         return None, error_message
 
@@ -138,7 +134,6 @@ def get_available_sessions() -> Tuple[List[Dict[str, Any]], str]:
         response = supabase_client.table('sessions').select('session_id, session_name, created_at').order('updated_at', desc=True).execute()
         return response.data, ""
     except Exception as e:
-        error_details = traceback.format_exc()
         error_message = f"Error fetching sessions: {str(e)}"
         return [], error_message
 
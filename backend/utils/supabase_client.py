@@ -1,15 +1,11 @@
-import os
-import traceback
-from dotenv import load_dotenv
+import threading
 from supabase import create_client, Client
 from typing import Tuple, Optional
+from config import SUPABASE_URL, SUPABASE_KEY
 
-# Load environment variables if not already loaded
-load_dotenv()
-
-# Get Supabase credentials from environment variables
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Shared client created by initialize_supabase; failed attempts are not cached
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
 
 def get_supabase_client() -> Tuple[Optional[Client], str]:
     """
@@ -25,16 +21,21 @@ def get_supabase_client() -> Tuple[Optional[Client], str]:
         client = create_client(SUPABASE_URL, SUPABASE_KEY)
         return client, ""
     except Exception as e:
-        error_details = traceback.format_exc()
         return None, f"Error creating Supabase client: {str(e)}"
 
 def initialize_supabase():
-    """Initialize Supabase and return client"""
+    """Initialize Supabase on first use and return the shared client"""
+    global _client
+    if _client is not None:
+        return _client
     try:
-        client, error = get_supabase_client()
-        if error:
-            print(f"Supabase initialization warning: {error}")
-        return client
+        with _client_lock:
+            if _client is None:
+                client, error = get_supabase_client()
+                if error:
+                    print(f"Supabase initialization warning: {error}")
+                _client = client
+        return _client
     except Exception as e:
         print(f"Error initializing Supabase: {e}")
         return None